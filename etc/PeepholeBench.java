@@ -0,0 +1,125 @@
+// Micro-benchmarks of the operator patterns the peephole stage emits, each next to
+// the code it replaces. Run with a JDK 11 or later from the repository root:
+//
+//     java etc/PeepholeBench.java
+//
+// Every loop feeds its result into the next iteration, so the JIT can't hoist or
+// drop the operation being measured. Timings are the best of several rounds.
+
+class PeepholeBench {
+
+    static final int N = 100_000_000;
+    static final int ROUNDS = 7;
+
+    interface Loop {
+        int run(int n);
+    }
+
+    static int mul8(int n) {
+        int x = 1;
+        for (int i = 0; i < n; i++) {
+            x = x * 8 + i;
+        }
+        return x;
+    }
+
+    static int shl3(int n) {
+        int x = 1;
+        for (int i = 0; i < n; i++) {
+            x = (x << 3) + i;
+        }
+        return x;
+    }
+
+    static int div4(int n) {
+        int x = 0;
+        for (int i = 0; i < n; i++) {
+            x += (i ^ x) % 1024 / 4;
+        }
+        return x;
+    }
+
+    static int shr2(int n) {
+        int x = 0;
+        for (int i = 0; i < n; i++) {
+            x += (i ^ x) % 1024 >> 2;
+        }
+        return x;
+    }
+
+    static int mod16(int n) {
+        int x = 0;
+        for (int i = 0; i < n; i++) {
+            x += (i + x) / 3 % 16;
+        }
+        return x;
+    }
+
+    static int and15(int n) {
+        int x = 0;
+        for (int i = 0; i < n; i++) {
+            x += (i + x) / 3 & 15;
+        }
+        return x;
+    }
+
+    static int square(int n) {
+        int x = 0;
+        for (int i = 0; i < n; i++) {
+            x += (x + i) * (x + i);
+        }
+        return x;
+    }
+
+    static int sq(int x) {
+        return x * x;
+    }
+
+    static int squareHelper(int n) {
+        int x = 0;
+        for (int i = 0; i < n; i++) {
+            x += sq(x + i);
+        }
+        return x;
+    }
+
+    static Integer boxedSquare(int n) {
+        Integer x = 0;
+        for (int i = 0; i < n; i++) {
+            x += (x + i) * (x + i);
+        }
+        return x;
+    }
+
+    static Integer boxedSquareHelper(int n) {
+        Integer x = 0;
+        for (int i = 0; i < n; i++) {
+            x += sq(x + i);
+        }
+        return x;
+    }
+
+    static void bench(String name, Loop loop) {
+        long best = Long.MAX_VALUE;
+        int sink = 0;
+        for (int round = 0; round < ROUNDS; round++) {
+            long start = System.nanoTime();
+            sink += loop.run(N);
+            best = Math.min(best, System.nanoTime() - start);
+        }
+        System.out.printf("%-24s %8.3f ns per op  (%d)%n", name, (double) best / N, sink);
+    }
+
+    public static void main(String[] args) {
+        bench("x * 8", PeepholeBench::mul8);
+        bench("x << 3", PeepholeBench::shl3);
+        bench("x / 4", PeepholeBench::div4);
+        bench("x >> 2", PeepholeBench::shr2);
+        bench("x % 16", PeepholeBench::mod16);
+        bench("x & 15", PeepholeBench::and15);
+        bench("e * e", PeepholeBench::square);
+        bench("Ops.sq(e)", PeepholeBench::squareHelper);
+        bench("e * e, boxed", PeepholeBench::boxedSquare);
+        bench("Ops.sq(e), boxed", PeepholeBench::boxedSquareHelper);
+    }
+}
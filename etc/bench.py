@@ -0,0 +1,207 @@
+"""
+Benchmarks
+----------
+
+Rough timings of the compiler stages. Run from the repository root:
+
+    python etc/bench.py            # every benchmark
+    python etc/bench.py setup      # only the named ones
+
+The operator patterns the peephole stage emits are timed in Java by
+etc/PeepholeBench.java, the peephole benchmark here prints them and times their
+emission.
+"""
+from __future__ import print_function
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from koolml import interpreter, lexer as lexer_module
+from koolml.lexer import Lexer, TextEdit, TokenStream
+from koolml.parser import Parser
+
+SMALL_FILE = '''
+module App ->
+  fun twice(x: Integer): Integer ->
+    return x * 2
+
+  fun main() ->
+    let name: String = "Hello,\\tworld\\n"
+    let n: Integer = twice(21)
+    println(name)
+    println(n)
+'''
+
+
+def report(name, seconds, runs, unit='per file'):
+    print('{:<24} {:>10.1f} us {}'.format(name, seconds / runs * 1e6, unit))
+
+
+def report_memory(name, size, count, unit):
+    print('{:<24} {:>10.1f} B per {}  ({:.1f} MB)'.format(name, float(size) / count, unit, size / 1e6))
+
+
+def measure_memory(build):
+    """Return (result, bytes still allocated by build())."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        return result, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+def large_file(copies=2000):
+    return SMALL_FILE * copies
+
+
+def uncached_lexer(engine='lines'):
+    """A Lexer that compiles its rules again, as every Lexer did before the tables were shared."""
+    lexer_module._tables.clear()
+    return Lexer(engine)
+
+
+def bench_setup(runs=2000):
+    """Per-file overhead of a fresh Lexer, as in batch compiles and the REPL.
+
+    Each step is timed with the rules compiled per Lexer and with the shared tables, on
+    both the Token list path of tokenize and the TokenBuffer of tokenize_compact.
+    """
+    steps = [
+        ('Lexer()', lambda new: new()),
+        ('Lexer().tokenize', lambda new: new().tokenize(SMALL_FILE)),
+        ('Lexer().tokenize_compact', lambda new: new('buffer').tokenize_compact(SMALL_FILE)),
+    ]
+    print('{:<24} {:>13} {:>13}'.format('', 'per Lexer', 'shared'))
+    for name, step in steps:
+        seconds = [min(timeit.repeat(lambda: step(new), number=runs, repeat=5)) / runs * 1e6
+                   for new in (uncached_lexer, Lexer)]
+        print('{:<24} {:>10.1f} us {:>10.1f} us'.format(name, *seconds))
+    report('evaluate', min(timeit.repeat(lambda: interpreter.evaluate(SMALL_FILE), number=runs, repeat=5)), runs)
+
+
+def bench_tokens():
+    """Memory held by the tokens of a large file: Token list vs TokenBuffer."""
+    source = large_file()
+    tokens, size = measure_memory(lambda: Lexer().tokenize(source))
+    report_memory('Token list', size, len(tokens), 'token')
+    tokens, size = measure_memory(lambda: Lexer().tokenize_compact(source))
+    report_memory('TokenBuffer', size, len(tokens), 'token')
+
+
+def synthetic_program(functions=2000):
+    """A module with many small functions mixing calls, operators, matches and lists."""
+    lines = ['module Bench ->']
+    for i in range(functions):
+        lines += [
+            '  fun f{}(x: Integer, y: Integer): Integer ->'.format(i),
+            '    let xs: List<Integer> = [x, y, x * y + 1, (x - y) / 2]',
+            '    let z: Integer = x * (y + {}) - -x % 3 + xs[0]'.format(i),
+            '    if z > 10 && x != y then',
+            '      return f{}(z - 1, y) + f{}(x, z)'.format(i, i),
+            '    match z with',
+            '      | 0 -> x + y * 2',
+            '      | _ -> z',
+            '',
+        ]
+    return '\n'.join(lines) + '\n'
+
+
+def bench_parse():
+    """Parser throughput on a large synthetic module."""
+    source = synthetic_program()
+    lexer = Lexer()
+    tokens = lexer.tokenize(source)
+    seconds = min(timeit.repeat(lambda: Parser(lexer).parse(TokenStream(tokens)), number=1, repeat=5))
+    report('Parser.parse', seconds, 1, 'per {} lines'.format(len(lexer.source_lines)))
+    print('{:<24} {:>10.0f} tokens/s'.format('', len(tokens) / seconds))
+
+
+def bench_relex():
+    """Editing one line of a large file: full tokenize vs retokenize."""
+    source = large_file()
+    lexer = Lexer('buffer')
+    tokens = lexer.tokenize_compact(source)
+    middle = len(lexer.line_starts) // 2
+    edit = TextEdit(middle, middle, '    let n: Integer = twice(22)\n')
+    report('tokenize_compact', min(timeit.repeat(lambda: Lexer('buffer').tokenize_compact(source), number=1, repeat=3)),
+           1, 'per edit')
+    report('retokenize', min(timeit.repeat(lambda: lexer.retokenize(tokens, edit), number=1, repeat=3)), 1, 'per edit')
+
+
+def deep_expressions(terms=100000):
+    """Expressions of the given size: a long chain, nested calls and nested negations."""
+    return {
+        'sum': ' + '.join(str(i) for i in range(terms)),
+        'calls': 'twice(' * terms + '1' + ')' * terms,
+        'negations': '-(1 + ' * terms + '1' + ')' * terms,
+    }
+
+
+def bench_deep():
+    """Compiling 100k-term expressions, far past the Python recursion limit."""
+    for name, expression in sorted(deep_expressions().items()):
+        source = '\n'.join([
+            'module Bench ->',
+            '  fun twice(x: Integer): Integer ->',
+            '    return x * 2',
+            '',
+            '  fun main() ->',
+            '    let n: Integer = ' + expression,
+            '',
+        ])
+        report('evaluate ' + name, min(timeit.repeat(lambda: interpreter.evaluate(source), number=1, repeat=3)), 1)
+
+
+# Evaluated in a loop over 0..x, i is never negative. x % 16 / 4 and x * x are left
+# as they are: x may be negative, and squaring a name needs no helper.
+PEEPHOLE_PATTERNS = [
+    'x * 8',
+    '16 * x',
+    'i % 16 / 4',
+    'x % 16 / 4',
+    'x * x',
+    '(x + 1) * (x + 1)',
+    '(x - 1) * 8 + (x + 1) * 2',
+]
+
+
+def bench_peephole(functions=2000):
+    """Emitting integer operators that the peephole stage rewrites."""
+    lines = ['module Bench ->']
+    for i in range(functions):
+        lines.append('  fun f{}(x: Integer): Integer ->'.format(i))
+        lines.append('    for i in 0..x:')
+        lines += ['      let v{}: Integer = {}'.format(j, pattern) for j, pattern in enumerate(PEEPHOLE_PATTERNS)]
+        lines.append('    return x')
+    source = '\n'.join(lines) + '\n'
+    code = interpreter.evaluate(source).splitlines()
+    for pattern, line in zip(PEEPHOLE_PATTERNS, code[3:]):
+        print('{:<26} {}'.format(pattern, line.split('= ', 1)[1]))
+    report('evaluate', min(timeit.repeat(lambda: interpreter.evaluate(source), number=1, repeat=3)), 1,
+           'per {} functions'.format(functions))
+
+
+benchmarks = {
+    'deep': bench_deep,
+    'parse': bench_parse,
+    'peephole': bench_peephole,
+    'relex': bench_relex,
+    'setup': bench_setup,
+    'tokens': bench_tokens,
+}
+
+
+def main():
+    names = sys.argv[1:] or sorted(benchmarks)
+    for name in names:
+        print('== {}'.format(name))
+        benchmarks[name]()
+
+
+if __name__ == '__main__':
+    main()
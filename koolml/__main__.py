@@ -5,8 +5,12 @@ Main
 Command line interface.
 """
 import argparse
+import os
+import tempfile
 from koolml import __version__ as version, interpreter
 from koolml import coder
+from koolml.cache import ASTCache
+from koolml.lexer import Lexer
 
 try:
     input = raw_input
@@ -20,18 +24,43 @@ includes = '''
 def parse_args():
     argparser = argparse.ArgumentParser()
     argparser.add_argument('-v', '--verbose', action='store_true')
+    argparser.add_argument('-s', '--stream', action='store_true', help='parse while lexing')
+    argparser.add_argument('--lexer', choices=Lexer.engines, default='lines', help='lexer scanning engine')
+    argparser.add_argument('--compact-tokens', action='store_true', help='store tokens in a compact buffer')
+    argparser.add_argument('--no-cache', action='store_true', help='always lex and parse, skip the AST cache')
+    argparser.add_argument('--all-errors', action='store_true', help='report every syntax error, not just the first')
+    argparser.add_argument('--unbox', action='store_true',
+                           help='emit non-null Integer, Double and Boolean values as Java primitives')
+    argparser.add_argument('--cache-dir', help='AST cache directory (default: $KOOLML_CACHE_DIR or ~/.cache/koolml)')
     argparser.add_argument('file', nargs='?')
     return argparser.parse_args()
 
 
-def interpret_file(path, verbose=False):
+def interpret_file(path, verbose=False, streaming=False, engine='lines', compact=False, cache=None, recover=False,
+                   unbox=False):
+    """Compile path to a .java file next to it, returns the compile diagnostics.
+
+    The code is streamed into a temporary file that replaces the .java file only
+    when there were no errors.
+    """
     with open(path) as f:
-        source = interpreter.evaluate(f.read(), verbose=verbose)
-        out = f.name
-        pos = out.find(".ml")
-        out = out[0:pos] + ".java"
-        with open(out, "w") as o:
-            o.write(includes + coder.ListClass +  source + coder.runner)
+        source = f.read()
+    pos = path.find(".ml")
+    out = path[0:pos] + ".java"
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(out)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, "w") as o:
+            o.write(includes + coder.runtime)
+            result = interpreter.compile_source(source, verbose=verbose, streaming=streaming, engine=engine,
+                                                compact=compact, cache=cache, recover=recover, sink=o,
+                                                unbox_values=unbox)
+            o.write(coder.runner)
+        if not result.diagnostics:
+            os.replace(tmp_path, out)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return result.diagnostics
 
 
 def repl():
@@ -42,7 +71,11 @@ def repl():
         while True:
             inp = input('>>> ' if not buf else '')
             if inp == '':
-                print(interpreter.evaluate_env(buf, env))
+                result = interpreter.compile_env(buf, env)
+                if result.diagnostics:
+                    result.diagnostics.print_errors()
+                else:
+                    print(result.code)
                 buf = ''
             else:
                 buf += '\n' + inp
@@ -53,7 +86,12 @@ def repl():
 def main():
     args = parse_args()
     if args.file:
-        interpret_file(args.file, args.verbose)
+        cache = None if args.no_cache else ASTCache(args.cache_dir)
+        diagnostics = interpret_file(args.file, args.verbose, args.stream, args.lexer, args.compact_tokens, cache,
+                                     args.all_errors, args.unbox)
+        if diagnostics:
+            diagnostics.print_errors()
+            exit(4)
     else:
         repl()
 
@@ -38,3 +38,38 @@ Instance = namedtuple('Instance', 'value')
 Type = namedtuple('Type', ['name', 'args'])
 List = namedtuple('List', ['head', 'rest'])
 Builtin = namedtuple('Builtin', ['signature'])
+Error = namedtuple('Error', ['message', 'line', 'column'])
+
+node_types = frozenset(cls for cls in list(globals().values())
+                       if isinstance(cls, type) and issubclass(cls, tuple) and hasattr(cls, '_fields'))
+
+
+def children(node):
+    """The nodes directly below node, in source order.
+
+    Lists of nodes are flattened and Dictionary items give their key, then their value.
+    The name a Call is made with is not a child: Call.left only names the callee.
+    """
+    result = []
+    for value in (node.arguments,) if type(node) is Call else node:
+        if type(value) in node_types:
+            result.append(value)
+        elif type(value) is list:
+            for item in value:
+                if type(item) in node_types:
+                    result.append(item)
+                elif type(item) is tuple:
+                    result.extend(pair for pair in item if type(pair) in node_types)
+    return result
+
+
+def walk(body):
+    """Yield every node of the statement list body and all nodes below them, in pre-order.
+
+    Runs on an explicit stack, expressions can nest far deeper than the recursion limit.
+    """
+    stack = list(reversed(body))
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(children(node)))
@@ -0,0 +1,155 @@
+"""
+Cache
+-----
+
+On-disk cache of parsed programs, so unchanged sources skip lexing and parsing.
+"""
+import hashlib
+import os
+import pickle
+import random
+import tempfile
+import time
+import zlib
+from koolml import __version__ as version
+from koolml import ast, lexer as lexer_module, parser
+from koolml.ttt import iteritems
+
+# Bump when the entry layout changes.
+FORMAT_VERSION = 1
+
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+
+SUFFIX = '.ast'
+
+TMP_SUFFIX = '.tmp'
+
+# Temporary files older than this are left over from an interrupted store.
+TMP_MAX_AGE = 60 * 60
+
+# Fraction of stores followed by evict(), which lists and stats the whole directory.
+# The directory outgrows max_size by about 1 / EVICT_RATE entries at most.
+EVICT_RATE = 1.0 / 32
+
+# Modules whose code decides what a cached program looks like.
+_PARSER_MODULES = (ast, lexer_module, parser)
+
+_parser_digest = None
+
+
+def parser_digest():
+    """A hash of the sources of the lexer, parser and AST, so editing them invalidates the cache."""
+    global _parser_digest
+    if _parser_digest is None:
+        digest = hashlib.sha256()
+        for module in _PARSER_MODULES:
+            path = os.path.splitext(module.__file__)[0] + '.py'
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+            digest.update(b'\0')
+        _parser_digest = digest.hexdigest()
+    return _parser_digest
+
+
+def default_cache_dir():
+    path = os.environ.get('KOOLML_CACHE_DIR')
+    if not path:
+        path = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                            'koolml')
+    return path
+
+
+class ASTCache(object):
+    """Parsed programs stored as compressed pickles, one file per entry.
+
+    Entries are keyed by a hash of the source, the lexer rules and keywords, the
+    compiler version and the code of the lexer and parser. Hits refresh the file's mtime, and after a sample of the
+    stores (see EVICT_RATE) the least recently used entries are removed until the directory fits in max_size bytes.
+    """
+
+    def __init__(self, path=None, max_size=DEFAULT_MAX_SIZE):
+        self.path = path or default_cache_dir()
+        self.max_size = max_size
+
+    def key(self, s, lexer):
+        digest = hashlib.sha256()
+        for part in (version, FORMAT_VERSION, parser_digest(), lexer.rules, sorted(iteritems(lexer.keywords))):
+            digest.update(repr(part).encode('utf-8'))
+            digest.update(b'\0')
+        digest.update(s.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, key + SUFFIX)
+
+    def load(self, key):
+        """Return (source_lines, program) for key, or None on a miss."""
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.loads(zlib.decompress(f.read()))
+            os.utime(path, None)
+        except (IOError, OSError):
+            return None
+        except Exception:
+            # Truncated or stale entry: drop it and parse again.
+            self._remove(path)
+            return None
+        return entry
+
+    def store(self, key, source_lines, program):
+        try:
+            data = zlib.compress(pickle.dumps((list(source_lines), program), pickle.HIGHEST_PROTOCOL))
+        except RecursionError:
+            # pickle recurses per nesting level, very deep programs are just not cached.
+            return
+        tmp_path = None
+        try:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path)
+            fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=TMP_SUFFIX)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._entry_path(key))
+            tmp_path = None
+        except (IOError, OSError):
+            # A read-only or full cache directory must not break compilation.
+            return
+        finally:
+            if tmp_path is not None:
+                self._remove(tmp_path)
+        if random.random() < EVICT_RATE:
+            self.evict()
+
+    def evict(self):
+        """Remove least recently used entries past max_size, and stale temporary files."""
+        entries = []
+        total = 0
+        now = time.time()
+        for name in os.listdir(self.path):
+            if not name.endswith((SUFFIX, TMP_SUFFIX)):
+                continue
+            path = os.path.join(self.path, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if name.endswith(TMP_SUFFIX):
+                # Recent ones may still be written by another compile.
+                if now - stat.st_mtime > TMP_MAX_AGE:
+                    self._remove(path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            self._remove(path)
+            total -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
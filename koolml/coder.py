@@ -1,13 +1,621 @@
-
+from string import Template
 
 ListClass = '''
 import java.util.*;
 
 
-class List<T> extends LinkedList {
+// Immutable list. The length is cached, so size and the length checks of list
+// patterns are O(1); head and tail are O(1) in every implementation.
+abstract class List<T> implements Iterable<T> {
+    final int length;
+
+    List(int length) {
+        this.length = length;
+    }
+
+    abstract T head();
+
+    abstract List<T> tail();
+
+    static <T> List<T> empty() {
+        return Cons.empty();
+    }
+
+    static <T> List<T> cons(T head, List<T> tail) {
+        return new Cons<T>(head, tail);
+    }
+
+    @SafeVarargs
+    static <T> List<T> of(T... items) {
+        List<T> list = empty();
+        for (int i = items.length - 1; i >= 0; i--) {
+            list = new Cons<T>(items[i], list);
+        }
+        return list;
+    }
+
+    boolean isEmpty() {
+        return length == 0;
+    }
+
+    int size() {
+        return length;
+    }
+
+    T get(int index) {
+        if (index < 0 || index >= length) {
+            throw new IndexOutOfBoundsException("Index: " + index + ", Size: " + length);
+        }
+        List<T> list = this;
+        for (int i = 0; i < index; i++) {
+            list = list.tail();
+        }
+        return list.head();
+    }
+
+    boolean contains(Object value) {
+        for (T item : this) {
+            if (Objects.equals(item, value)) {
+                return true;
+            }
+        }
+        return false;
+    }
+
+    public Iterator<T> iterator() {
+        return new Iterator<T>() {
+            private List<T> next = List.this;
+
+            public boolean hasNext() {
+                return next.length != 0;
+            }
+
+            public T next() {
+                T head = next.head();
+                next = next.tail();
+                return head;
+            }
+        };
+    }
+
+    public boolean equals(Object other) {
+        if (!(other instanceof List)) {
+            return false;
+        }
+        List<?> list = (List<?>) other;
+        if (length != list.length) {
+            return false;
+        }
+        Iterator<?> items = list.iterator();
+        for (T item : this) {
+            if (!Objects.equals(item, items.next())) {
+                return false;
+            }
+        }
+        return true;
+    }
+
+    public int hashCode() {
+        int hash = 1;
+        for (T item : this) {
+            hash = 31 * hash + Objects.hashCode(item);
+        }
+        return hash;
+    }
+
+    public String toString() {
+        StringBuilder out = new StringBuilder("[");
+        String separator = "";
+        for (T item : this) {
+            out.append(separator).append(item);
+            separator = ", ";
+        }
+        return out.append(']').toString();
+    }
+}
+
+
+// Cons list, lists built on a tail share it.
+final class Cons<T> extends List<T> {
+    private static final Cons<Object> EMPTY = new Cons<Object>(null, null);
+
+    private final T head;
+    private final List<T> tail;
+
+    Cons(T head, List<T> tail) {
+        super(tail == null ? 0 : tail.length + 1);
+        this.head = head;
+        this.tail = tail;
+    }
+
+    @SuppressWarnings("unchecked")
+    static <T> List<T> empty() {
+        return (List<T>) EMPTY;
+    }
+
+    T head() {
+        if (length == 0) {
+            throw new NoSuchElementException();
+        }
+        return head;
+    }
+
+    List<T> tail() {
+        if (length == 0) {
+            throw new NoSuchElementException();
+        }
+        return tail;
+    }
+}
+
+'''
+
+# Array-backed lists of primitives, see types.specialized_lists.
+_primitive_list = Template('''
+// Immutable list of $prim values stored unboxed in an array. Tails are views of the
+// same array, and appending to the newest list of an array fills its spare capacity
+// in place, so building a list by appending is amortized O(1).
+final class $Name extends List<$Boxed> implements RandomAccess {
+    // The array and how much of it is used, shared by the lists viewing it.
+    private static final class Store {
+        final $prim[] items;
+        int fill;
+
+        Store($prim[] items, int fill) {
+            this.items = items;
+            this.fill = fill;
+        }
+    }
+
+    private final Store store;
+    private final int offset;
+
+    private $Name(Store store, int offset, int length) {
+        super(length);
+        this.store = store;
+        this.offset = offset;
+    }
+
+    // The list of items, which it keeps without copying.
+    static $Name wrap($prim... items) {
+        return new $Name(new Store(items, items.length), 0, items.length);
+    }
+
+    $prim at(int index) {
+        if (index < 0 || index >= length) {
+            throw new IndexOutOfBoundsException("Index: " + index + ", Size: " + length);
+        }
+        return store.items[offset + index];
+    }
+
+    $Boxed get(int index) {
+        return at(index);
+    }
+
+    $Boxed head() {
+        if (length == 0) {
+            throw new NoSuchElementException();
+        }
+        return store.items[offset];
+    }
+
+    $Name tail() {
+        if (length == 0) {
+            throw new NoSuchElementException();
+        }
+        return new $Name(store, offset + 1, length - 1);
+    }
+
+    $Name add($prim value) {
+        Store store = this.store;
+        int start = offset;
+        if (start + length != store.fill || store.fill == store.items.length) {
+            store = new Store(Arrays.copyOfRange(store.items, start, start + Math.max(8, 2 * length)), length);
+            start = 0;
+        }
+        store.items[store.fill++] = value;
+        return new $Name(store, start, length + 1);
+    }
+
+    public Iterator<$Boxed> iterator() {
+        return new Iterator<$Boxed>() {
+            private int next = 0;
+
+            public boolean hasNext() {
+                return next < length;
+            }
+
+            public $Boxed next() {
+                if (next >= length) {
+                    throw new NoSuchElementException();
+                }
+                return store.items[offset + next++];
+            }
+        };
+    }
+}
+
+''')
+
+IntListClass = _primitive_list.substitute(Name='IntList', prim='int', Boxed='Integer')
+DoubleListClass = _primitive_list.substitute(Name='DoubleList', prim='double', Boxed='Double')
+BoolListClass = _primitive_list.substitute(Name='BoolList', prim='boolean', Boxed='Boolean')
+
+OpsClass = '''
+class Ops {
+    static int sq(int x) {
+        return x * x;
+    }
+
+    static double sq(double x) {
+        return x * x;
+    }
+}
+
+'''
+
+BounceClass = '''
+interface Bounce {
+    Object next();
+
+    static Object run(Object value) {
+        while (value instanceof Bounce) {
+            value = ((Bounce) value).next();
+        }
+        return value;
+    }
+}
+
+'''
+
+RangeClass = '''
+// The ints from start up to end, computed on demand. A List like any other, its tails
+// are ranges too.
+final class Range extends List<Integer> implements RandomAccess {
+    final int start;
+    // Exclusive, a long so the closed range up to Integer.MAX_VALUE fits.
+    final long end;
+
+    Range(int start, int end) {
+        this(start, (long) end);
+    }
+
+    private Range(int start, long end) {
+        super((int) Math.min(Math.max(end - start, 0), Integer.MAX_VALUE));
+        this.start = start;
+        this.end = Math.max(start, end);
+    }
+
+    static Range closed(int first, int last) {
+        return new Range(first, (long) last + 1);
+    }
+
+    Integer get(int index) {
+        if (index < 0 || index >= end - start) {
+            throw new IndexOutOfBoundsException("Index: " + index + ", Size: " + length);
+        }
+        return start + index;
+    }
+
+    Integer head() {
+        if (length == 0) {
+            throw new NoSuchElementException();
+        }
+        return start;
+    }
+
+    Range tail() {
+        if (length == 0) {
+            throw new NoSuchElementException();
+        }
+        // start + 1 overflows when start is the last int.
+        return end - start == 1 ? new Range(start, (long) start) : new Range(start + 1, end);
+    }
+
+    boolean contains(Object value) {
+        if (!(value instanceof Integer)) {
+            return false;
+        }
+        int i = (Integer) value;
+        return i >= start && i < end;
+    }
+
+    public Iterator<Integer> iterator() {
+        return new Iterator<Integer>() {
+            private long next = start;
+
+            public boolean hasNext() {
+                return next < end;
+            }
+
+            public Integer next() {
+                if (next >= end) {
+                    throw new NoSuchElementException();
+                }
+                return (int) next++;
+            }
+        };
+    }
+}
+
+'''
+
+DictClass = '''
+// Persistent hash map, a hash array mapped trie. Each level of the trie indexes five
+// bits of the key hash, so lookups and updates visit O(log32 n) nodes. Updates copy the
+// nodes on the path to the key and share the rest: the old Dict stays valid.
+final class Dict<K, V> {
+    private static final Object MISSING = new Object();
+    private static final Dict<Object, Object> EMPTY = new Dict<Object, Object>(Node.EMPTY, 0);
+
+    // A trie node. Below the last level of hash bits it holds the keys whose hashes
+    // collide, as key, value pairs. Above it, bitmap has a bit for each hash fragment
+    // present and entries holds, in bit order, a key and its value or null and the
+    // child node holding the keys sharing that fragment.
+    private static final class Node {
+        static final Node EMPTY = new Node(0, new Object[0]);
+
+        final int bitmap;
+        final Object[] entries;
+
+        Node(int bitmap, Object[] entries) {
+            this.bitmap = bitmap;
+            this.entries = entries;
+        }
+
+        Object find(Object key, int hash, int shift) {
+            if (shift >= 32) {
+                for (int i = 0; i < entries.length; i += 2) {
+                    if (Objects.equals(entries[i], key)) {
+                        return entries[i + 1];
+                    }
+                }
+                return MISSING;
+            }
+            int bit = 1 << ((hash >>> shift) & 31);
+            if ((bitmap & bit) == 0) {
+                return MISSING;
+            }
+            int i = 2 * Integer.bitCount(bitmap & (bit - 1));
+            Object value = entries[i + 1];
+            if (value instanceof Node) {
+                return ((Node) value).find(key, hash, shift + 5);
+            }
+            return Objects.equals(entries[i], key) ? value : MISSING;
+        }
+
+        // The node with key mapped to value, this when it already is; added[0] is set
+        // when the key is new.
+        Node plus(Object key, Object value, int hash, int shift, boolean[] added) {
+            if (shift >= 32) {
+                for (int i = 0; i < entries.length; i += 2) {
+                    if (Objects.equals(entries[i], key)) {
+                        return entries[i + 1] == value ? this : replace(i + 1, value);
+                    }
+                }
+                added[0] = true;
+                return new Node(0, insert(entries.length, key, value));
+            }
+            int bit = 1 << ((hash >>> shift) & 31);
+            int i = 2 * Integer.bitCount(bitmap & (bit - 1));
+            if ((bitmap & bit) == 0) {
+                added[0] = true;
+                return new Node(bitmap | bit, insert(i, key, value));
+            }
+            Object current = entries[i + 1];
+            Node child;
+            if (current instanceof Node) {
+                child = ((Node) current).plus(key, value, hash, shift + 5, added);
+                if (child == current) {
+                    return this;
+                }
+            } else if (Objects.equals(entries[i], key)) {
+                return current == value ? this : replace(i + 1, value);
+            } else {
+                // Two keys share the fragment, both move one level down.
+                child = EMPTY.plus(entries[i], current, hash(entries[i]), shift + 5, new boolean[1])
+                        .plus(key, value, hash, shift + 5, added);
+            }
+            Node node = replace(i + 1, child);
+            node.entries[i] = null;
+            return node;
+        }
+
+        // The node without key, this when it has no such key, null when it is left empty.
+        Node minus(Object key, int hash, int shift) {
+            if (shift >= 32) {
+                for (int i = 0; i < entries.length; i += 2) {
+                    if (Objects.equals(entries[i], key)) {
+                        return entries.length == 2 ? null : new Node(0, remove(i));
+                    }
+                }
+                return this;
+            }
+            int bit = 1 << ((hash >>> shift) & 31);
+            if ((bitmap & bit) == 0) {
+                return this;
+            }
+            int i = 2 * Integer.bitCount(bitmap & (bit - 1));
+            Object current = entries[i + 1];
+            if (current instanceof Node) {
+                Node child = ((Node) current).minus(key, hash, shift + 5);
+                if (child == current) {
+                    return this;
+                }
+                if (child != null) {
+                    return replace(i + 1, child);
+                }
+            } else if (!Objects.equals(entries[i], key)) {
+                return this;
+            }
+            return bitmap == bit ? null : new Node(bitmap ^ bit, remove(i));
+        }
+
+        void forEach(java.util.function.BiConsumer<Object, Object> action) {
+            for (int i = 0; i < entries.length; i += 2) {
+                if (entries[i + 1] instanceof Node) {
+                    ((Node) entries[i + 1]).forEach(action);
+                } else {
+                    action.accept(entries[i], entries[i + 1]);
+                }
+            }
+        }
+
+        private Node replace(int index, Object value) {
+            Object[] copy = entries.clone();
+            copy[index] = value;
+            return new Node(bitmap, copy);
+        }
+
+        private Object[] insert(int index, Object key, Object value) {
+            Object[] copy = new Object[entries.length + 2];
+            System.arraycopy(entries, 0, copy, 0, index);
+            copy[index] = key;
+            copy[index + 1] = value;
+            System.arraycopy(entries, index, copy, index + 2, entries.length - index);
+            return copy;
+        }
+
+        private Object[] remove(int index) {
+            Object[] copy = new Object[entries.length - 2];
+            System.arraycopy(entries, 0, copy, 0, index);
+            System.arraycopy(entries, index + 2, copy, index, entries.length - index - 2);
+            return copy;
+        }
+    }
+
+    private final Node root;
+    private final int size;
+
+    private Dict(Node root, int size) {
+        this.root = root;
+        this.size = size;
+    }
+
+    private static int hash(Object key) {
+        return Objects.hashCode(key);
+    }
+
+    @SuppressWarnings("unchecked")
+    static <K, V> Dict<K, V> empty() {
+        return (Dict<K, V>) EMPTY;
+    }
+
+    // The Dict of the keys and values in items, alternating.
+    @SuppressWarnings("unchecked")
+    static <K, V> Dict<K, V> of(Object... items) {
+        Dict<K, V> dict = empty();
+        for (int i = 0; i < items.length; i += 2) {
+            dict = dict.plus((K) items[i], (V) items[i + 1]);
+        }
+        return dict;
+    }
+
+    static <K, V> Dict<K, V> assoc(Dict<K, V> dict, K key, V value) {
+        return dict.plus(key, value);
+    }
+
+    static <K, V> Dict<K, V> dissoc(Dict<K, V> dict, Object key) {
+        return dict.minus(key);
+    }
+
+    int size() {
+        return size;
+    }
+
+    boolean isEmpty() {
+        return size == 0;
+    }
+
+    boolean containsKey(Object key) {
+        return root.find(key, hash(key), 0) != MISSING;
+    }
+
+    // The value of key, null when there is none.
+    @SuppressWarnings("unchecked")
+    V get(Object key) {
+        Object value = root.find(key, hash(key), 0);
+        return value == MISSING ? null : (V) value;
+    }
+
+    Dict<K, V> plus(K key, V value) {
+        boolean[] added = new boolean[1];
+        Node root = this.root.plus(key, value, hash(key), 0, added);
+        return root == this.root ? this : new Dict<K, V>(root, added[0] ? size + 1 : size);
+    }
+
+    Dict<K, V> minus(Object key) {
+        Node root = this.root.minus(key, hash(key), 0);
+        if (root == this.root) {
+            return this;
+        }
+        return root == null ? Dict.<K, V>empty() : new Dict<K, V>(root, size - 1);
+    }
+
+    @SuppressWarnings("unchecked")
+    void forEach(java.util.function.BiConsumer<? super K, ? super V> action) {
+        root.forEach((key, value) -> action.accept((K) key, (V) value));
+    }
+
+    public boolean equals(Object other) {
+        if (!(other instanceof Dict)) {
+            return false;
+        }
+        Dict<?, ?> dict = (Dict<?, ?>) other;
+        if (size != dict.size) {
+            return false;
+        }
+        boolean[] equal = {true};
+        root.forEach((key, value) -> {
+            if (equal[0]) {
+                Object found = dict.root.find(key, hash(key), 0);
+                equal[0] = found != MISSING && Objects.equals(found, value);
+            }
+        });
+        return equal[0];
+    }
+
+    public int hashCode() {
+        int[] hash = {0};
+        root.forEach((key, value) -> hash[0] += Objects.hashCode(key) ^ Objects.hashCode(value));
+        return hash[0];
+    }
+
+    public String toString() {
+        StringBuilder out = new StringBuilder("{");
+        root.forEach((key, value) -> {
+            if (out.length() > 1) {
+                out.append(", ");
+            }
+            out.append(key).append('=').append(value);
+        });
+        return out.append('}').toString();
+    }
+}
+
+'''
+
+MapsClass = '''
+// The Map literals, HashMaps sized for their entries so filling them never rehashes.
+final class Maps {
+    // The Map of the keys and values in items, alternating.
+    @SuppressWarnings("unchecked")
+    static <K, V> Map<K, V> of(Object... items) {
+        int size = items.length / 2;
+        // A HashMap grows once it is three quarters full.
+        Map<K, V> map = new HashMap<K, V>(size + size / 3 + 1);
+        for (int i = 0; i < items.length; i += 2) {
+            map.put((K) items[i], (V) items[i + 1]);
+        }
+        return map;
+    }
 }
 
 '''
 
 runner = '''
-'''
\ No newline at end of file
+'''
+
+# Runtime classes written ahead of the generated code.
+runtime = (ListClass + IntListClass + DoubleListClass + BoolListClass + OpsClass + BounceClass + RangeClass +
+           DictClass + MapsClass)
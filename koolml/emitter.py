@@ -0,0 +1,67 @@
+"""
+Emitter
+-------
+
+Buffered, indentation-aware writer for generated code.
+"""
+
+
+class NullSink(object):
+    """Drops everything written to it, for code that is only checked."""
+
+    def write(self, text):
+        pass
+
+
+class Emitter(object):
+    """Writes generated code to a sink while it is produced.
+
+    sink is anything with a write() method, such as an open file or io.StringIO, or a
+    list that collects the chunks; by default a new list. Fragments are buffered and
+    handed to the sink in blocks of about buffer_size characters, and every line is
+    indented by the current block level.
+    """
+
+    def __init__(self, sink=None, indent_symbol='\t', buffer_size=64 * 1024):
+        self.sink = [] if sink is None else sink
+        self._sink_write = self.sink.append if isinstance(self.sink, list) else self.sink.write
+        self.indent_symbol = indent_symbol
+        self.buffer_size = buffer_size
+        self.level = 0
+        self._buffer = []
+        self._buffered = 0
+
+    def write(self, text):
+        """Write text as is, without indentation or newline."""
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def line(self, text=''):
+        if text:
+            self.write(self.indent_symbol * self.level + text + '\n')
+        else:
+            self.write('\n')
+
+    def begin(self, header):
+        """Write `header {` and indent the lines that follow."""
+        self.line(header + ' {')
+        self.level += 1
+
+    def end(self, footer='}'):
+        self.level -= 1
+        self.line(footer)
+
+    def flush(self):
+        if self._buffer:
+            self._sink_write(''.join(self._buffer))
+            self._buffer = []
+            self._buffered = 0
+
+    def getvalue(self):
+        """Everything written so far, for list and io.StringIO sinks."""
+        self.flush()
+        if isinstance(self.sink, list):
+            return ''.join(self.sink)
+        return self.sink.getvalue()
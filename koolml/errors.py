@@ -24,12 +24,39 @@ class AbrvalgSyntaxCompileTimeError(Exception):
         self.column = column
 
 
-def report_syntax_error(lexer, error, length=1):
+def print_syntax_error(lexer, error, length=1):
     line = error.line
     column = error.column
     source_line = lexer.source_lines[line - 1]
     print('\033[91m{}\033[0m: {} at line {}, column {}'.format(error.error, error.message, line, column))
     print('{} | {}\n{}\033[91m{}\033[0m'.format(line, source_line, ' ' * (column + 3), '^' * length))
+
+
+def report_syntax_error(lexer, error, length=1):
+    print_syntax_error(lexer, error, length)
     exit(4)
-    
 
+
+class Diagnostics(object):
+    """Errors collected while compiling one source.
+
+    Evaluators report into the sink and carry on where it is safe, so a single compile
+    finds every error. The caller decides what to do with them at the end.
+    """
+
+    def __init__(self, lexer=None):
+        self.lexer = lexer
+        self.errors = []
+
+    def report(self, error, length=1):
+        self.errors.append((error, length))
+
+    def print_errors(self):
+        for error, length in self.errors:
+            print_syntax_error(self.lexer, error, length)
+
+    def __len__(self):
+        return len(self.errors)
+
+    def __iter__(self):
+        return iter(self.errors)
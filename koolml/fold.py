@@ -0,0 +1,230 @@
+"""
+Fold
+----
+
+Constant folding over the parsed program, run before name resolution.
+
+Operators whose operands are literals are replaced by their result, computed with
+Java semantics: int arithmetic wraps at 32 bits and truncates division, double
+arithmetic is IEEE, and results Java would only produce at run time (division by
+zero, infinities, out of range int literals) are left alone. Comparisons, ! and the
+boolean operators fold to the true and false identifiers, and literal strings
+concatenated with strings, ints and booleans fold to one literal.
+
+Unchanged subtrees are kept as they are, so only the folded parts are new nodes.
+"""
+import math
+from koolml import ast
+from koolml.lexer import Token
+
+INT_MIN = -2 ** 31
+INT_MAX = 2 ** 31 - 1
+
+BOOLEANS = ('true', 'false')
+
+ARITHMETIC = frozenset(['+', '-', '*', '/', '%'])
+
+COMPARISONS = {
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+}
+
+
+def wrap_int(value):
+    return (value - INT_MIN) % 2 ** 32 + INT_MIN
+
+
+def is_int(node):
+    return type(node) is ast.Number and type(node.value) is int and INT_MIN <= node.value <= INT_MAX
+
+
+def is_number(node):
+    return is_int(node) or (type(node) is ast.Number and type(node.value) is float)
+
+
+def boolean_value(node):
+    """True or False for the true and false identifiers, None for anything else."""
+    if type(node) is ast.Identifier and node.value.value in BOOLEANS:
+        return node.value.value == 'true'
+    return None
+
+
+def boolean(value, token):
+    """The true or false identifier, positioned at token."""
+    name = 'true' if value else 'false'
+    return ast.Identifier(Token('NAME', name, token.line, token.column))
+
+
+def _arithmetic(operator, a, b, ints):
+    if operator == '+':
+        value = a + b
+    elif operator == '-':
+        value = a - b
+    elif operator == '*':
+        value = a * b
+    elif b == 0:
+        # Throws, or is an infinity or NaN, at run time.
+        return None
+    elif ints:
+        # Java truncates toward zero, the remainder takes the sign of the dividend.
+        quotient = abs(a) // abs(b)
+        if (a < 0) != (b < 0):
+            quotient = -quotient
+        value = quotient if operator == '/' else a - b * quotient
+    elif operator == '/':
+        value = a / b
+    else:
+        value = math.fmod(a, b)
+    if ints:
+        return ast.Number(wrap_int(value))
+    value = float(value)
+    return ast.Number(value) if math.isfinite(value) else None
+
+
+def _string_part(node):
+    """The text node contributes to a string concatenation, None if unknown."""
+    if type(node) is ast.String:
+        return node.value
+    if is_int(node):
+        return str(node.value)
+    value = boolean_value(node)
+    if value is not None:
+        return 'true' if value else 'false'
+    return None
+
+
+def fold_binary(node, token):
+    """The folded form of a BinaryOperator whose operands are already folded, or node.
+
+    token is where the source of node starts, a comparison folds to a boolean there.
+    """
+    operator, left, right = node.operator, node.left, node.right
+    if operator in ('&&', '||'):
+        a = boolean_value(left)
+        b = boolean_value(right)
+        # Short-circuit: a constant left side decides whether right runs at all.
+        if a is not None:
+            if a == (operator == '||'):
+                return left
+            return right
+        if b is not None and b == (operator == '&&'):
+            # x && true, x || false
+            return left
+        return node
+    if is_number(left) and is_number(right):
+        if operator in COMPARISONS:
+            if token is None:
+                # Nothing to position the boolean at.
+                return node
+            return boolean(COMPARISONS[operator](left.value, right.value), token)
+        if operator not in ARITHMETIC:
+            # Ranges.
+            return node
+        folded = _arithmetic(operator, left.value, right.value, is_int(left) and is_int(right))
+        return node if folded is None else folded
+    if operator == '+' and (type(left) is ast.String or type(right) is ast.String):
+        a = _string_part(left)
+        b = _string_part(right)
+        if a is not None and b is not None:
+            return ast.String(a + b)
+        return node
+    if operator in ('==', '!='):
+        if type(left) is ast.String and type(right) is ast.String:
+            # Literals are interned, reference equality is value equality.
+            equal = left.value == right.value
+        elif boolean_value(left) is not None and boolean_value(right) is not None:
+            equal = boolean_value(left) == boolean_value(right)
+        else:
+            return node
+        if token is None:
+            return node
+        return boolean(equal == (operator == '=='), token)
+    return node
+
+
+def fold_unary(node):
+    right = node.right
+    if node.operator == '-' and is_number(right):
+        return ast.Number(wrap_int(-right.value) if is_int(right) else -right.value)
+    if node.operator == '!' and boolean_value(right) is not None:
+        return boolean(not boolean_value(right), right.value)
+    return node
+
+
+_REBUILD = {
+    ast.BinaryOperator: lambda node, args, token: fold_binary(ast.BinaryOperator(node.operator, args[0], args[1]),
+                                                              token),
+    ast.UnaryOperator: lambda node, args, token: fold_unary(ast.UnaryOperator(node.operator, args[0])),
+    ast.Call: lambda node, args, token: ast.Call(node.left, args),
+    ast.Array: lambda node, args, token: ast.Array(args),
+    ast.Dictionary: lambda node, args, token: ast.Dictionary(list(zip(args[::2], args[1::2]))),
+    ast.SubscriptOperator: lambda node, args, token: ast.SubscriptOperator(args[0], args[1]),
+}
+
+
+def fold_expression(node, token):
+    """Fold an expression, token is the position of the statement holding it."""
+    # Post-order on explicit stacks, like the typer. tokens holds the first token of
+    # the source of each finished child, None for literals, which keep no position:
+    # a comparison of literals is positioned at the last token before it instead.
+    results = []
+    tokens = []
+    preceding = token
+    work = [(node, False)]
+    while work:
+        node, done = work.pop()
+        children = ast.children(node) if type(node) in _REBUILD else None
+        if not children:
+            results.append(node)
+            tokens.append(node.value if type(node) is ast.Identifier else None)
+            preceding = tokens[-1] or preceding
+            continue
+        if not done:
+            if type(node) is ast.Call:
+                preceding = node.left.value
+            work.append((node, True))
+            work.extend((child, False) for child in reversed(children))
+            continue
+        start = len(results) - len(children)
+        args = results[start:]
+        if type(node) is ast.Call:
+            first = node.left.value
+        else:
+            first = next((t for t in tokens[start:] if t is not None), None)
+        del results[start:], tokens[start:]
+        if all(arg is child for arg, child in zip(args, children)):
+            # Nothing below changed, but the operator itself may still fold.
+            if type(node) is ast.BinaryOperator:
+                node = fold_binary(node, first or preceding)
+            elif type(node) is ast.UnaryOperator:
+                node = fold_unary(node)
+            results.append(node)
+        else:
+            results.append(_REBUILD[type(node)](node, args, first or preceding))
+        tokens.append(first)
+    return results[0]
+
+
+def fold(node, token=None):
+    """Fold the constant expressions in node, a statement, list of them or expression.
+
+    token is a position for the booleans comparisons of literals fold to, the first
+    token of the enclosing statement.
+    """
+    tp = type(node)
+    if tp is list:
+        folded = [fold(item, token) for item in node]
+        return node if all(a is b for a, b in zip(folded, node)) else folded
+    if tp not in ast.node_types or tp is ast.Instance:
+        return node
+    token = next((value for value in node if type(value) is Token), token)
+    if tp in _REBUILD:
+        return fold_expression(node, token)
+    values = [fold(value, token) for value in node]
+    if all(a is b for a, b in zip(values, node)):
+        return node
+    return tp(*values)
@@ -0,0 +1,689 @@
+"""
+Inference
+---------
+
+Hindley-Milner style type inference run after name resolution.
+
+Types are unified over the resolved program: untyped parameters and missing return
+types get type variables, every use constrains them, and each function is generalized
+once its body is inferred, so calls with different argument types instantiate fresh
+copies. What is still unknown at the end is emitted as Object, or as a type parameter
+of the generic method when it was generalized.
+
+Unification failures are not reported: the typer only refines the types the code
+generator emits, the checks stay where they are.
+"""
+from collections import namedtuple
+from koolml import ast
+from koolml.types import generic_types
+
+
+class TypeVariable(object):
+
+    __slots__ = ('instance',)
+
+    def __init__(self):
+        self.instance = None
+
+
+TypeOperator = namedtuple('TypeOperator', ['name', 'args'])
+
+# A generalized function type, variables are instantiated anew at every call.
+Scheme = namedtuple('Scheme', ['variables', 'type'])
+
+Typing = namedtuple('Typing', ['types', 'type_params', 'concats', 'arithmetic', 'arguments'])
+
+INTEGER = TypeOperator('Integer', ())
+DOUBLE = TypeOperator('Double', ())
+STRING = TypeOperator('String', ())
+BOOLEAN = TypeOperator('Boolean', ())
+OBJECT = TypeOperator('Object', ())
+VOID = TypeOperator('void', ())
+# The kinds of dictionary: the persistent Dict (see coder.DictClass) and the mutable
+# java.util.Map.
+DICT = TypeOperator('Dict', ())
+MAP = TypeOperator('Map', ())
+DICTIONARY_KINDS = {'Dict': DICT, 'Map': MAP}
+
+NUMERIC = (INTEGER, DOUBLE)
+
+ARITHMETIC_OPERATORS = frozenset(['+', '-', '*', '/', '%'])
+COMPARISON_OPERATORS = frozenset(['>', '>=', '<', '<=', '==', '!='])
+EQUALITY_OPERATORS = frozenset(['==', '!='])
+LOGICAL_OPERATORS = frozenset(['&&', '||'])
+RANGE_OPERATORS = frozenset(['..', '...'])
+
+# Builtins returning their first argument, a Dict, updated.
+DICT_BUILTINS = frozenset(['assoc', 'dissoc'])
+
+BUILTIN_RESULTS = {
+    'print': VOID,
+    'println': VOID,
+    'readline': STRING,
+    'readInt': INTEGER,
+}
+
+TYPE_PARAMETER_NAMES = ['T', 'U', 'V', 'W']
+
+
+def list_of(element):
+    return TypeOperator('List', (element,))
+
+
+def dictionary_of(kind, key, value):
+    """Dict<key, value> or Map<key, value>, kind is DICT, MAP or a variable standing for either."""
+    return TypeOperator('Dictionary', (kind, key, value))
+
+
+def function_of(params, result):
+    return TypeOperator('Function', tuple(params) + (result,))
+
+
+def prune(t):
+    """The type t stands for, following and compressing bound variables."""
+    root = t
+    while type(root) is TypeVariable and root.instance is not None:
+        root = root.instance
+    while t is not root and t.instance is not root:
+        t.instance, t = root, t.instance
+    return root
+
+
+# Types nest as deep as the expressions they come from, so every walk over one runs on
+# an explicit stack.
+
+def occurs_in(variable, t):
+    stack = [t]
+    while stack:
+        t = prune(stack.pop())
+        if t is variable:
+            return True
+        if type(t) is TypeOperator:
+            stack.extend(t.args)
+    return False
+
+
+def unify(a, b):
+    """Make a and b the same type, returns False when they can't be.
+
+    Object unifies with anything without constraining it. Arguments are unified left to
+    right, and the ones after a failure still are.
+    """
+    ok = True
+    work = [(a, b)]
+    while work:
+        a, b = work.pop()
+        a = prune(a)
+        b = prune(b)
+        if type(a) is not TypeVariable and type(b) is TypeVariable:
+            a, b = b, a
+        if type(a) is TypeVariable:
+            if a is not b:
+                if occurs_in(a, b):
+                    ok = False
+                else:
+                    a.instance = b
+        elif a == OBJECT or b == OBJECT:
+            pass
+        elif a.name != b.name or len(a.args) != len(b.args):
+            ok = False
+        else:
+            work.extend(reversed(list(zip(a.args, b.args))))
+    return ok
+
+
+def free_variables(t, out):
+    """Append the unbound variables of t to out in order of appearance, once each."""
+    stack = [t]
+    while stack:
+        t = prune(stack.pop())
+        if type(t) is TypeVariable:
+            if t not in out:
+                out.append(t)
+        else:
+            stack.extend(reversed(t.args))
+    return out
+
+
+def fold_type(t, variable, operator, memo=None):
+    """Fold t bottom-up: variable(v) is the result for an unbound variable, operator(t, args)
+    the result for a TypeOperator given the results for its arguments.
+
+    memo, when given, maps id(TypeOperator) to its result across calls, so the types
+    nested literals share are folded once.
+    """
+    results = []
+    work = [(t, False)]
+    while work:
+        t, done = work.pop()
+        t = prune(t)
+        if type(t) is TypeVariable:
+            results.append(variable(t))
+        elif memo is not None and id(t) in memo:
+            results.append(memo[id(t)])
+        elif not done and t.args:
+            work.append((t, True))
+            work.extend((arg, False) for arg in reversed(t.args))
+        else:
+            start = len(results) - len(t.args)
+            args = results[start:]
+            del results[start:]
+            result = operator(t, args)
+            if memo is not None:
+                memo[id(t)] = result
+            results.append(result)
+    return results[0]
+
+
+def instantiate(t):
+    if type(t) is not Scheme:
+        return t
+    if not t.variables:
+        return t.type
+    fresh = {variable: TypeVariable() for variable in t.variables}
+    return fold_type(t.type, lambda variable: fresh.get(variable, variable),
+                     lambda t, args: TypeOperator(t.name, tuple(args)))
+
+
+def type_term(typ):
+    """The type an ast.Type annotation denotes."""
+    name = typ.name.value
+    if name in ('Any', 'Object'):
+        return OBJECT
+    args = typ.args if isinstance(typ.args, list) else []
+    if name in DICTIONARY_KINDS:
+        params = [type_term(arg) for arg in args[:2]]
+        params += [TypeVariable() for _ in range(2 - len(params))]
+        return dictionary_of(DICTIONARY_KINDS[name], params[0], params[1])
+    if name in generic_types:
+        params = [type_term(arg) for arg in args]
+        params += [TypeVariable() for _ in range(generic_types[name]['args_n'] - len(params))]
+        return TypeOperator(name, tuple(params))
+    # Unknown types are reported by the code generator, here they only equal themselves.
+    return TypeOperator(name, ())
+
+
+def java_type(t, names, top=True, memo=None):
+    """Render t as a Java type, unbound variables by names or as Object.
+
+    memo is passed on to fold_type, it must only be shared between calls with the same
+    names.
+    """
+    if top and prune(t) == VOID:
+        return 'void'
+
+    def operator(t, args):
+        if t == VOID:
+            return 'Object'
+        if not args:
+            return t.name
+        name = t.name
+        if name == 'Dictionary':
+            kind = prune(t.args[0])
+            name = kind.name if type(kind) is TypeOperator else DICT.name
+            args = args[1:]
+        return '{}<{}>'.format(name, ', '.join(args))
+
+    return fold_type(t, lambda variable: names.get(variable, 'Object'), operator, memo)
+
+
+# The function whose body is being inferred: its type, result and whether a return
+# passed a value.
+FunctionContext = namedtuple('FunctionContext', ['node', 'type', 'result', 'returns_value'])
+
+
+class Typer(object):
+    """Infers the types of one program.
+
+    bindings and declarations come from koolml.resolver; symbol_types maps Symbol ids
+    to their type or Scheme and is kept by the caller, so later programs in the same
+    environment see the types of earlier ones.
+    """
+
+    def __init__(self, bindings, declarations, symbol_types):
+        self.bindings = bindings
+        self.declarations = declarations
+        self.symbol_types = symbol_types
+        self.functions = []
+        # id(node) -> type of the module functions declared ahead of their definition.
+        self.hoisted = {}
+        # (node, element type, enclosing function) of the for loops, list patterns and
+        # list literals.
+        self.elements = []
+        # (node, type, enclosing function) of the subjects of Match nodes.
+        self.subjects = []
+        # (node, type, enclosing function) of the dictionary literals, the kinds they
+        # were given and (node, kind) of the subscripts indexing a dictionary. The kind
+        # of a literal follows from where it is used, see typing.
+        self.dictionaries = []
+        self.kinds = set()
+        self.subscripts = []
+        # (node, collection, key, result) of the subscripts of a collection not known
+        # to be a List or a dictionary yet, and id(node) of the subscripts assigned to.
+        self.pending = []
+        self.written = set()
+        # id(node) of a generic Function -> the pending subscripts of its parameters,
+        # the first call passing a List or a dictionary decides which they index.
+        self.deferred = {}
+        # The variables operands of arithmetic and comparisons have, see typing.
+        self.numeric = []
+        self.generalized = []
+        # (node, parameter types, enclosing function) of the calls of program functions.
+        self.calls = []
+        # (node, left, right, result) of every binary operator, the types are only
+        # known at the end.
+        self.operators = []
+        self._statements = {
+            ast.Assignment: self._assignment,
+            ast.Condition: self._condition,
+            ast.Match: self._match,
+            ast.WhileLoop: self._while_loop,
+            ast.ForLoop: self._for_loop,
+            ast.Function: self._function,
+            ast.Module: self._module,
+            ast.Return: self._return,
+            ast.TypedVariable: self._typed_variable,
+            ast.Break: self._nothing,
+            ast.Continue: self._nothing,
+        }
+
+    def declare(self, node, t):
+        symbol = self.declarations.get(id(node))
+        if symbol is not None:
+            self.symbol_types[symbol.id] = t
+
+    def symbol_type(self, symbol):
+        if symbol is None:
+            return TypeVariable()
+        t = self.symbol_types.get(symbol.id)
+        if t is not None:
+            return instantiate(t)
+        if isinstance(symbol.node, ast.Identifier) and symbol.name in ('true', 'false'):
+            return BOOLEAN
+        return TypeVariable()
+
+    def statements(self, body):
+        for node in body:
+            self.statement(node)
+
+    def statement(self, node):
+        handler = self._statements.get(type(node))
+        if handler is not None:
+            handler(node)
+        else:
+            self.expression(node)
+
+    def body(self, body):
+        """A statement list, or an expression body returning its value."""
+        if isinstance(body, list):
+            self.statements(body)
+        elif body is not None:
+            self.returns(self.expression(body), body)
+
+    def returns(self, t, value):
+        if self.functions:
+            context = self.functions[-1]
+            unify(context.result, t)
+            symbol = self.bindings.get(id(value)) if type(value) is ast.Call else None
+            if symbol is None or symbol.node is not context.node:
+                # Returning the own call passes no value of its own: a function whose
+                # returns all are self calls is void.
+                context.returns_value[0] = True
+
+    def expression(self, node):
+        # Post-order on explicit stacks, results holds the types of finished children.
+        results = []
+        work = [(node, False)]
+        while work:
+            node, done = work.pop()
+            children = ast.children(node)
+            if children and not done:
+                work.append((node, True))
+                work.extend((child, False) for child in reversed(children))
+                continue
+            if children:
+                args = results[-len(children):]
+                del results[-len(children):]
+            else:
+                args = []
+            results.append(self._combine(node, args))
+        return results[0]
+
+    def _combine(self, node, args):
+        tp = type(node)
+        if tp is ast.Number:
+            return DOUBLE if isinstance(node.value, float) else INTEGER
+        elif tp is ast.String:
+            return STRING
+        elif tp is ast.Identifier:
+            return self.symbol_type(self.bindings.get(id(node)))
+        elif tp is ast.BinaryOperator:
+            t = self._binary_operator(node.operator, args[0], args[1])
+            self.operators.append((node, args[0], args[1], t))
+            return t
+        elif tp is ast.UnaryOperator:
+            if node.operator == '!':
+                unify(args[0], BOOLEAN)
+                return BOOLEAN
+            return args[0]
+        elif tp is ast.Call:
+            return self._call(node, args)
+        elif tp is ast.Array:
+            # Starting from the type of the first item spares an occurs check per
+            # level of nested literals.
+            element = args[0] if args else TypeVariable()
+            if all([unify(element, item) for item in args[1:]]):
+                # Items of mixed types keep the generic List.
+                self.elements.append((node, element, self.functions[-1].node if self.functions else None))
+            return list_of(element)
+        elif tp is ast.Dictionary:
+            return self._dictionary(node, args)
+        elif tp is ast.SubscriptOperator:
+            t = TypeVariable()
+            if type(prune(args[0])) is TypeVariable:
+                # A List or a dictionary, whichever the collection turns out to be.
+                self.pending.append((node, args[0], args[1], t))
+            else:
+                self._subscript(node, args[0], args[1], t)
+            return t
+        elif tp is ast.Instance:
+            return OBJECT
+        return TypeVariable()
+
+    def _subscript(self, node, collection, key, t):
+        collection = prune(collection)
+        if type(collection) is TypeOperator and collection.name == 'Dictionary':
+            kind, dictionary_key, value = collection.args
+            unify(dictionary_key, key)
+            unify(value, t)
+            self.subscripts.append((node, kind))
+            if id(node) in self.written:
+                # Writing into a dictionary makes it a Map, a Dict never changes.
+                unify(kind, MAP)
+        else:
+            unify(key, INTEGER)
+            unify(collection, list_of(t))
+
+    def _resolve_subscripts(self):
+        """Type the pending subscripts whose collection is known by now."""
+        pending = self.pending
+        self.pending = []
+        for entry in pending:
+            if type(prune(entry[1])) is TypeVariable:
+                self.pending.append(entry)
+            else:
+                self._subscript(*entry)
+
+    def _decide(self, deferred, copies):
+        """Type the deferred subscripts whose collection a call passed a List or a dictionary."""
+        for entry, copy in zip(list(deferred), copies):
+            copy = prune(copy)
+            if type(copy) is TypeVariable:
+                continue
+            deferred.remove(entry)
+            node, collection, key, result = entry
+            if copy.name == 'Dictionary':
+                # Of the kind of the first dictionary passed.
+                unify(collection, dictionary_of(copy.args[0], TypeVariable(), TypeVariable()))
+            self._subscript(node, collection, key, result)
+
+    def _dictionary(self, node, args):
+        kind = TypeVariable()
+        self.kinds.add(kind)
+        key = args[0] if args else TypeVariable()
+        value = args[1] if args else TypeVariable()
+        # Keys or values of mixed types are Objects.
+        if not all([unify(key, item) for item in args[2::2]]):
+            key = OBJECT
+        if not all([unify(value, item) for item in args[3::2]]):
+            value = OBJECT
+        t = dictionary_of(kind, key, value)
+        self.dictionaries.append((node, t, self.functions[-1].node if self.functions else None))
+        return t
+
+    def _binary_operator(self, operator, left, right):
+        if operator in LOGICAL_OPERATORS:
+            unify(left, BOOLEAN)
+            unify(right, BOOLEAN)
+            return BOOLEAN
+        if operator in RANGE_OPERATORS:
+            unify(left, INTEGER)
+            unify(right, INTEGER)
+            # A Range, which is a List, see coder.RangeClass.
+            return list_of(INTEGER)
+        left, right = prune(left), prune(right)
+        if operator == '+' and STRING in (left, right):
+            return STRING
+        if left in NUMERIC and right in NUMERIC and left != right:
+            # Java widens mixed arithmetic and comparisons to double.
+            result = DOUBLE
+        else:
+            unify(left, right)
+            result = left
+            if operator not in EQUALITY_OPERATORS and type(prune(result)) is TypeVariable:
+                # Java has no operator generic over the numbers.
+                self.numeric.append(result)
+        return BOOLEAN if operator in COMPARISON_OPERATORS else result
+
+    def _call(self, node, args):
+        symbol = self.bindings.get(id(node))
+        if symbol is None:
+            return TypeVariable()
+        if isinstance(symbol.node, ast.Builtin):
+            if symbol.name in DICT_BUILTINS and args:
+                key = TypeVariable()
+                value = TypeVariable()
+                unify(args[0], dictionary_of(DICT, key, value))
+                for param, arg in zip((key, value), args[1:]):
+                    unify(param, arg)
+                return args[0]
+            return BUILTIN_RESULTS.get(symbol.name, OBJECT)
+        deferred = self.deferred.get(id(symbol.node))
+        if deferred:
+            # Instantiated together with the function, the copies of the collections
+            # are what this call passes.
+            scheme = self.symbol_types[symbol.id]
+            collections = [collection for _, collection, _, _ in deferred]
+            both = instantiate(Scheme(scheme.variables, function_of(collections, scheme.type)))
+            t, copies = prune(both.args[-1]), both.args[:-1]
+        else:
+            t, copies = prune(self.symbol_type(symbol)), ()
+        if type(t) is not TypeOperator or t.name != 'Function':
+            return TypeVariable()
+        params, result = t.args[:-1], t.args[-1]
+        for param, arg in zip(params, args):
+            unify(param, arg)
+        if deferred:
+            self._decide(deferred, copies)
+        self.calls.append((node, params, self.functions[-1].node if self.functions else None))
+        return result
+
+    def _nothing(self, node):
+        pass
+
+    def _assignment(self, node):
+        value = self.expression(node.right)
+        if isinstance(node.left, ast.SubscriptOperator):
+            self.written.add(id(node.left))
+            unify(self.expression(node.left), value)
+
+    def _condition(self, node):
+        unify(self.expression(node.test), BOOLEAN)
+        self.body(node.if_body)
+        for cond in node.elifs:
+            unify(self.expression(cond.test), BOOLEAN)
+            self.body(cond.body)
+        self.body(node.else_body)
+
+    def _match(self, node):
+        test = self.expression(node.test)
+        self.subjects.append((node, test, self.functions[-1].node if self.functions else None))
+        for arm in node.patterns:
+            pattern = arm.pattern
+            if isinstance(pattern, (ast.Number, ast.String, ast.Array)):
+                unify(test, self.expression(pattern))
+            elif isinstance(pattern, ast.List):
+                element = TypeVariable()
+                unify(test, list_of(element))
+                self.declare(pattern.head, element)
+                self.declare(pattern.rest, list_of(element))
+                self.elements.append((pattern, element, self.functions[-1].node if self.functions else None))
+            self.body(arm.body)
+
+    def _while_loop(self, node):
+        unify(self.expression(node.test), BOOLEAN)
+        self.body(node.body)
+
+    def _for_loop(self, node):
+        element = TypeVariable()
+        if unify(self.expression(node.collection), list_of(element)):
+            self.elements.append((node, element, self.functions[-1].node if self.functions else None))
+        self.declare(node, element)
+        self.statements(node.body)
+
+    def signature(self, node):
+        """The monomorphic type of a Function, from its annotations."""
+        params = [type_term(param.type_name) if isinstance(param, ast.TypedParam) else TypeVariable()
+                  for param in node.params]
+        result = type_term(node.ret_type) if node.ret_type else TypeVariable()
+        return function_of(params, result)
+
+    def _function(self, node):
+        t = self.hoisted.pop(id(node), None) or self.signature(node)
+        params, result = t.args[:-1], t.args[-1]
+        for param, param_type in zip(node.params, params):
+            self.declare(param, param_type)
+        # Monomorphic inside its own body.
+        self.declare(node, t)
+        self.functions.append(FunctionContext(node, t, result, [False]))
+        self.statements(node.body)
+        context = self.functions.pop()
+
+        self._resolve_subscripts()
+        bound = []
+        for outer in self.functions:
+            free_variables(outer.type, bound)
+        # A collection still unknown is decided by the calls: generic, when it comes
+        # from this function only, the first call decides what all of them pass.
+        pending = self.pending
+        self.pending = []
+        for entry in pending:
+            if any(v in bound for v in free_variables(entry[1], [])):
+                self.pending.append(entry)
+            else:
+                self.deferred.setdefault(id(node), []).append(entry)
+        # Dictionary kinds stay monomorphic, a literal is built as one kind only, and
+        # so do the operands of arithmetic.
+        monomorphic = set(bound) | self.kinds
+        monomorphic.update(prune(v) for v in self.numeric)
+        variables = [v for v in free_variables(t, []) if v not in monomorphic]
+        self.declare(node, Scheme(variables, t))
+        self.generalized.append((context, variables))
+
+    def _module(self, node):
+        # Calls ahead of a definition see its monomorphic type, see Resolver._module.
+        for statement in node.body:
+            if type(statement) is ast.Function:
+                t = self.hoisted[id(statement)] = self.signature(statement)
+                self.declare(statement, t)
+        self.statements(node.body)
+
+    def _return(self, node):
+        if node.value is not None:
+            self.returns(self.expression(node.value), node.value)
+
+    def _typed_variable(self, node):
+        declared = type_term(node.type_name)
+        if node.value is not None:
+            unify(declared, self.expression(node.value))
+        self.declare(node, declared)
+
+    def typing(self):
+        """Render the inferred types the code generator emits.
+
+        types maps id(node) to a Java type: the element type of ForLoop nodes over a
+        List, ranges included (loops over anything else have no entry), of List patterns
+        and of Array literals whose items have one type, the type of the subject of
+        Match nodes and of Dictionary literals, the kind ('Dict' or 'Map') of the
+        dictionary SubscriptOperator nodes index, the type of UntypedParam nodes and the
+        return type of Function nodes declared without one ('void' when no return passes
+        a value). type_params maps id(node) of generic Function nodes to the names of
+        their type parameters. concats holds id(node) of the + operators concatenating
+        strings. arithmetic maps id(node) of the operators with an Integer or Double
+        result to (result, left, right), the name of the result type and whether each
+        operand has that same type. arguments maps id(node) of the calls of program
+        functions to the Java types the parameters of the callee take at that call, in
+        the type parameters of the caller.
+        """
+        self._resolve_subscripts()
+        for deferred in self.deferred.values():
+            self.pending.extend(deferred)
+        for node, collection, key, result in self.pending:
+            # Subscripts of a collection nothing else constrains index a List.
+            self._subscript(node, collection, key, result)
+        self.pending = []
+        for variable in self.numeric:
+            # Numbers, of no other type: ints.
+            if type(prune(variable)) is TypeVariable:
+                unify(variable, INTEGER)
+        for kind in self.kinds:
+            # Literals used as neither kind are persistent.
+            if type(prune(kind)) is TypeVariable:
+                unify(kind, DICT)
+        types = {}
+        type_params = {}
+        function_names = {}
+        no_names = {}
+        # id(names) -> java_type memo for the types rendered with names.
+        memos = {}
+
+        def render(t, names, top=True):
+            return java_type(t, names, top, memos.setdefault(id(names), {}))
+
+        for context, variables in self.generalized:
+            node = context.node
+            params, result = context.type.args[:-1], context.type.args[-1]
+            inferred = [t for param, t in zip(node.params, params) if isinstance(param, ast.UntypedParam)]
+            returns_value = context.returns_value[0]
+            if not node.ret_type and returns_value:
+                inferred.append(result)
+            used = [v for v in free_variables(function_of(inferred, VOID), []) if v in variables]
+            names = {}
+            for i, variable in enumerate(used):
+                names[variable] = TYPE_PARAMETER_NAMES[i] if i < len(TYPE_PARAMETER_NAMES) else 'T{}'.format(i)
+            function_names[id(node)] = names
+            for param, t in zip(node.params, params):
+                if isinstance(param, ast.UntypedParam):
+                    types[id(param)] = render(t, names, False)
+            if not node.ret_type:
+                types[id(node)] = render(result, names) if returns_value else 'void'
+            if used:
+                type_params[id(node)] = [names[v] for v in used]
+        for node, element, function in self.elements:
+            types[id(node)] = render(element, function_names.get(id(function), no_names), False)
+        for node, t, function in self.subjects:
+            types[id(node)] = render(t, function_names.get(id(function), no_names), False)
+        for node, t, function in self.dictionaries:
+            types[id(node)] = render(t, function_names.get(id(function), no_names), False)
+        for node, kind in self.subscripts:
+            types[id(node)] = prune(kind).name
+        arguments = {}
+        for node, params, function in self.calls:
+            names = function_names.get(id(function), no_names)
+            arguments[id(node)] = [render(t, names, False) for t in params]
+        concats = set()
+        arithmetic = {}
+        for node, left, right, result in self.operators:
+            result = prune(result)
+            if result == STRING and node.operator == '+':
+                concats.add(id(node))
+            elif result in NUMERIC:
+                arithmetic[id(node)] = (result.name, prune(left) == result, prune(right) == result)
+        return Typing(types, type_params, concats, arithmetic, arguments)
+
+
+def infer(body, bindings, declarations, symbol_types):
+    """Infer the types of the resolved statements in body, returns a Typing."""
+    typer = Typer(bindings, declarations, symbol_types)
+    typer.statements(body)
+    return typer.typing()
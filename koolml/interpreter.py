@@ -5,41 +5,66 @@ Interpreter
 AST-walking interpreter.
 """
 from __future__ import print_function
-import operator
+import math
+import re
+from contextlib import contextmanager
 from collections import namedtuple
 from koolml import ast
-from koolml.lexer import Lexer, TokenStream
+from koolml.lexer import Lexer, TokenStream, BufferTokenStream, StreamingTokenStream
 from koolml.parser import Parser
-from koolml.errors import AbrvalgSyntaxError, AbrvalgSyntaxCompileTimeError , report_syntax_error
+from koolml.errors import AbrvalgSyntaxError, AbrvalgSyntaxCompileTimeError, Diagnostics
+from koolml.emitter import Emitter, NullSink
+from koolml.fold import fold, is_int, INT_MAX
+from koolml.op import PRECEDENCE, UNARY_PRECEDENCE, ATOM_PRECEDENCE, SQUARE, peephole, counters
+from koolml.resolver import Scope, resolve
+from koolml.infer import infer, prune, TypeOperator
+from koolml.unbox import unbox
+from koolml.tailcall import tail_calls
+from koolml.pool import pool
 from koolml.utils import print_ast, print_tokens, print_env
-from koolml.types import types, generic_types
-from koolml.op import op
+from koolml.types import types, generic_types, specialized_lists
 
 BuiltinFunction = namedtuple('BuiltinFunction', ['params', 'body'])
+CompileResult = namedtuple('CompileResult', ['code', 'diagnostics'])
 Buffer = str()
 Includes = [] 
 _lexer = None
 
-class Break(Exception):
-    pass
-
-
-class Continue(Exception):
-    pass
-
-
-class Return(Exception):
-    def __init__(self, value):
-        self.value = value
-
-
-class Environment(object):
+class Environment(Scope):
+    """The global scope, plus the state of the compile running in it."""
 
     def __init__(self, parent=None, args=None, lexer = None):
-        self._parent = parent
-        self._values = {}
+        super(Environment, self).__init__(parent)
         self.this = None
         self.lexer = lexer
+        self.diagnostics = None
+        self.emitter = None
+        self.bindings = {}
+        self.shadows = {}
+        self.declarations = {}
+        # Symbol id -> inferred type, kept across compiles like the symbols themselves.
+        self.symbol_types = {}
+        self.types = {}
+        self.type_params = {}
+        self.concats = set()
+        self.arithmetic = {}
+        # id(node) of a call -> Java types of the callee's parameters, see koolml.infer.
+        self.arguments = {}
+        # id(node) of the range loops whose variable can't be negative, see koolml.op.
+        self.counters = set()
+        # id(node) -> Java primitive type for the declarations emitted unboxed.
+        self.primitives = {}
+        # See koolml.tailcall.
+        self.tail_calls = {}
+        self.tail_loops = set()
+        self.trampolines = {}
+        # id(node) -> field name for the literals of the module pooled in fields, see
+        # koolml.pool.
+        self.pooled = {}
+        # The Function whose body is being emitted.
+        self.function = None
+        # How many match subjects were bound to locals, see eval_match.
+        self.subjects = 0
         if args is not None:
             self._from_dict(args)
 
@@ -47,57 +72,197 @@ class Environment(object):
         for key, value in args.items():
             self.set(key, value)
 
-    def set(self, key, val):
-        self._values[key] = val
-
-    def get(self, key):
-        val = self._values.get(key, None)
-        if val is None and self._parent is not None:
-            return self._parent.get(key)
-        else:
-            return val
-
-    def asdict(self):
-        return self._values
+    def binding(self, node):
+        """The Symbol an Identifier or Call node resolved to, None if it is undefined."""
+        return self.bindings.get(id(node))
 
     def __repr__(self):
         return 'Environment({})'.format(str(self._values))
 
 
-def eval_binary_operator(node, env):
-    simple_operations = {
-        '+': op.add,
-        '-': op.sub,
-        '*': op.mul,
-        '/': op.div,
-        '%': op.mod,
-        '>': op.gt,
-        '>=': op.ge,
-        '<': op.lt,
-        '<=': op.le,
-        '==': op.eq,
-        '!=': op.ne,
-        '..': range,
-        '...': lambda start, end: range(start, end + 1),
-    }
-    lazy_operations = {
-        '&&': lambda lnode, lenv: eval_expression(lnode.left, lenv) + " && " + eval_expression(lnode.right, lenv),
-        '||': lambda lnode, lenv: eval_expression(lnode.left, lenv) + " || " + eval_expression(lnode.right, lenv),
-    }
-    if node.operator in simple_operations:
-        return simple_operations[node.operator](eval_expression(node.left, env), eval_expression(node.right, env))
-    elif node.operator in lazy_operations:
-        return lazy_operations[node.operator](node, env)
-    else:
+# Operators emitted as-is between their operands.
+BINARY_OPERATORS = frozenset(['+', '-', '*', '/', '%', '>', '>=', '<', '<=', '==', '!=', '&&', '||'])
+
+UNARY_OPERATORS = frozenset(['-', '!'])
+
+RANGE_OPERATORS = frozenset(['..', '...'])
+
+
+def emit_binary_operator(node, env):
+    if node.operator in RANGE_OPERATORS:
+        return emit_range(node, env)
+    if node.operator not in BINARY_OPERATORS:
         raise Exception('Invalid operator {}'.format(node.operator))
+    if id(node) in env.concats:
+        return emit_concat(node, env)
+    operator, left, right = lower_binary(node, env)
+    if operator is None:
+        return [left]
+    if operator == SQUARE:
+        return [SQUARE + '(', left, ')']
+    precedence = PRECEDENCE[operator]
+    # Java operators are left-associative, a - (b - c) keeps its parentheses.
+    return emit_operand(left, precedence, env) + [' ' + operator + ' '] + emit_operand(right, precedence + 1, env)
+
+
+def emit_operand(node, precedence, env):
+    """node, parenthesized when its code binds looser than precedence."""
+    if emitted_precedence(node, env) < precedence:
+        return ['(', node, ')']
+    return [node]
+
+
+def lower_binary(node, env):
+    """(operator, left, right) emitted for a BinaryOperator that is not a concatenation.
+
+    operator is None when node emits as left alone, SQUARE when it emits as the
+    square of left.
+    """
+    arithmetic = env.arithmetic.get(id(node))
+    if arithmetic is None:
+        return node.operator, node.left, node.right
+    operand = identity_operand(node, *arithmetic)
+    if operand is not None:
+        return None, operand, None
+    return peephole(node, arithmetic, env.counters, env.bindings)
+
+
+def emitted_node(node, env):
+    """The node whose code is emitted for node, after dropping identities."""
+    while type(node) is ast.BinaryOperator and id(node) not in env.concats and not is_range(node):
+        operator, left, right = lower_binary(node, env)
+        if operator is not None:
+            break
+        node = left
+    return node
 
 
-def eval_unary_operator(node, env):
-    operations = {
-        '-': operator.neg,
-        '!': operator.not_,
-    }
-    return operations[node.operator](eval_expression(node.right, env))
+def emitted_precedence(node, env):
+    node = emitted_node(node, env)
+    tp = type(node)
+    if tp is ast.BinaryOperator:
+        if id(node) in env.concats:
+            return PRECEDENCE['+']
+        if is_range(node):
+            return ATOM_PRECEDENCE
+        operator = lower_binary(node, env)[0]
+        return ATOM_PRECEDENCE if operator == SQUARE else PRECEDENCE[operator]
+    if tp is ast.UnaryOperator or is_negative_literal(node):
+        return UNARY_PRECEDENCE
+    return ATOM_PRECEDENCE
+
+
+def is_negative_literal(node):
+    return type(node) is ast.Number and math.copysign(1, node.value) < 0
+
+
+def is_literal(node, value):
+    return type(node) is ast.Number and node.value == value
+
+
+def identity_operand(node, result, left_same, right_same):
+    """x for the numeric identities x + 0, 0 + x, x - 0, x * 1, 1 * x and x / 1.
+
+    result is the type of node, x must have the same type so dropping the operator
+    does not change it; x + 0 is not an identity for doubles, -0.0 + 0 is 0.0.
+    """
+    operator, left, right = node.operator, node.left, node.right
+    if operator == '+' and result == 'Integer':
+        if left_same and is_literal(right, 0):
+            return left
+        if right_same and is_literal(left, 0):
+            return right
+    elif operator == '-' and left_same and is_literal(right, 0):
+        return left
+    elif operator == '*':
+        if left_same and is_literal(right, 1):
+            return left
+        if right_same and is_literal(left, 1):
+            return right
+    elif operator == '/' and left_same and is_literal(right, 1):
+        return left
+    return None
+
+
+def is_concat(node, env):
+    return type(node) is ast.BinaryOperator and id(node) in env.concats
+
+
+def emit_concat(node, env):
+    """Emit a chain of string concatenations as a single + expression.
+
+    Nested concatenations are flattened, adjacent literals merged into one and other
+    operators parenthesized unless they bind tighter than +, so javac compiles the
+    chain to one concat.
+    """
+    additive = PRECEDENCE['+']
+    # (operand, parenthesized) in source order.
+    operands = []
+    work = [node]
+    while work:
+        item = work.pop()
+        if not is_concat(item, env):
+            operands.append((item, emitted_precedence(item, env) <= additive))
+        elif is_concat(item.right, env) and not (is_concat(item.left, env) or type(item.left) is ast.String):
+            # a + (b + c) is only a + b + c when a is already a string.
+            operands.append((item.left, emitted_precedence(item.left, env) <= additive))
+            operands.append((item.right, True))
+        else:
+            work.append(item.right)
+            work.append(item.left)
+    out = []
+    literal = []
+    for item, parenthesized in operands:
+        if type(item) is ast.String:
+            literal.append(item.value)
+            continue
+        if literal:
+            out += [java_string(''.join(literal)), ' + ']
+            literal = []
+        if parenthesized:
+            out += ['(', item, ')', ' + ']
+        else:
+            out += [item, ' + ']
+    if literal:
+        out += [java_string(''.join(literal)), ' + ']
+    out.pop()
+    return out
+
+
+_java_escape_regex = re.compile(r'[\\"\x00-\x1f\x7f]')
+_java_escapes = {
+    '\\': '\\\\',
+    '"': '\\"',
+    '\n': '\\n',
+    '\r': '\\r',
+    '\t': '\\t',
+    '\b': '\\b',
+    '\f': '\\f',
+}
+
+
+def _java_escape(matches):
+    char = matches.group(0)
+    return _java_escapes.get(char) or '\\u{:04x}'.format(ord(char))
+
+
+def java_string(value):
+    """value as a Java string literal."""
+    return '"' + _java_escape_regex.sub(_java_escape, value) + '"'
+
+
+def emit_unary_operator(node, env):
+    if node.operator not in UNARY_OPERATORS:
+        raise Exception('Invalid operator {}'.format(node.operator))
+    right = node.right
+    if emitted_precedence(right, env) < UNARY_PRECEDENCE:
+        return [node.operator + '(', right, ')']
+    emitted = emitted_node(right, env)
+    if node.operator == '-' and (is_negative_literal(emitted) or
+                                 (type(emitted) is ast.UnaryOperator and emitted.operator == '-')):
+        # Keep `- -x` from turning into a decrement.
+        return ['- ', right]
+    return [node.operator, right]
 
 
 def eval_assignment(node, env):
@@ -110,143 +275,316 @@ def eval_assignment(node, env):
         column = token.column+1
         message = 'variable re-assignments are not part of the language.' 
         err = AbrvalgSyntaxCompileTimeError(message, line, column)
-        report_syntax_error(env.lexer, err, len(name))
+        env.diagnostics.report(err, len(name))
 
 
-def eval_condition(node, env):
-    cond = eval_expression(node.test, env)
-    str = 'if (' + cond + ') {'
-    if isinstance(node.if_body, list):
-        for stmt in node.if_body:
-            str += '\n\t\t' + eval_statement(stmt, env)
-        str += '\n\t}'
+def emit_body(body, env):
+    """Emit the indented body of a block statement.
+
+    Blocks are statement lists, expression bodies return their value.
+    """
+    emitter = env.emitter
+    emitter.level += 1
+    if isinstance(body, list):
+        exits = eval_block(body, env)
     else:
-        str += 'return ' + eval_expression(node.if_body, env) + ';}'
+        exits = emit_return(body, env)
+    emitter.level -= 1
+    return exits
 
+
+@contextmanager
+def discarding(env):
+    """Check code without emitting it, for branches constant folding removed."""
+    emitter = env.emitter
+    env.emitter = Emitter(NullSink())
+    try:
+        yield
+    finally:
+        env.emitter = emitter
+
+
+def constant_test(node, env):
+    """True or False for a test folded to the true or false builtin, None otherwise."""
+    if type(node) is ast.Identifier:
+        symbol = env.binding(node)
+        if symbol is not None and isinstance(symbol.node, ast.Identifier):
+            return symbol.name == 'true'
+    return None
+
+
+def emit_chain(arms, env):
+    """Emit arms as an if / else if / else chain, returns True when it always exits.
+
+    arms are (test, constant, body): test a node or Java condition, None for an
+    unconditional arm, and constant True or False when the outcome of the test is known
+    at compile time. Arms that can't be taken are checked but not emitted; an arm that
+    is always taken ends the chain and, when it is the first, is emitted as a plain block.
+    Like javac, the chain always exits when it ends in an else and every arm exits.
+    """
+    emitter = env.emitter
+    first = True
+    exits = True
+    for i, (test, constant, body) in enumerate(arms):
+        if constant is False:
+            with discarding(env):
+                if not isinstance(test, str):
+                    eval_expression(test, env)
+                emit_body(body, env)
+            continue
+        if test is None or constant:
+            emitter.line('{' if first else '} else {')
+            exits = emit_body(body, env) and exits
+            emitter.line('}')
+            with discarding(env):
+                for test, constant, body in arms[i + 1:]:
+                    if test is not None and not isinstance(test, str):
+                        eval_expression(test, env)
+                    emit_body(body, env)
+            return exits
+        if not isinstance(test, str):
+            test = eval_expression(test, env)
+        emitter.line(('if (' if first else '} else if (') + test + ') {')
+        exits = emit_body(body, env) and exits
+        first = False
+    if not first:
+        emitter.line('}')
+    return False
+
+
+def eval_condition(node, env):
+    arms = [(node.test, constant_test(node.test, env), node.if_body)]
+    for cond in node.elifs:
+        arms.append((cond.test, constant_test(cond.test, env), cond.body))
     if node.else_body:
-        str += "\n\telse {"
-        if isinstance(node.else_body, list):
-            for stmt in node.else_body:
-                str += "\n\t\t" + eval_statement(stmt, env)
-        else:
-            str += "return (" + eval_expression(node.else_body, env) + "); "
+        arms.append((None, None, node.else_body))
+    return emit_chain(arms, env)
+
 
-        str += "\n}"
+def emit_match_arm(emitter, first, test):
+    """Open the next arm of an if / else if / else chain, test None meaning else."""
+    if test is None:
+        emitter.line('{' if first else '} else {')
+    else:
+        emitter.line(('if (' if first else '} else if (') + test + ') {')
 
-    return str
 
-def eval_num_match(var, node, env):
-    str = ""
-    el = None
+def eval_num_match(var, node, env, value=None, subject=None):
+    """value is the number matched, when the test is a literal, subject its Java type."""
+    arms = []
     for patt in node:
         match = patt
         pattern = match.pattern 
         if not isinstance(pattern, ast.Number):
-            if isinstance(pattern, ast.Identifier) and pattern.value.value == "_":
-                el = pattern.value.value
-            else:
+            if not (isinstance(pattern, ast.Identifier) and pattern.value.value == "_"):
                 token = pattern.value
                 name = token.value
                 line = token.line 
                 column = token.column
                 message = 'Expected numeric pattern matching, but received Identifier "' + name + '"'
                 err = AbrvalgSyntaxCompileTimeError(message, line, column)
-                report_syntax_error(env.lexer, err, len(name))
-
-        if not el:
-            ptn = eval_expression(pattern, env)
-            str += "if (" + var + "==" + ptn + ") {\n" 
+                env.diagnostics.report(err, len(name))
+                continue
+            pattern = None
+        arms.append((pattern, match.body))
+    return emit_literal_match(var, arms, lambda pattern: var + "==" + eval_expression(pattern, env), env, value,
+                              subject)
+
+
+def eval_string_match(var, node, env, value=None, subject=None):
+    """value is the string matched, when the test is a literal, subject its Java type."""
+    arms = []
+    for match in node:
+        pattern = match.pattern
+        if not isinstance(pattern, ast.String):
+            if not (isinstance(pattern, ast.Identifier) and pattern.value.value == "_"):
+                if isinstance(pattern, ast.Identifier):
+                    token = pattern.value
+                    message = 'Expected string pattern matching, but received Identifier "' + token.value + '"'
+                    err = AbrvalgSyntaxCompileTimeError(message, token.line, token.column)
+                    env.diagnostics.report(err, len(token.value))
+                continue
+            pattern = None
+        arms.append((pattern, match.body))
+    # Literals are never null, and equals compares contents.
+    return emit_literal_match(var, arms, lambda pattern: java_string(pattern.value) + ".equals(" + var + ")", env,
+                              value, subject)
+
+
+# Matches with fewer cases are emitted as if chains.
+SWITCH_MIN_CASES = 3
+
+# The types of a match subject a switch takes, other subjects are matched by if chains.
+SWITCH_TYPES = frozenset(['int', 'Integer', 'char', 'String'])
+
+
+def emit_literal_match(var, arms, test, env, value=None, subject=None):
+    """Emit a match on number or string literals, returns True when it always exits.
+
+    arms are (pattern, body), pattern None for _, test renders the Java condition of
+    a pattern. A pattern seen before and the arms after _ are never taken, they are
+    checked but not emitted. subject is the Java type of var. With at least
+    SWITCH_MIN_CASES int or string cases on a subject of one of SWITCH_TYPES the match
+    is a switch, which javac compiles to a jump table or a hash lookup, var is
+    evaluated once; a break in an arm would leave the switch instead of the enclosing
+    loop, so such matches stay if chains, as do matches on a literal, which
+    emit_chain reduces to the arm taken.
+    """
+    chain = []
+    cases = []
+    default = None
+    pruned = []
+    seen = set()
+    for pattern, body in arms:
+        if default is not None:
+            pruned.append(body)
+            continue
+        if pattern is None:
+            default = body
+            chain.append((None, None, body))
+            continue
+        constant = None
+        if pattern.value in seen:
+            constant = False
+            pruned.append(body)
         else:
-            str += "else {\n"
-        if isinstance(match.body, list):
-            for stmt in match.body:
-                str += "\t" + eval_statement(stmt, env) + "\n"
-            str += "}\n"
-        else:
-            str += "\treturn (" + eval_expression(match.body, env) + ");\n}\n"
-
-    return str
-        
+            seen.add(pattern.value)
+            cases.append((pattern, body))
+            if value is not None:
+                constant = pattern.value == value
+        chain.append((test(pattern), constant, body))
+
+    switch = (value is None and subject in SWITCH_TYPES and len(cases) >= SWITCH_MIN_CASES
+              and all(type(pattern.value) in (int, str) for pattern, body in cases)
+              and not any(isinstance(body, list) and breaks(body) for pattern, body in cases))
+    if not switch:
+        return emit_chain(chain, env)
+    emitter = env.emitter
+    emitter.begin('switch (' + var + ')')
+    exits = default is not None
+    for pattern, body in cases:
+        emitter.line('case ' + eval_expression(pattern, env) + ': {')
+        if not emit_body(body, env):
+            emitter.level += 1
+            emitter.line('break;')
+            emitter.level -= 1
+            exits = False
+        emitter.line('}')
+    if default is not None:
+        emitter.line('default: {')
+        exits = emit_body(default, env) and exits
+        emitter.line('}')
+    emitter.end()
+    with discarding(env):
+        for body in pruned:
+            emit_body(body, env)
+    return exits
 
 
 def eval_list_match(var, node, env):
-    var_name = var.value
-
-    str = ""
-    el = None
-    li_sep = None
+    """Match var, the code of a List, by its length, head and tail.
+
+    [] and [a, b] compare the length first, head :: rest binds the head and tail;
+    nothing is copied or mutated. Of [] and head :: rest the later one takes every list the other
+    left, so it is emitted as an else and javac sees the match is exhaustive.
+    """
+    # (test, prelude, body), test None for _.
+    arms = []
+    empty = cons = False
     for patt in node:
         match = patt
         pattern = match.pattern 
-        if not isinstance(pattern, ast.Array):
-            if isinstance(pattern, ast.Identifier) and pattern.value.value == "_":
-                el = pattern.value.value
-
-            if isinstance(pattern, ast.List):
-                head_token =  pattern.head
-                rest_token =  pattern.rest 
-                head = head_token.value
-                rest = rest_token.value
-                env.set(head, head_token)
-                env.set(rest, rest_token)
-                var_name = ""
-                
-                if isinstance(var, ast.Identifier):
-                    var_name = var.value.value
-                    eval_identifier(var, env)
-                    n = env.get(var_name)
-                    first_type = get_base_type(n.type_name)
-                    
-
-                #li_sep = "%s %s = %s.getFirst();\n%s.removeFirst();\nList %s = %s;" % (first_type , head, var_name, var_name, rest, parse_type(n.type_name), var_name)
-                li_sep = "{} {} = ({}) {}.getFirst();\n".format(first_type, head, first_type, var.value.value)
-                li_sep += "{}.removeFirst();\n".format(var.value.value)
-                li_sep += "{} {} = {};\n".format(parse_type(n.type_name), rest, var.value.value)
-                li_sep += "if (%s != null && %s.size() >0 ) {" % (head, rest)
-                el = "else ({} != null) ".format(head) + "{" + "return {};".format(head) + "}"
-        
-            else:
-                token = pattern.value
-                name = token.value
-                line = token.line 
-                column = token.column
-                message = 'Expected list pattern matching, but received "' + name + '"'
-                err = AbrvalgSyntaxCompileTimeError(message, line, column)
-                report_syntax_error(env.lexer, err, len(name))
-
-        if not el:
-            ptn = eval_expression(pattern, env)
-            if len(pattern.items) == 0:
-                str += "if (" + var.value.value + ".isEmpty() == true) {"
-            else:
-                ptn = eval_expression(pattern, env)
-                str += "if (" + var.value.value + ".contains(" + ptn + ") == true) {" 
-        elif li_sep:
-            str += li_sep
+        if isinstance(pattern, ast.Array):
+            tests = ['{}.length == {}'.format(var, len(pattern.items))]
+            path = var
+            for item in pattern.items:
+                tests.append('Objects.equals({}.head(), {})'.format(path, eval_expression(item, env)))
+                path += '.tail()'
+            if not pattern.items:
+                empty = True
+            arms.append((None if cons and not pattern.items else ' && '.join(tests), [], match.body))
+        elif isinstance(pattern, ast.Identifier) and pattern.value.value == "_":
+            arms.append((None, [], match.body))
+        elif isinstance(pattern, ast.List):
+            element = env.types.get(id(pattern), 'Object')
+            prelude = []
+            # _ is a keyword in Java.
+            if pattern.head.value != '_':
+                prelude.append('final {} {} = {}.head();'.format(element, pattern.head.value, var))
+            if pattern.rest.value != '_':
+                prelude.append('final List<{}> {} = {}.tail();'.format(element, pattern.rest.value, var))
+            cons = True
+            arms.append((None if empty else '{}.length != 0'.format(var), prelude, match.body))
         else:
-            str += "else {\n"
-        
-        if isinstance(match.body, list):
-            for stmt in match.body:
-                str += "\t" + eval_statement(stmt, env) + "\n"
-            str += "}\n"
-        else:
-            str += "\treturn (" + eval_expression(match.body, env) + "); }\n" 
-            
-    return str  
-
-def eval_type_match(var, node, env):
-    str = '' 
+            token = pattern.value
+            name = token.value
+            line = token.line 
+            column = token.column
+            message = 'Expected list pattern matching, but received "' + name + '"'
+            err = AbrvalgSyntaxCompileTimeError(message, line, column)
+            env.diagnostics.report(err, len(name))
+
+    emitter = env.emitter
+    first = True
+    exits = True
+    for i, (test, prelude, body) in enumerate(arms):
+        emit_match_arm(emitter, first, test)
+        emitter.level += 1
+        for line in prelude:
+            emitter.line(line)
+        emitter.level -= 1
+        exits = emit_body(body, env) and exits
+        first = False
+        if test is None:
+            emitter.line('}')
+            # Later arms are unreachable.
+            with discarding(env):
+                for test, prelude, body in arms[i + 1:]:
+                    emit_body(body, env)
+            return exits
+    if not first:
+        emitter.line('}')
+    return False
+
+# Known types no other type extends, a value of one is never an instance of another.
+FINAL_TYPES = frozenset(['Integer', 'Double', 'String', 'Character', 'Boolean'])
+
+
+def static_type(node, env):
+    """The inferred type name of an Identifier, None when unknown."""
+    if type(node) is not ast.Identifier:
+        return None
+    symbol = env.binding(node)
+    if symbol is None:
+        return None
+    t = prune(env.symbol_types.get(symbol.id))
+    return t.name if type(t) is TypeOperator else None
+
+
+def eval_type_match(var, node, env, subject=None):
+    """subject is the matched expression, its static type prunes arms that can't match.
+
+    Arms after _ or Object, repeated types and types the subject can't have are never
+    taken: they are checked but not emitted.
+    """
+    arms = []
+    seen = set()
+    known = static_type(subject, env)
     for patt in node:
         pattern = patt.pattern
 
         if isinstance(pattern, ast.Identifier):
-            if pattern.value.value in types or pattern.value.value in generic_types.keys():
+            if pattern.value.value == '_':
+                arms.append((None, None, patt.body))
+            elif pattern.value.value in types or pattern.value.value in generic_types.keys():
                 id = pattern.value
                 name = id.value
-                str += 'if ({} instanceof {})'.format(var, name) + '{'
-                body = eval_expression(patt.body, env)
-                str += "return {};".format(body) + '}\n'
+                constant = None
+                if name in seen or 'Object' in seen or (known in FINAL_TYPES and name in FINAL_TYPES
+                                                        and name != known):
+                    constant = False
+                seen.add(name)
+                arms.append(('{} instanceof {}'.format(var, name), constant, patt.body))
             else:
                 id = pattern.value
                 name = id.value
@@ -254,12 +592,17 @@ def eval_type_match(var, node, env):
                 column = id.column +1
                 err = "Expected a type pattern but found an identifier"
                 error = AbrvalgSyntaxCompileTimeError(err, line, column)
-                report_syntax_error(env.lexer, error, len(name))
-
-    return str 
+                env.diagnostics.report(error, len(name))
+    return emit_chain(arms, env)
 
 def eval_match(node, env):
     expr = eval_expression(node.test, env)
+    if type(node.test) not in (ast.Identifier, ast.Number, ast.String):
+        # Every arm tests the subject, a call or an operator runs once.
+        name = 'subject${}'.format(env.subjects)
+        env.subjects += 1
+        env.emitter.line('final {} {} = {};'.format(env.types.get(id(node), 'Object'), name, expr))
+        expr = name
 
     # test = eval_expression(node.test, env)
     for patt in node.patterns:
@@ -267,101 +610,171 @@ def eval_match(node, env):
         pattern = match.pattern 
 
         if isinstance(pattern, ast.Number):
-            return eval_num_match(expr, node.patterns, env)
-        elif isinstance(pattern, ast.Array):
-            return eval_list_match(node.test, node.patterns, env)
+            value = node.test.value if isinstance(node.test, ast.Number) else None
+            return eval_num_match(expr, node.patterns, env, value, env.types.get(id(node)))
+        elif isinstance(pattern, ast.String):
+            value = node.test.value if isinstance(node.test, ast.String) else None
+            return eval_string_match(expr, node.patterns, env, value, env.types.get(id(node)))
+        elif isinstance(pattern, (ast.Array, ast.List)):
+            return eval_list_match(expr, node.patterns, env)
         elif isinstance(pattern, ast.Identifier):
             if pattern.value.value in types or pattern.value.value in generic_types.keys():
-                return eval_type_match(expr, node.patterns, env)
+                return eval_type_match(expr, node.patterns, env, node.test)
+
+
+def breaks(body):
+    """Whether a break in body leaves the loop body belongs to."""
+    stack = list(body)
+    while stack:
+        node = stack.pop()
+        tp = type(node)
+        if tp is ast.Break:
+            return True
+        # Nested loops own their breaks.
+        if tp in (ast.Condition, ast.ConditionElif, ast.Match, ast.MatchPattern):
+            stack.extend(ast.children(node))
+    return False
 
 
 def eval_while_loop(node, env):
-    while eval_expression(node.test, env):
-        try:
-            eval_statements(node.body, env)
-        except Break:
-            break
-        except Continue:
-            pass
+    env.emitter.begin('while (' + eval_expression(node.test, env) + ')')
+    eval_block(node.body, env)
+    env.emitter.end()
+    # Like javac, while (true) without a break never completes.
+    return constant_test(node.test, env) is True and not breaks(node.body)
 
 
 def eval_for_loop(node, env):
     var_name = node.var_name
+    if is_range(node.collection):
+        return eval_range_loop(node, env)
     collection = eval_expression(node.collection, env)
     
-    env.set(var_name, node)
-    ret = ""
     if isinstance(node.collection, ast.Identifier):
-        var = env.get(node.collection.value.value)
-        if not isinstance(var.value, ast.Array):
+        symbol = env.binding(node.collection)
+        if symbol is None:
+            # Already reported by eval_identifier.
+            return
+        element_type = env.types.get(id(node))
+        if element_type is None:
             err = "{} is not a symbol of type List<?>".format(node.collection.value.value)
             line = node.collection.value.line
             column = node.collection.value.column
             err = AbrvalgSyntaxCompileTimeError(err, line, column)
-            report_syntax_error(env.lexer, err, len(node.collection.value.value))
-
-        _type = var.type_name 
-        ret += "for ({} {}: {})".format("Object", var_name, node.collection.value.value)
-
-        # body = eval_statements(node.body, env)
-        body = ""
-
-        for stmt in node.body:
-            if isinstance(stmt, ast.TypedVariable):
-                if isinstance(stmt.value, ast.Identifier):
-                    val = stmt.value.value.value
-                    if val == var_name:
-                        if env.get(stmt.name.value):
-                            ln = stmt.name.line
-                            cl = stmt.name.column 
-                            err = AbrvalgSyntaxCompileTimeError("Symbol is not declared ", ln , cl)
-                            report_syntax_error(env.lexer, err, len(stmt.name.value))
-                        else:
-                            check_type_exists(stmt.type_name, env.lexer)
-                            _type = get_base_type(stmt.type_name)
-                            env.set(stmt.name.value, stmt)
-                            body += "{} {} = ({}) {};".format(_type, stmt.name.value, _type, val)
-
+            env.diagnostics.report(err, len(node.collection.value.value))
+            element_type = "Object"
+
+        env.emitter.begin("for ({} {}: {})".format(element_type, var_name, node.collection.value.value))
+        eval_block(node.body, env, loop_statement_evaluator(var_name, element_type))
+        env.emitter.end()
+
+
+def loop_statement_evaluator(var_name, element_type):
+    """eval_statement for a loop body, emitting `let x: T = item` as a cast from the loop variable."""
+
+    def evaluate(stmt, env):
+        if not (isinstance(stmt, ast.TypedVariable) and isinstance(stmt.value, ast.Identifier)
+                and stmt.value.value.value == var_name):
+            return eval_statement(stmt, env)
+        if id(stmt) in env.shadows:
+            ln = stmt.name.line
+            cl = stmt.name.column 
+            err = AbrvalgSyntaxCompileTimeError("Symbol is not declared ", ln , cl)
+            env.diagnostics.report(err, len(stmt.name.value))
+        else:
+            check_type_exists(stmt.type_name, env)
+            _type = get_base_type(stmt.type_name)
+            if _type == element_type:
+                env.emitter.line("{} {} = {};".format(_type, stmt.name.value, var_name))
             else:
-                body += "\n" + eval_statement(stmt, env) + ";"
-        ret += "{\n" + "{}".format(body) + "\n}\n"
+                env.emitter.line("{} {} = ({}) {};".format(_type, stmt.name.value, _type, var_name))
+
+    return evaluate
+
+
+def is_range(node):
+    return type(node) is ast.BinaryOperator and node.operator in RANGE_OPERATORS
+
+
+def type_matches(node, env):
+    """Whether the body of a for loop matches on the type of the loop variable."""
+    for item in ast.walk(node.body):
+        if type(item) is ast.Match and type(item.test) is ast.Identifier:
+            symbol = env.binding(item.test)
+            if symbol is not None and symbol.node is node:
+                return True
+    return False
+
+
+def eval_range_loop(node, env):
+    """for x in a..b or a...b as a counting loop, without building the range."""
+    emitter = env.emitter
+    var_name = node.var_name
+    collection = node.collection
+    start = eval_expression(collection.left, env)
+    end = eval_expression(collection.right, env)
+    # instanceof needs a reference.
+    var_type = 'Integer' if type_matches(node, env) else 'int'
+    evaluate = loop_statement_evaluator(var_name, 'Integer')
+    last = collection.right
+    closed = collection.operator == '...'
+    if closed and not (is_int(last) and last.value < INT_MAX):
+        # x <= last always holds when last is Integer.MAX_VALUE, stop after the
+        # iteration for last instead; continue still reaches the test.
+        emitter.line('{')
+        emitter.level += 1
+        emitter.line('{} {} = {};'.format(var_type, var_name, start))
+        emitter.line('final int {}$last = {};'.format(var_name, end))
+        emitter.begin('if ({0} <= {0}$last)'.format(var_name))
+        emitter.begin('do')
+        eval_block(node.body, env, evaluate)
+        emitter.level -= 1
+        emitter.line('}} while ({0}++ != {0}$last);'.format(var_name))
+        emitter.end()
+        emitter.level -= 1
+        emitter.line('}')
+        return
+    compare = '<=' if closed else '<'
+    if type(last) in (ast.Number, ast.Identifier):
+        header = 'for ({0} {1} = {2}; {1} {3} {4}; {1}++)'
+    else:
+        # The end is evaluated once.
+        header = 'for ({0} {1} = {2}, {1}$end = {4}; {1} {3} {1}$end; {1}++)'
+    emitter.begin(header.format(var_type, var_name, start, compare, end))
+    eval_block(node.body, env, evaluate)
+    emitter.end()
+
+
+def emit_range(node, env):
+    """A range used as a value, a Range that computes its elements on demand."""
+    if node.operator == '..':
+        return ['new Range(', node.left, ', ', node.right, ')']
+    return ['Range.closed(', node.left, ', ', node.right, ')']
 
-    
-    return ret
 
 def eval_instance(node, env):
-    ret = "new " + eval_call(node.value, env)
+    ret = "new " + eval_expression(node.value, env)
     return ret
 
 def eval_typed_var(node, env):
     _type = node.type_name.name
     _name =  node.name 
-    env.set(_name.value, node)
-    is_type_valid = check_type_exists(node.type_name, env.lexer)
+    is_type_valid = check_type_exists(node.type_name, env)
     if is_type_valid:
         
-        val = _type.value
+        val = parse_type(node.type_name)
         if _type.value == 'Any':
             val = 'Object'
+        val = env.primitives.get(id(node), val)
         
         if node.value != None:
-            if isinstance(node.value, ast.Array):
-                _value = eval_array(node.value, env, node.type_name)
-            else:
-                _value = eval_expression(node.value, env)
+            _value = eval_expression(node.value, env)
 
-            return "final {} {} = {};".format(val, _name.value, _value)
+            env.emitter.line("final {} {} = {};".format(val, _name.value, _value))
         else:
-            return "final {} /*(Infered)*/ {};".format(val, _name.value)
+            env.emitter.line("final {} /*(Infered)*/ {};".format(val, _name.value))
 
-def count_args(gen_type, c = 0):
-    if len(gen_type.args) > 0:
-        c += 1
-        return count_args(gen_type.args[0], c)
-    else:
-        return c
-
-def check_type_exists(_type, lexer):
+def check_type_exists(_type, env):
     t = _type.name
     val = t.value
     if val == 'Any':
@@ -372,37 +785,35 @@ def check_type_exists(_type, lexer):
 
     if val in generic_types:
         ret_type = generic_types[val]
-        args = count_args(_type)
+        # Return types are parsed without arguments.
+        args = len(_type.args or ())
         expr = ret_type['args_n']
 
         if args != expr:
             message = "Generic type expects {} parentesized types but {} were given".format(expr, args)
             err = AbrvalgSyntaxCompileTimeError(message, t.line, t.column)
-            report_syntax_error(lexer, err, )
+            env.diagnostics.report(err)
         return True
 
     err = AbrvalgSyntaxError('%s is not a valid type' % (val), t.line, t.column)
-    report_syntax_error(lexer, err, len(val))
+    env.diagnostics.report(err, len(val))
     
 
 def eval_module_definition(node, env):
     name = node.name.value
     env.this = name
-    mod = "// module %s" % (name)
-    
-    for stmt in node.body:
-        ret = eval_statement(stmt, env)
-        mod = mod + "\n" + ret 
-
-    # mod = mod + "\n}"
-
-    return mod
+    env.emitter.line("// module %s" % (name))
+    constants = pool(node.body, env.types)
+    for field, java_type, literal in constants.fields:
+        build = emit_list if type(literal) is ast.Array else emit_dictionary
+        env.emitter.line('static final {} {} = {};'.format(java_type, field, emit_parts(build(literal, env), env)))
+    env.pooled = constants.names
+    eval_block(node.body, env)
 
 def parse_type(typ):
     res = typ.name.value
-    if typ.args != []:
-        arg = typ.args[0]
-        return res + '<' + parse_type(arg) + '>'
+    if typ.args:
+        return res + '<' + ', '.join(parse_type(arg) for arg in typ.args) + '>'
     else:
         return res 
 
@@ -415,87 +826,87 @@ def get_base_type(typ):
         return res 
 
 
+def param_type(param, env):
+    """The Java type param is declared with."""
+    if isinstance(param, ast.TypedParam):
+        check_type_exists(param.type_name, env)
+        _type = parse_type(param.type_name)
+    else:
+        _type = env.types.get(id(param), "Object")
+    return env.primitives.get(id(param), _type)
+
+
+def step_name(name):
+    """The method running one step of a trampolined function."""
+    return name + '$step'
+
+
 def eval_function_declaration(node, env):
     
     ret_type = node.ret_type
     if ret_type:
-        check_type_exists(ret_type, env.lexer)
+        check_type_exists(ret_type, env)
     name = node.name 
-    header = ""
     if name == 'main':
-        header = "public static void main(String[] args) {"
+        header = "public static void main(String[] args)"
+        emit_function_body(node, header, env)
+        return
+
+    header = 'static '
+    type_params = env.type_params.get(id(node))
+    if type_params:
+        header += '<' + ', '.join(type_params) + '> '
+    if ret_type:
+        ret = ret_type.name.value
     else:
-        if ret_type:
-            header = 'static ' + ret_type.name.value+ ' ' + name + '('
-        else:
-            header = "static  Object " + name + "("
-    
-    # e = Environment()
-    # e.lexer = env.lexer
-    env.set(name, node)
-    
-    if name != 'main':
-        length = len(node.params)
-        if length == 0:
-            header = header + ') {'
-
-        for i in range(0, length):
-            param = node.params[i]
-            _name = ""
-            _type = "Object"
-
-            if isinstance(param, ast.TypedParam):
-                _name = param.name.value
-                _type = param.type_name
-                check_type_exists(_type, env.lexer)
-                if _type.args != []:
-                    _type = parse_type(_type)
-                else:
-                    _type = _type.name.value
-            elif isinstance(param, ast.UntypedParam):
-                if i == 0 and param.name == '_':
-                    header = "public <T> " + name + "("
-                    continue
-                else:
-                    _name = param.name.value
-
-                    # print('TODO: interpreter.py line 223')
-                    # exit(0)
-
-            env.set(_name, param)
-            p = "" + _type + " " + _name 
-            if i == length - 1:
-                header = header + p + ") {"
-            else:
-                header = header + p + ", "
-
-    
-    for stmt in node.body:
-        if isinstance(stmt, ast.Call):
-            ret = eval_call(stmt, env) + ";"
-        else:     
-            ret = eval_statement(stmt, env)
-
-        if ret:
-            header = header + "\n\t" + ret
-    header = header + '\n}'
-    return header
+        ret = env.types.get(id(node), 'Object')
+    ret = env.primitives.get(id(node), ret)
+    params = ', '.join(param_type(param, env) + ' ' + param.name.value for param in node.params)
+
+    if id(node) not in env.trampolines:
+        emit_function_body(node, '{}{} {}({})'.format(header, ret, name, params), env)
+        return
+    # The function runs its steps on a trampoline, see koolml.tailcall.
+    arguments = ', '.join(param.name.value for param in node.params)
+    env.emitter.begin('{}{} {}({})'.format(header, ret, name, params))
+    env.emitter.line('return ({}) Bounce.run({}.{}({}));'.format(ret, env.this, step_name(name), arguments))
+    env.emitter.end()
+    emit_function_body(node, '{}Object {}({})'.format(header, step_name(name), params), env)
+
+
+def emit_function_body(node, header, env):
+    function = env.function
+    env.function = node
+    env.emitter.begin(header)
+    if id(node) in env.tail_loops:
+        # Self tail calls reassign the parameters and continue the loop.
+        env.emitter.begin('tail: while (true)')
+        if not eval_block(node.body, env):
+            # Without a value javac still reports a missing return value.
+            env.emitter.line('return;')
+        env.emitter.end()
+    else:
+        eval_block(node.body, env)
+    env.emitter.end()
+    env.function = function
 
 
-def eval_call(node, env):
+def emit_call(node, env):
     token = node.left.value
     name = token.value
     line = token.line
     column = token.column +1
 
-    call =  name + '('
-    fx = env.get(name)
+    symbol = env.binding(node)
     
-    if not fx:
+    if symbol is None:
         message = "Function %s is not defined " % (name)
         err = AbrvalgSyntaxCompileTimeError(message, line, column)
-        report_syntax_error(env.lexer, err, len(name))
+        env.diagnostics.report(err, len(name))
+        # Still check the arguments.
+        return [name + '('] + separated(node.arguments, ',') + [')']
 
+    fx = symbol.node
     if isinstance(fx, ast.Function):
         expected_len = len(fx.params)
         length = len(node.arguments)
@@ -503,47 +914,13 @@ def eval_call(node, env):
         if expected_len != length:
             message = "Expected " + str(expected_len) + " argument(s) to be passed to function " + name + ", but received " + str(length) + " arguments" 
             err = AbrvalgSyntaxCompileTimeError(message, line,column)
-            report_syntax_error(env.lexer, err, len(name))
-
-        for i in range(0, length):
-            arg = node.arguments[i]
-            arg = eval_expression(arg, env)
-            if i == length -1:
-                call = call + arg + ')'
-            else:
-                call = call + arg + ','
-        call = '{}.{}'.format(env.this, call)
+            env.diagnostics.report(err, len(name))
+        return ['{}.{}('.format(env.this, name)] + separated(node.arguments, ',') + [')']
     elif isinstance(fx, ast.Builtin):
-        call = "{}".format(fx.signature)
-        length = len(node.arguments)
-        for i in range(0, length):
-            arg = node.arguments[i]
-            arg = eval_expression(arg, env)
-            if i == length -1:
-                call += arg 
-            else:
-                call += arg + ','
-
-            call += ')'
-
-
-        
-    # call = call + ")"
-    return call
-    # function = eval_expression(node.left, env)
-    # n_expected_args = len(function.params)
-    # n_actual_args = len(node.arguments)
-    # if n_expected_args != n_actual_args:
-    #     raise TypeError('Expected {} arguments, got {}'.format(n_expected_args, n_actual_args))
-    # args = dict(zip(function.params, [eval_expression(node, env) for node in node.arguments]))
-    # if isinstance(function, BuiltinFunction):
-    #     return function.body(args, env)
-    # else:
-    #     call_env = Environment(env, args)
-    #     try:
-    #         return eval_statements(function.body, call_env)
-    #     except Return as ret:
-    #         return ret.value
+        if not node.arguments:
+            return [fx.signature]
+        return [fx.signature] + separated(node.arguments, ',') + [')']
+    return [name + '(']
 
 
 def eval_identifier(node, env):
@@ -552,67 +929,174 @@ def eval_identifier(node, env):
     line = token.line 
     column = token.column
     
-    val = env.get(name)
-    if val is None:
+    if env.binding(node) is None:
         err = AbrvalgSyntaxCompileTimeError("Identifier " + name + " is not defined", line, column)
-        report_syntax_error(env.lexer, err, len(name))
+        env.diagnostics.report(err, len(name))
     return name
 
 
-def eval_getitem(node, env):
-    collection = eval_expression(node.left, env)
-    key = eval_expression(node.key, env)
-    return collection[key]
+def emit_getitem(node, env):
+    # O(1) for the array-backed lists, ranges and Maps, O(log n) for Dicts.
+    return emit_operand(node.left, ATOM_PRECEDENCE, env) + ['.get(', node.key, ')']
 
 
 def eval_setitem(node, env):
-    collection = eval_expression(node.left.left, env)
-    key = eval_expression(node.left.key, env)
-    collection[key] = eval_expression(node.right, env)
+    """`m[key] = value`, a put into a Map. Lists and Dicts never change."""
+    target = node.left
+    if env.types.get(id(target)) != 'Map':
+        root = target.left
+        while type(root) in (ast.SubscriptOperator, ast.Call):
+            root = root.left
+        # A literal list has nothing to point at, javac rejects the put.
+        if type(root) is ast.Identifier:
+            token = root.value
+            message = 'only Map values can be updated in place, assoc returns an updated Dict'
+            err = AbrvalgSyntaxCompileTimeError(message, token.line, token.column + 1)
+            env.diagnostics.report(err, len(token.value))
+            return
+    env.emitter.line(emit_parts(emit_operand(target.left, ATOM_PRECEDENCE, env) +
+                                ['.put(', target.key, ', ', node.right, ');'], env))
 
 
-def eval_array(node, env, head=None):
-    items = node.items
+def emit_array(node, env):
+    field = env.pooled.get(id(node))
+    if field is not None:
+        return [env.this + '.' + field]
+    return emit_list(node, env)
 
-    tp = 'Object'
 
-    ret = ""
-    if head:
-        ret += "new List"
-        ret += "<{}>(".format(get_base_type(head))
-        tp = get_base_type(head)
-    else:
-        ret += "new List(  of infered object "
+def emit_list(node, env):
+    """Build a list literal, array-backed when its elements are numbers or booleans."""
+    specialized = specialized_lists.get(env.types.get(id(node)))
+    if specialized is not None:
+        return [specialized + '.wrap('] + separated(node.items, ',') + [')']
+    return ['List.of('] + separated(node.items, ',') + [')']
 
-    ret += '%s[] ' % (tp) + '{'
 
-    for i in range(0, len(items)) :
-        res = eval_expression(items[i], env)
-        
-        if i == len(items) -1:
-            ret += res + "})"
-        else:
-            ret +=res + ","
-    return ret
+def eval_array(node, env):
+    return emit_parts(emit_array(node, env), env)
+
+
+def separated(nodes, separator):
+    parts = []
+    for node in nodes:
+        if parts:
+            parts.append(separator)
+        parts.append(node)
+    return parts
+
+
+def emit_dict(node, env):
+    field = env.pooled.get(id(node))
+    if field is not None:
+        return [env.this + '.' + field]
+    return emit_dictionary(node, env)
+
+
+def emit_dictionary(node, env):
+    """Build a dictionary literal: a presized HashMap for a Map, a persistent Dict otherwise."""
+    kind, _, args = env.types.get(id(node), 'Dict<Object, Object>').partition('<')
+    runtime = 'Maps' if kind == 'Map' else 'Dict'
+    parts = ['{}.<{}of('.format(runtime, args)]
+    for key, value in node.items:
+        if len(parts) > 1:
+            parts.append(',')
+        parts.extend([key, ',', value])
+    parts.append(')')
+    return parts
 
 
 def eval_dict(node, env):
-    return {eval_expression(key, env): eval_expression(value, env) for key, value in node.items}
+    return emit_parts(emit_dict(node, env), env)
 
 
 def eval_return(node, env):
-    return "return (" + eval_expression(node.value, env) + ");" if node.value is not None else "; "
+    if node.value is not None:
+        return emit_return(node.value, env)
+    env.emitter.line("return;")
+    return True
+
+
+def emit_return(value, env):
+    """Emit return value, lowering tail calls (see koolml.tailcall). Returns True."""
+    callee = env.tail_calls.get(id(value)) if type(value) is ast.Call else None
+    if callee is None:
+        env.emitter.line("return (" + eval_expression(value, env) + ");")
+    elif callee is env.function:
+        emit_self_tail_call(value, env)
+    else:
+        emit_bounce(value, callee, env)
+    return True
+
+
+def is_param(node, param, env):
+    if type(node) is not ast.Identifier:
+        return False
+    symbol = env.binding(node)
+    return symbol is not None and symbol.node is param
+
+
+def emit_self_tail_call(node, env):
+    """Reassign the parameters and restart the loop the function body runs in."""
+    emitter = env.emitter
+    changed = [(param, arg) for param, arg in zip(env.function.params, node.arguments)
+               if not is_param(arg, param, env)]
+    if len(changed) == 1:
+        param, arg = changed[0]
+        emitter.line('{} = {};'.format(param.name.value, eval_expression(arg, env)))
+    else:
+        # Every argument sees the old values.
+        for param, arg in changed:
+            emitter.line('final {} {}$ = {};'.format(param_type(param, env), param.name.value,
+                                                     eval_expression(arg, env)))
+        for param, arg in changed:
+            emitter.line('{0} = {0}$;'.format(param.name.value))
+    emitter.line('continue tail;')
+
+
+def emit_bounce(node, callee, env):
+    """Return the tail call to callee as a Bounce, for the trampoline to make."""
+    arguments = []
+    # Typed as the caller sees the parameters, the type parameters of callee are not
+    # in scope here.
+    types = env.arguments[id(node)]
+    for param, arg, java_type in zip(callee.params, node.arguments, types):
+        if type(arg) in (ast.Number, ast.String):
+            arguments.append(eval_expression(arg, env))
+        else:
+            # Evaluated now, in order, into effectively final variables the lambda captures.
+            env.emitter.line('final {} {}$ = {};'.format(env.primitives.get(id(param), java_type),
+                                                         param.name.value, eval_expression(arg, env)))
+            arguments.append(param.name.value + '$')
+    env.emitter.line('return (Bounce) () -> {}.{}({});'.format(env.this, step_name(callee.name),
+                                                               ', '.join(arguments)))
+
+
+def eval_break(node, env):
+    env.emitter.line("break;")
+    return True
+
+
+def eval_continue(node, env):
+    env.emitter.line("continue;")
+    return True
 
 
 evaluators = {
     ast.Number: lambda node, env: str(node.value),
-    ast.String: lambda node, env: "new String(\"%s\")" % (node.value),
+    ast.String: lambda node, env: java_string(node.value),
     ast.Array: eval_array,
     ast.Dictionary: eval_dict,
     ast.Identifier: eval_identifier,
-    ast.BinaryOperator: eval_binary_operator,
-    ast.UnaryOperator: eval_unary_operator,
-    ast.SubscriptOperator: eval_getitem,
+    ast.BinaryOperator: lambda node, env: eval_expression(node, env),
+    ast.UnaryOperator: lambda node, env: eval_expression(node, env),
+    ast.SubscriptOperator: lambda node, env: eval_expression(node, env),
+    ast.Call: lambda node, env: eval_expression(node, env),
+    ast.Instance: eval_instance
+}
+
+# Statements write their code to env.emitter. Other nodes are expression statements.
+statement_evaluators = {
     ast.Assignment: eval_assignment,
     ast.Condition: eval_condition,
     ast.Match: eval_match,
@@ -620,10 +1104,10 @@ evaluators = {
     ast.ForLoop: eval_for_loop,
     ast.Function: eval_function_declaration,
     ast.Module: eval_module_definition,
-    ast.Call: eval_call,
     ast.Return: eval_return,
     ast.TypedVariable: eval_typed_var, 
-    ast.Instance: eval_instance
+    ast.Break: eval_break,
+    ast.Continue: eval_continue,
 }
 
 
@@ -635,28 +1119,73 @@ def eval_node(node, env):
         raise Exception('Unknown node {} {}'.format(tp.__name__, node))
 
 
+# Expressions with sub-expressions. Each emitter returns the node's code as a list of
+# strings and child nodes in output order, the children are emitted by emit_parts.
+expression_emitters = {
+    ast.BinaryOperator: emit_binary_operator,
+    ast.UnaryOperator: emit_unary_operator,
+    ast.Call: emit_call,
+    ast.Array: emit_array,
+    ast.Dictionary: emit_dict,
+    ast.SubscriptOperator: emit_getitem,
+}
+
+
+def emit_parts(parts, env):
+    """Join parts, emitting child nodes on an explicit work stack.
+
+    Nesting depth costs no Python stack, and every piece of code is written once, so
+    long chains and deeply nested expressions are emitted in linear time.
+    """
+    out = []
+    work = parts[::-1]
+    while work:
+        item = work.pop()
+        if type(item) is str:
+            out.append(item)
+            continue
+        emitter = expression_emitters.get(type(item))
+        if emitter is None:
+            out.append(str(eval_node(item, env)))
+        else:
+            parts = emitter(item, env)
+            parts.reverse()
+            work.extend(parts)
+    return ''.join(out)
+
+
 def eval_expression(node, env):
+    if type(node) in expression_emitters:
+        return emit_parts([node], env)
     return eval_node(node, env)
 
 
 def eval_statement(node, env):
-    return eval_node(node, env)
+    """Emit a statement, returns True when it always exits the enclosing block."""
+    evaluator = statement_evaluators.get(type(node))
+    if evaluator is not None:
+        return evaluator(node, env) or False
+    env.emitter.line(eval_expression(node, env) + ";")
+    return False
+
+
+def eval_block(statements, env, evaluate=eval_statement):
+    """Emit statements, returns True when the block always exits.
+
+    The statements after one that always exits are unreachable, javac rejects them, so
+    they are checked but not emitted.
+    """
+    for i, statement in enumerate(statements):
+        if evaluate(statement, env):
+            with discarding(env):
+                for rest in statements[i + 1:]:
+                    evaluate(rest, env)
+            return True
+    return False
 
 
 def eval_statements(statements, env):
-    ret = ""
-    result = ""
-    for statement in statements:
-        if isinstance(statement, ast.Break):
-            raise Break(ret)
-        elif isinstance(statement, ast.Continue):
-            raise Continue(ret)
-        r = eval_statement(statement, env) 
-        if r:
-            ret += r + "\n"
-        if isinstance(statement, ast.Return):
-            raise Return(ret)
-    return ret
+    eval_block(statements, env)
 
 
 def add_builtins(env):
@@ -670,6 +1199,8 @@ def add_builtins(env):
         'println': ast.Builtin('System.out.println('), 
         'readline': ast.Builtin('(new Scanner(System.in).nextLine())'),
         'readInt': ast.Builtin('(new Scanner(System.in).nextInt())'),
+        'assoc': ast.Builtin('Dict.assoc('),
+        'dissoc': ast.Builtin('Dict.dissoc('),
         'true': ast.Identifier('true'),
         'false': ast.Identifier('false')
     }
@@ -686,50 +1217,114 @@ def create_global_env():
     return env
 
 
-def evaluate_env(s, env, verbose=False):
-    lexer = Lexer()
-    env.lexer = lexer
-    try:
-        tokens = lexer.tokenize(s)
-    except AbrvalgSyntaxError as err:
-        report_syntax_error(lexer, err)
-        if verbose:
-            raise
-        else:
+def parse_source(s, lexer, diagnostics, verbose=False, streaming=False, compact=False, recover=False):
+    """Lex and parse s, returns None when syntax errors were reported to diagnostics.
+
+    With recover=True every syntax error in the file is reported, not just the first.
+    """
+    if streaming:
+        # Lexer errors surface while parsing, tokens can't be dumped up front.
+        token_stream = StreamingTokenStream(lexer.tokenize_iter(s))
+    else:
+        try:
+            tokens = lexer.tokenize_compact(s) if compact else lexer.tokenize(s)
+        except AbrvalgSyntaxError as err:
+            diagnostics.report(err)
             return
 
-    if verbose:
-        print('Tokens')
-        print_tokens(tokens)
-        print()
+        if verbose:
+            print('Tokens')
+            print_tokens(list(tokens))
+            print()
 
-    
-    token_stream = TokenStream(tokens)
+        token_stream = BufferTokenStream(tokens) if compact else TokenStream(tokens)
 
+    parser = Parser(lexer, recover)
     try:
-        program = Parser(lexer).parse(token_stream)
+        program = parser.parse(token_stream)
     except AbrvalgSyntaxError as err:
-        report_syntax_error(lexer, err)
-        if verbose:
-            raise
-        else:
-            return
+        diagnostics.report(err)
+        return
+    if parser.errors:
+        for err in parser.errors:
+            diagnostics.report(err)
+        return
+    return program
+
+
+def compile_env(s, env, verbose=False, streaming=False, engine='lines', compact=False, cache=None, recover=False,
+                sink=None, unbox_values=False):
+    """Compile s in env without exiting on errors.
+
+    Returns a CompileResult; code is None when the source did not parse, and may be
+    incomplete when diagnostics holds compile-time errors. When sink is given the code
+    is written to it as it is generated (see koolml.emitter) and code is None. With
+    unbox_values=True Integer, Double and Boolean values proven non-null are emitted
+    as int, double and boolean (see koolml.unbox).
+    """
+    lexer = Lexer(engine)
+    env.lexer = lexer
+    env.diagnostics = diagnostics = Diagnostics(lexer)
+    env.emitter = emitter = Emitter(sink)
+    program = None
+    if cache is not None:
+        key = cache.key(s, lexer)
+        entry = cache.load(key)
+        if entry is not None:
+            lexer.source_lines, program = entry
+
+    if program is None:
+        program = parse_source(s, lexer, diagnostics, verbose, streaming, compact, recover)
+        if program is None:
+            return CompileResult(None, diagnostics)
+        if cache is not None:
+            cache.store(key, lexer.source_lines, program)
 
     if verbose:
         print('AST')
         print_ast(program.body)
         print()
 
-    ret = eval_statements(program.body, env)
-
+    body = fold(program.body)
+    env.bindings, env.shadows, env.declarations = resolve(body, env)
+    (env.types, env.type_params, env.concats, env.arithmetic,
+     env.arguments) = infer(body, env.bindings, env.declarations, env.symbol_types)
+    env.primitives = unbox(body, env.bindings, env.types) if unbox_values else {}
+    env.tail_calls, env.tail_loops, env.trampolines = tail_calls(body, env.bindings, env.types)
+    env.counters = counters(body, env.bindings)
+    env.pooled = {}
+
+    eval_statements(body, env)
+    if sink is None:
+        ret = emitter.getvalue()
+    else:
+        emitter.flush()
+        ret = None
 
     if verbose:
         print('Environment')
         print_env(env)
         print()
 
-    return ret
+    return CompileResult(ret, diagnostics)
+
+
+def compile_source(s, verbose=False, streaming=False, engine='lines', compact=False, cache=None, recover=False,
+                   sink=None, unbox_values=False):
+    return compile_env(s, create_global_env(), verbose, streaming, engine, compact, cache, recover, sink,
+                       unbox_values)
+
+
+def evaluate_env(s, env, verbose=False, streaming=False, engine='lines', compact=False, cache=None, recover=False,
+                 unbox_values=False):
+    """Compile s in env, prints the errors and exits when there are any."""
+    result = compile_env(s, env, verbose, streaming, engine, compact, cache, recover, unbox_values=unbox_values)
+    if result.diagnostics:
+        result.diagnostics.print_errors()
+        exit(4)
+    return result.code
 
 
-def evaluate(s, verbose=False):
-    return evaluate_env(s, create_global_env(), verbose)
+def evaluate(s, verbose=False, streaming=False, engine='lines', compact=False, cache=None, recover=False,
+             unbox_values=False):
+    return evaluate_env(s, create_global_env(), verbose, streaming, engine, compact, cache, recover, unbox_values)
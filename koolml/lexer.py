@@ -5,7 +5,9 @@ Lexer
 Regular expression based lexer.
 """
 import re
-from collections import namedtuple, OrderedDict
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple, OrderedDict, deque
 from koolml.errors import AbrvalgSyntaxError as LexerError
 from koolml.ttt import iteritems
 
@@ -16,24 +18,36 @@ class Token(namedtuple('Token', ['name', 'value', 'line', 'column'])):
         return str(tuple(self))
 
 
+_escape_regex = re.compile(r'\\(r|n|t|\\|\'|")')
+_escape_chars = {
+    'r': '\r',
+    'n': '\n',
+    't': '\t',
+    '\\': '\\',
+    '"': '"',
+    "'": "'",
+}
+
+
+def _replace_escape(matches):
+    char = matches.group(1)[0]
+    if char not in _escape_chars:
+        raise Exception('Unknown escape character {}'.format(char))
+    return _escape_chars[char]
+
+
 def decode_str(s):
-    regex = re.compile(r'\\(r|n|t|\\|\'|")')
-    chars = {
-        'r': '\r',
-        'n': '\n',
-        't': '\t',
-        '\\': '\\',
-        '"': '"',
-        "'": "'",
-    }
+    if '\\' not in s:
+        return s[1:-1]
+    return _escape_regex.sub(_replace_escape, s[1:-1])
 
-    def replace(matches):
-        char = matches.group(1)[0]
-        if char not in chars:
-            raise Exception('Unknown escape character {}'.format(char))
-        return chars[char]
 
-    return regex.sub(replace, s[1:-1])
+# Same boundaries as str.splitlines().
+_line_break = re.compile(u'\r\n|[\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]')
+_leading_spaces = re.compile(' *')
+
+# Compiled rule tables shared by every Lexer with the same rules, see Lexer._load_tables.
+_tables = {}
 
 
 def decode_num(s):
@@ -102,9 +116,41 @@ class Lexer(object):
         'NUMBER': decode_num,
     }
 
-    def __init__(self):
+    engines = ('lines', 'buffer')
+
+    def __init__(self, engine='lines'):
+        if engine not in self.engines:
+            raise ValueError('Unknown lexer engine {}'.format(engine))
+        self.engine = engine
+        self._regex, self._buffer_regex, self.kind_names = self._load_tables()
+        self._reset()
+
+    def _reset(self):
+        self.source = ''
         self.source_lines = []
-        self._regex = self._compile_rules(self.rules)
+        self.line_starts = array('I')
+        self.line_offsets = array('I')
+        self.line_indents = array('h')
+        self.indent_symbol = None
+        self.indent_line = 0
+
+    def _load_tables(self):
+        key = (tuple(self.rules), tuple(sorted(iteritems(self.keywords))))
+        tables = _tables.get(key)
+        if tables is None:
+            tables = _tables[key] = (
+                self._compile_rules(self.rules),
+                self._compile_buffer_rules(self.rules),
+                self._kind_names(),
+            )
+        return tables
+
+    def _kind_names(self):
+        names = ['INDENT', 'DEDENT', 'NEWLINE']
+        for name in [name for name, _ in self.rules] + sorted(self.keywords.values()):
+            if name not in names and name not in self.ignore_tokens:
+                names.append(name)
+        return tuple(names)
 
     def _convert_rules(self, rules):
         grouped_rules = OrderedDict()
@@ -119,6 +165,12 @@ class Lexer(object):
     def _compile_rules(self, rules):
         return re.compile('|'.join(self._convert_rules(rules)))
 
+    def _compile_buffer_rules(self, rules):
+        # Whitespace before a token is swallowed by the same match, which halves the
+        # number of matches. A lone WHITESPACE group still matches when nothing follows.
+        whitespace = '|'.join(p for name, p in rules if name == 'WHITESPACE')
+        return re.compile('(?:{})?(?:{})'.format(whitespace, '|'.join(self._convert_rules(rules))))
+
     def _tokenize_line(self, line, line_num):
         pos = 0
         while pos < len(line):
@@ -150,44 +202,361 @@ class Lexer(object):
             return line[0] * self._count_leading_characters(line, line[0])
 
     def tokenize(self, s):
-        indent_symbol = None
-        tokens = []
+        return list(self.tokenize_iter(s))
+
+    def tokenize_compact(self, s):
+        """Tokenize into a TokenBuffer instead of a list of Token tuples."""
+        self._reset()
+        tokens = TokenBuffer(s, self.kind_names, self.line_offsets)
+        line_offsets = self.line_offsets
+        offset = 0
+        for name, value, line, column in self._tokens(s):
+            if column:
+                offset = line_offsets[line - 1] + column - 1
+            else:
+                # The DEDENTs closing the file share the last line with its NEWLINE.
+                offset = max(offset, line_offsets[line - 1])
+            tokens.append(name, value, offset)
+        return tokens
+
+    def tokenize_iter(self, s):
+        """Yield tokens one line at a time instead of building the whole list.
+
+        INDENT/DEDENT tokens are synthesized on the fly, so a parser pulling from this
+        generator runs interleaved with the lexer. Every call starts afresh: the
+        indentation and line tables of an earlier source are dropped.
+        """
+        self._reset()
+        for token in self._tokens(s):
+            yield token
+
+    def _tokens(self, s):
+        if self.engine == 'buffer':
+            scan = self._scan_buffer
+            self.source_lines = SourceLines(self)
+        else:
+            scan = self._scan_lines
+        self.source = s
         last_indent_level = 0
         line_num = 0
-        for line_num, line in enumerate(s.splitlines(), 1):
+        for line_num, start, offset, indent_level, line_tokens, line_end in scan(s):
+            self.line_starts.append(start)
+            self.line_offsets.append(offset)
+            self.line_indents.append(indent_level if line_tokens else -1)
+            if line_tokens:
+                if indent_level != last_indent_level:
+                    if indent_level > last_indent_level:
+                        for _ in range(indent_level - last_indent_level):
+                            yield Token('INDENT', None, line_num, 0)
+                    elif indent_level < last_indent_level:
+                        for _ in range(last_indent_level - indent_level):
+                            yield Token('DEDENT', None, line_num, 0)
+                    last_indent_level = indent_level
+
+                for token in line_tokens:
+                    yield token
+                yield Token('NEWLINE', None, line_num, line_end)
+
+        for _ in range(last_indent_level):
+            yield Token('DEDENT', None, line_num, 0)
+
+    def retokenize(self, tokens, edit):
+        """Apply a TextEdit to a TokenBuffer from tokenize_compact, re-lexing only the edited lines.
+
+        Tokens of the following lines are kept and only shifted; the INDENT/DEDENT run in
+        front of the first following line that has tokens is recomputed. Edits that could
+        change the detected indentation fall back to a full tokenize. Returns the updated
+        buffer, which is the same object unless the fallback was taken.
+        """
+        old = tokens.source
+        line_starts = self.line_starts
+        line_count = len(line_starts)
+        first, last, text = edit
+        if not 1 <= first <= line_count + 1 or not first - 1 <= last <= line_count:
+            raise ValueError('Edit range {}-{} outside of 1-{}'.format(first, last, line_count))
+
+        if first > line_count and old and not _line_break.match(old, len(old) - 1):
+            # Appending after a last line without a line break: re-lex that line too.
+            first = line_count
+            text = old[line_starts[first - 1]:] + '\n' + text
+        start = line_starts[first - 1] if first <= line_count else len(old)
+        end = line_starts[last] if last < line_count else len(old)
+        if text and end < len(old) and not _line_break.search(text[-1]):
+            text += '\n'
+        s = old[:start] + text + old[end:]
+
+        if (self.indent_symbol is None or first <= self.indent_line
+                or s[start - 1:start + 1] == '\r\n' or s[start + len(text) - 1:start + len(text) + 1] == '\r\n'):
+            return self.tokenize_compact(s)
+
+        lines = list(self._scan_buffer(s, start, start + len(text), first - 1))
+        delta = len(text) - (end - start)
+
+        level = 0
+        for indent in reversed(self.line_indents[:first - 1]):
+            if indent >= 0:
+                level = indent
+                break
+
+        # The old tokens to replace run from the first edited line up to the INDENT/DEDENT
+        # run of the next line with tokens, or to the end of input.
+        next_line = last
+        while next_line < line_count and self.line_indents[next_line] < 0:
+            next_line += 1
+        if first <= line_count:
+            token_start = bisect_left(tokens.offsets, self.line_offsets[first - 1])
+        else:
+            token_start = len(tokens)
+            while token_start and tokens.kind_name(token_start - 1) == 'DEDENT':
+                token_start -= 1
+        if next_line < line_count:
+            token_end = bisect_left(tokens.offsets, self.line_offsets[next_line])
+            while tokens.kind_name(token_end) in ('INDENT', 'DEDENT'):
+                token_end += 1
+        else:
+            token_end = len(tokens)
+
+        names, offsets, values = [], [], []
+
+        def emit(name, value, offset):
+            names.append(name)
+            offsets.append(offset)
+            values.append(value)
+
+        def emit_indent(level, indent_level, offset):
+            name = 'INDENT' if indent_level > level else 'DEDENT'
+            for _ in range(abs(indent_level - level)):
+                emit(name, None, offset)
+
+        for line_num, _, offset, indent_level, line_tokens, line_end in lines:
+            if line_tokens:
+                emit_indent(level, indent_level, offset)
+                level = indent_level
+                for token in line_tokens:
+                    emit(token.name, token.value, offset + token.column - 1)
+                emit('NEWLINE', None, offset + line_end - 1)
+
+        if next_line < line_count:
+            emit_indent(level, self.line_indents[next_line], self.line_offsets[next_line] + delta)
+
+        self.line_starts[first - 1:] = array('I', [line[1] for line in lines]) + array(
+            'I', [offset + delta for offset in self.line_starts[last:]])
+        self.line_offsets[first - 1:] = array('I', [line[2] for line in lines]) + array(
+            'I', [offset + delta for offset in self.line_offsets[last:]])
+        self.line_indents[first - 1:last] = array('h', [line[3] if line[4] else -1 for line in lines])
+
+        if next_line >= line_count and level:
+            # Same placement as tokenize_compact gives the DEDENTs closing the file.
+            if offsets:
+                offset = offsets[-1]
+            else:
+                offset = tokens.offsets[token_start - 1] if token_start else 0
+            for _ in range(level):
+                emit('DEDENT', None, max(offset, self.line_offsets[-1]))
+
+        tokens.splice(token_start, token_end, names, offsets, values, delta)
+        tokens.source = self.source = s
+        self.source_lines = SourceLines(self)
+        return tokens
+
+    # Both engines yield (line_num, line_start, first_column_offset, indent_level, tokens,
+    # newline_column) per source line.
+
+    def _scan_lines(self, s):
+        line_offset = 0
+        for line_num, line in enumerate(s.splitlines(True), 1):
+            start = line_offset
+            line_offset += len(line)
             line = line.rstrip()
 
             if not line:
                 self.source_lines.append('')
+                yield line_num, start, start, 0, (), 0
                 continue
 
-            if indent_symbol is None:
-                indent_symbol = self._detect_indent(line)
+            if self.indent_symbol is None:
+                self.indent_symbol = self._detect_indent(line)
+                if self.indent_symbol is not None:
+                    self.indent_line = line_num
 
-            if indent_symbol is not None:
-                indent_level = line.count(indent_symbol)
-                line = line[indent_level*len(indent_symbol):]
+            if self.indent_symbol is not None:
+                indent_level = line.count(self.indent_symbol)
+                line = line[indent_level*len(self.indent_symbol):]
             else:
                 indent_level = 0
 
             self.source_lines.append(line)
+            yield (line_num, start, start + indent_level*len(self.indent_symbol or ''), indent_level,
+                   list(self._tokenize_line(line, line_num)), len(line) + 1)
+
+    def _scan_buffer(self, s, start=0, stop=None, line_num=0):
+        """Scan the whole buffer in place, without splitting it into lines first.
+
+        Line boundaries come from a single pass over the line breaks, indentation is
+        counted between offsets and every line is matched with a scanner bounded by the
+        line end, so no per-line strings are created. retokenize uses start/stop to scan
+        just the edited region.
+        """
+        regex = self._buffer_regex
+        new_token = tuple.__new__
+        ignore_tokens = self.ignore_tokens
+        decoders = self.decoders
+        keywords = self.keywords
+        indent_symbol = self.indent_symbol
+        indent_width = len(indent_symbol or '')
+        if stop is None:
+            stop = len(s)
+        breaks = _line_break.finditer(s, start, stop)
+        while start < stop:
+            line_num += 1
+            line_break = next(breaks, None)
+            next_start = line_break.end() if line_break is not None else stop
+            end = line_break.start() if line_break is not None else stop
+            while end > start and s[end - 1].isspace():
+                end -= 1
+
+            if end == start:
+                yield line_num, start, start, 0, (), 0
+                start = next_start
+                continue
 
-            line_tokens = list(self._tokenize_line(line, line_num))
-            if line_tokens:
-                if indent_level != last_indent_level:
-                    if indent_level > last_indent_level:
-                        tokens.extend([Token('INDENT', None, line_num, 0)] * (indent_level - last_indent_level))
-                    elif indent_level < last_indent_level:
-                        tokens.extend([Token('DEDENT', None, line_num, 0)] * (last_indent_level - indent_level))
-                    last_indent_level = indent_level
-
-                tokens.extend(line_tokens)
-                tokens.append(Token('NEWLINE', None, line_num, len(line) + 1))
+            if indent_symbol is None and s[start] == ' ':
+                indent_width = _leading_spaces.match(s, start).end() - start
+                self.indent_symbol = indent_symbol = ' ' * indent_width
+                self.indent_line = line_num
 
-        if last_indent_level > 0:
-            tokens.extend([Token('DEDENT', None, line_num, 0)] * last_indent_level)
+            if indent_symbol is not None:
+                indent_level = s.count(indent_symbol, start, end)
+                line_start = start + indent_level * indent_width
+            else:
+                indent_level = 0
+                line_start = start
 
-        return tokens
+            tokens = []
+            pos = line_start
+            for matches in iter(regex.scanner(s, line_start, end).match, None):
+                name = matches.lastgroup
+                pos = matches.end()
+                if name not in ignore_tokens:
+                    value = matches.group(name)
+                    column = matches.start(name) - line_start + 1
+                    if name in decoders:
+                        value = decoders[name](value)
+                    elif name == 'NAME' and value in keywords:
+                        name = keywords[value]
+                        value = None
+                    tokens.append(new_token(Token, (name, value, line_num, column)))
+            if pos < end:
+                raise LexerError('Unexpected character {}'.format(s[pos]), line_num, pos - line_start + 1)
+
+            yield line_num, start, line_start, indent_level, tokens, end - line_start + 1
+            start = next_start
+
+
+TextEdit = namedtuple('TextEdit', ['start_line', 'end_line', 'text'])
+
+
+class SourceLines(object):
+    """Lazy view of the (dedented) source lines, sliced from the lexer's line tables."""
+
+    def __init__(self, lexer):
+        self._lexer = lexer
+
+    def __len__(self):
+        return len(self._lexer.line_starts)
+
+    def __getitem__(self, index):
+        lexer = self._lexer
+        line_starts = lexer.line_starts
+        if index < 0:
+            index += len(line_starts)
+        end = line_starts[index + 1] if index + 1 < len(line_starts) else len(lexer.source)
+        return lexer.source[lexer.line_offsets[index]:end].rstrip()
+
+
+class TokenBuffer(object):
+    """Compact token storage.
+
+    Kinds are small integer codes in an array('B') and positions are source offsets in
+    an array('I'). Values live in a side table of distinct values referenced from an
+    array('i') (-1 for tokens without a value), so every occurrence of a name shares
+    one entry. Line and column are recovered from the offset through the table of line
+    offsets, so Token tuples only exist while someone looks at them.
+    """
+
+    def __init__(self, source, kind_names, line_offsets):
+        self.source = source
+        self.kind_names = kind_names
+        self.kind_codes = dict((name, code) for code, name in enumerate(kind_names))
+        self.line_offsets = line_offsets
+        self.kinds = array('B')
+        self.offsets = array('I')
+        self.value_refs = array('i')
+        self.values = []
+        self._value_refs = {}
+        self._line = 1
+
+    def _value_ref(self, value):
+        if value is None:
+            return -1
+        # 1 and 1.0 are equal dict keys, numbers are keyed by type as well.
+        key = value if isinstance(value, str) else (type(value), value)
+        ref = self._value_refs.get(key)
+        if ref is None:
+            ref = self._value_refs[key] = len(self.values)
+            self.values.append(value)
+        return ref
+
+    def append(self, name, value, offset):
+        self.kinds.append(self.kind_codes[name])
+        self.offsets.append(offset)
+        self.value_refs.append(self._value_ref(value))
+
+    def kind(self, index):
+        return self.kinds[index]
+
+    def kind_name(self, index):
+        return self.kind_names[self.kinds[index]]
+
+    def value(self, index):
+        ref = self.value_refs[index]
+        return self.values[ref] if ref >= 0 else None
+
+    def position(self, index):
+        offset = self.offsets[index]
+        line_offsets = self.line_offsets
+        # The parser asks for positions front to back, so the line of the last lookup
+        # or the one after it usually holds the offset and the search can be skipped.
+        line = min(self._line, len(line_offsets))
+        if not (line_offsets[line - 1] <= offset and (line == len(line_offsets) or offset < line_offsets[line])):
+            line += 1
+            if not (line < len(line_offsets) and line_offsets[line - 1] <= offset < line_offsets[line]):
+                line = bisect_right(line_offsets, offset)
+            self._line = line
+        if self.kind_names[self.kinds[index]] in ('INDENT', 'DEDENT'):
+            return line, 0
+        return line, offset - self.line_offsets[line - 1] + 1
+
+    def splice(self, start, end, names, offsets, values, delta):
+        """Replace tokens[start:end] and shift the offsets of the tokens after them by delta."""
+        self.kinds[start:end] = array('B', [self.kind_codes[name] for name in names])
+        self.value_refs[start:end] = array('i', [self._value_ref(value) for value in values])
+        self.offsets[start:] = array('I', offsets) + array('I', [offset + delta for offset in self.offsets[end:]])
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.kinds)
+        if not 0 <= index < len(self.kinds):
+            raise IndexError('token index out of range')
+        line, column = self.position(index)
+        return Token(self.kind_names[self.kinds[index]], self.value(index), line, column)
+
+    def __iter__(self):
+        for index in range(len(self.kinds)):
+            yield self[index]
 
 
 class TokenStream(object):
@@ -204,6 +573,9 @@ class TokenStream(object):
                 raise LexerError('Expected {}, got {}'.format(expected_name, token.name), token.line, token.column)
         return token
 
+    # For tokens the parser has no use for, see BufferTokenStream.
+    skip = consume_expected
+
     def consume(self):
         token = self.current()
         self._pos += 1
@@ -216,6 +588,12 @@ class TokenStream(object):
             last_token = self._tokens[-1]
             raise LexerError('Unexpected end of input', last_token.line, last_token.column)
 
+    def current_name(self):
+        return self.current().name
+
+    def current_value(self):
+        return self.current().value
+
     def expect_end(self):
         if not self.is_end():
             token = self.current()
@@ -223,3 +601,81 @@ class TokenStream(object):
 
     def is_end(self):
         return self._pos == len(self._tokens)
+
+
+class BufferTokenStream(TokenStream):
+    """Token stream over a TokenBuffer.
+
+    current_name(), current_value() and skip() read the buffer's arrays, so a Token,
+    and the line lookup for its position, is only made for the tokens the parser keeps
+    or reports an error at.
+    """
+
+    def __init__(self, tokens):
+        super(BufferTokenStream, self).__init__(tokens)
+        # The parser peeks at a token several times before consuming it, the last
+        # Token built is kept with its position.
+        self._current_pos = -1
+        self._current = None
+
+    def skip(self, *args):
+        for expected_name in args:
+            name = self.current_name()
+            if name != expected_name:
+                token = self.current()
+                raise LexerError('Expected {}, got {}'.format(expected_name, name), token.line, token.column)
+            self._pos += 1
+
+    def current(self):
+        if self._current_pos != self._pos:
+            self._current = super(BufferTokenStream, self).current()
+            self._current_pos = self._pos
+        return self._current
+
+    def current_name(self):
+        tokens = self._tokens
+        if self._pos < len(tokens):
+            return tokens.kind_names[tokens.kinds[self._pos]]
+        return self.current().name
+
+    def current_value(self):
+        if self._pos < len(self._tokens):
+            return self._tokens.value(self._pos)
+        return self.current().value
+
+
+class StreamingTokenStream(TokenStream):
+    """Token stream that pulls tokens lazily from an iterator.
+
+    Only a one-token lookahead is buffered, so consumed tokens can be freed while the
+    rest of the source has not been lexed yet.
+    """
+
+    def __init__(self, tokens):
+        self._source = iter(tokens)
+        self._buffer = deque()
+        self._last = None
+
+    def _fill(self):
+        if not self._buffer:
+            token = next(self._source, None)
+            if token is None:
+                return False
+            self._buffer.append(token)
+        return True
+
+    def consume(self):
+        token = self.current()
+        self._last = self._buffer.popleft()
+        return token
+
+    def current(self):
+        if not self._fill():
+            last_token = self._last
+            if last_token is None:
+                raise LexerError('Unexpected end of input', 1, 1)
+            raise LexerError('Unexpected end of input', last_token.line, last_token.column)
+        return self._buffer[0]
+
+    def is_end(self):
+        return not self._fill()
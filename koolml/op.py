@@ -1,3 +1,13 @@
+"""
+Op
+--
+
+Java operators: text helpers, precedence and the peephole stage that lowers numeric
+operators before they are emitted.
+"""
+from koolml import ast
+from koolml.lexer import Token
+
 
 class op():        
     def add (left, right):
@@ -32,4 +42,162 @@ class op():
         
     def ne (left, right):
         return str(left) + " != " + str(right)
-    
\ No newline at end of file
+    
+
+# Java operator precedence, higher binds tighter.
+PRECEDENCE = {
+    '||': 3,
+    '&&': 4,
+    '&': 7,
+    '==': 8,
+    '!=': 8,
+    '<': 9,
+    '>': 9,
+    '<=': 9,
+    '>=': 9,
+    '<<': 10,
+    '>>': 10,
+    '+': 11,
+    '-': 11,
+    '*': 12,
+    '/': 12,
+    '%': 12,
+}
+
+UNARY_PRECEDENCE = 14
+
+# Literals, names, calls and anything else that never needs parentheses.
+ATOM_PRECEDENCE = 16
+
+# Runtime helper a pure operand multiplied by itself is passed to, see coder.OpsClass.
+SQUARE = 'Ops.sq'
+
+
+def power_of_two(node):
+    """k when node is the int literal 2**k with k > 0, None otherwise."""
+    if type(node) is ast.Number and type(node.value) is int and 2 <= node.value <= 2 ** 30:
+        if node.value & (node.value - 1) == 0:
+            return node.value.bit_length() - 1
+    return None
+
+
+def non_negative(node, counters, bindings):
+    """Whether node is an int expression that can't be negative.
+
+    counters holds id(node) of the ForLoop nodes whose variable can't be negative, see
+    counters(). bindings comes from koolml.resolver.
+    """
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        tp = type(node)
+        if tp is ast.Number:
+            if type(node.value) is not int or node.value < 0:
+                return False
+        elif tp is ast.Identifier:
+            symbol = bindings.get(id(node))
+            if symbol is None or id(symbol.node) not in counters:
+                return False
+        elif tp is ast.BinaryOperator and node.operator in ('/', '%'):
+            # Truncating division and remainder of non-negatives, no overflow.
+            stack.append(node.left)
+            stack.append(node.right)
+        else:
+            return False
+    return True
+
+
+def counters(body, bindings):
+    """id(node) of the ForLoop nodes in body whose variable can't be negative.
+
+    Those are the loops over a range starting at a non-negative int: variables are
+    never reassigned, the loop variable only counts up from the start.
+    """
+    found = set()
+    # Enclosing loops come first, a range may start at the variable of one.
+    for node in ast.walk(body):
+        if (type(node) is ast.ForLoop and type(node.collection) is ast.BinaryOperator
+                and node.collection.operator in ('..', '...')
+                and non_negative(node.collection.left, found, bindings)):
+            found.add(id(node))
+    return found
+
+
+def pure(node):
+    """Whether evaluating node twice is the same as evaluating it once."""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        tp = type(node)
+        if tp is ast.BinaryOperator:
+            stack.append(node.left)
+            stack.append(node.right)
+        elif tp is ast.UnaryOperator:
+            stack.append(node.right)
+        elif tp is ast.SubscriptOperator:
+            stack.append(node.left)
+            stack.append(node.key)
+        elif tp not in (ast.Identifier, ast.Number, ast.String):
+            return False
+    return True
+
+
+def same_expression(a, b):
+    """Structural equality of two expressions, ignoring source positions."""
+    stack = [(a, b)]
+    while stack:
+        a, b = stack.pop()
+        if type(a) is not type(b):
+            return False
+        if type(a) is Token:
+            if a.value != b.value:
+                return False
+        elif type(a) in ast.node_types:
+            stack.extend(zip(a, b))
+        elif type(a) is list:
+            if len(a) != len(b):
+                return False
+            stack.extend(zip(a, b))
+        elif a != b:
+            return False
+    return True
+
+
+def peephole(node, arithmetic, counters, bindings):
+    """Lower a numeric BinaryOperator for emission.
+
+    arithmetic is (result, left_same, right_same) from the typer, counters and bindings
+    are passed to non_negative. Returns (operator, left, right) to emit `left operator
+    right`, with the operator and operands possibly rewritten: multiplication of ints by
+    2**k becomes a left shift, and division and remainder of non-negative ints by 2**k a
+    right shift and a mask. Returns (SQUARE, operand, None) when node squares a pure
+    operand other than a name or a literal, to be emitted as Ops.sq(operand) so the
+    operand is evaluated once.
+    """
+    operator, left, right = node.operator, node.left, node.right
+    result, left_same, right_same = arithmetic
+    integral = result == 'Integer' and left_same and right_same
+    if operator == '*':
+        if integral:
+            k = power_of_two(right)
+            if k is not None:
+                return '<<', left, ast.Number(k)
+            k = power_of_two(left)
+            if k is not None:
+                return '<<', right, ast.Number(k)
+        # Cheap structural check first, it fails fast on long operator chains.
+        # x * x is as cheap as the call, only squares of compound operands are rewritten.
+        if (left_same and right_same and type(left) not in (ast.Identifier, ast.Number)
+                and same_expression(left, right) and pure(left)):
+            return SQUARE, left, None
+    elif operator in ('/', '%') and integral and non_negative(left, counters, bindings):
+        k = power_of_two(right)
+        if k is not None:
+            if operator == '/':
+                return '>>', left, ast.Number(k)
+            return '&', left, ast.Number(2 ** k - 1)
+    return operator, left, right
+
+
+# The stage is published next to the text helpers as well.
+op.peephole = staticmethod(peephole)
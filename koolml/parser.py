@@ -5,8 +5,9 @@ Parser
 Top-down recursive descent parser.
 """
 
+from types import GeneratorType
 from koolml import ast
-from koolml.errors import AbrvalgSyntaxError, report_syntax_error
+from koolml.errors import AbrvalgSyntaxError
 
 
 class ParserError(AbrvalgSyntaxError):
@@ -26,6 +27,30 @@ def enter_scope(parser, name):
     return State()
 
 
+def run_steps(steps):
+    """Drive an expression parse to completion on an explicit stack.
+
+    steps is either a finished node or a generator. A generator yields another steps
+    generator when it needs a sub-expression, and receives the parsed node back from the
+    yield; its last yield is its own result. Nesting depth therefore costs heap, not
+    Python stack frames.
+    """
+    if type(steps) is not GeneratorType:
+        return steps
+    stack = [steps]
+    value = None
+    while True:
+        step = stack[-1].send(value)
+        if type(step) is GeneratorType:
+            stack.append(step)
+            value = None
+        else:
+            stack.pop()
+            if not stack:
+                return step
+            value = step
+
+
 class Subparser(object):
 
     PRECEDENCE = {
@@ -57,21 +82,24 @@ class Subparser(object):
         '...': 1,
     }
 
-    def get_subparser(self, token, subparsers, default=None):
-        cls = subparsers.get(token.name, default)
-        if cls is not None:
-            return cls()
-
 
+# Expression subparsers implement steps(), see run_steps(). Subparsers that need no
+# sub-expression return their node directly instead of a generator.
 class PrefixSubparser(Subparser):
 
     def parse(self, parser, tokens):
+        return run_steps(self.steps(parser, tokens))
+
+    def steps(self, parser, tokens):
         raise NotImplementedError()
 
 
 class InfixSubparser(Subparser):
 
     def parse(self, parser, tokens, left):
+        return run_steps(self.steps(parser, tokens, left))
+
+    def steps(self, parser, tokens, left):
         raise NotImplementedError()
 
     def get_precedence(self, token):
@@ -81,7 +109,7 @@ class InfixSubparser(Subparser):
 # number_expr: NUMBER
 class NumberExpression(PrefixSubparser):
 
-    def parse(self, parser, tokens):
+    def steps(self, parser, tokens):
         token = tokens.consume_expected('NUMBER')
         return ast.Number(token.value)
 
@@ -89,7 +117,7 @@ class NumberExpression(PrefixSubparser):
 # str_expr: STRING
 class StringExpression(PrefixSubparser):
 
-    def parse(self, parser, tokens):
+    def steps(self, parser, tokens):
         token = tokens.consume_expected('STRING')
         return ast.String(token.value)
 
@@ -97,10 +125,10 @@ class StringExpression(PrefixSubparser):
 # name_expr: NAME
 class NameExpression(PrefixSubparser):
 
-    def parse(self, parser, tokens):
+    def steps(self, parser, tokens):
         token = tokens.consume_expected('NAME')
-        if tokens.current().name == 'HOVER':
-            tokens.consume_expected('HOVER')
+        if tokens.current_name() == 'HOVER':
+            tokens.skip('HOVER')
             rest = tokens.consume_expected('NAME')
             return ast.List(token, rest)
         else:
@@ -112,14 +140,20 @@ class UnaryOperatorExpression(PrefixSubparser):
 
     SUPPORTED_OPERATORS = ['-', '!']
 
-    def parse(self, parser, tokens):
+    def consume_operator(self, tokens):
         token = tokens.consume_expected('OPERATOR')
         if token.value not in self.SUPPORTED_OPERATORS:
             raise ParserError('Unary operator {} is not supported'.format(token.value), token)
-        right = Expression().parse(parser, tokens, self.get_precedence(token))
+        return token
+
+    def steps(self, parser, tokens):
+        token = self.consume_operator(tokens)
+        right = _expression.steps(parser, tokens, self.get_precedence(token))
+        if type(right) is GeneratorType:
+            right = yield right
         if right is None:
             raise ParserError('Expected expression'.format(token.value), tokens.consume())
-        return ast.UnaryOperator(token.value, right)
+        yield ast.UnaryOperator(token.value, right)
 
     def get_precedence(self, token):
         return self.PRECEDENCE['unary']
@@ -128,21 +162,23 @@ class UnaryOperatorExpression(PrefixSubparser):
 # group_expr: LPAREN expr RPAREN
 class GroupExpression(PrefixSubparser):
 
-    def parse(self, parser, tokens):
-        tokens.consume_expected('LPAREN')
-        right = Expression().parse(parser, tokens)
-        tokens.consume_expected('RPAREN')
-        return right
+    def steps(self, parser, tokens):
+        tokens.skip('LPAREN')
+        right = _expression.steps(parser, tokens)
+        if type(right) is GeneratorType:
+            right = yield right
+        tokens.skip('RPAREN')
+        yield right
 
 
 # array_expr: LBRACK list_of_expr? RBRACK
 class ArrayExpression(PrefixSubparser):
 
-    def parse(self, parser, tokens):
-        tokens.consume_expected('LBRACK')
-        items = ListOfExpressions().parse(parser, tokens)
-        tokens.consume_expected('RBRACK')
-        return ast.Array(items)
+    def steps(self, parser, tokens):
+        tokens.skip('LBRACK')
+        items = yield _list_of_expressions.steps(parser, tokens)
+        tokens.skip('RBRACK')
+        yield ast.Array(items)
 
 
 # dict_expr: LCBRACK (expr COLON expr COMMA)* RCBRACK
@@ -151,50 +187,58 @@ class DictionaryExpression(PrefixSubparser):
     def _parse_keyvals(self, parser, tokens):
         items = []
         while not tokens.is_end():
-            key = Expression().parse(parser, tokens)
+            key = _expression.steps(parser, tokens)
+            if type(key) is GeneratorType:
+                key = yield key
             if key is not None:
-                tokens.consume_expected('COLON')
-                value = Expression().parse(parser, tokens)
+                tokens.skip('COLON')
+                value = _expression.steps(parser, tokens)
+                if type(value) is GeneratorType:
+                    value = yield value
                 if value is None:
                     raise ParserError('Dictionary value expected', tokens.consume())
                 items.append((key, value))
             else:
                 break
-            if tokens.current().name == 'COMMA':
-                tokens.consume_expected('COMMA')
+            if tokens.current_name() == 'COMMA':
+                tokens.skip('COMMA')
             else:
                 break
-        return items
+        yield items
 
-    def parse(self, parser, tokens):
-        tokens.consume_expected('LCBRACK')
-        items = self._parse_keyvals(parser, tokens)
-        tokens.consume_expected('RCBRACK')
-        return ast.Dictionary(items)
+    def steps(self, parser, tokens):
+        tokens.skip('LCBRACK')
+        items = yield self._parse_keyvals(parser, tokens)
+        tokens.skip('RCBRACK')
+        yield ast.Dictionary(items)
 
 
 # infix_expr: expr OPERATOR expr
 class BinaryOperatorExpression(InfixSubparser):
 
-    def parse(self, parser, tokens, left):
+    def steps(self, parser, tokens, left):
         token = tokens.consume_expected('OPERATOR')
-        right = Expression().parse(parser, tokens, self.get_precedence(token))
+        right = _expression.steps(parser, tokens, self.get_precedence(token))
+        if type(right) is GeneratorType:
+            right = yield right
         if right is None:
             raise ParserError('Expected expression'.format(token.value), tokens.consume())
-        return ast.BinaryOperator(token.value, left, right)
+        yield ast.BinaryOperator(token.value, left, right)
 
     def get_precedence(self, token):
+        if token.value not in self.PRECEDENCE:
+            raise ParserError('Binary operator {} is not supported'.format(token.value), token)
         return self.PRECEDENCE[token.value]
 
 
 # call_expr: NAME LPAREN list_of_expr? RPAREN
 class CallExpression(InfixSubparser):
 
-    def parse(self, parser, tokens, left):
-        tokens.consume_expected('LPAREN')
-        arguments = ListOfExpressions().parse(parser, tokens)
-        tokens.consume_expected('RPAREN')
-        return ast.Call(left, arguments)
+    def steps(self, parser, tokens, left):
+        tokens.skip('LPAREN')
+        arguments = yield _list_of_expressions.steps(parser, tokens)
+        tokens.skip('RPAREN')
+        yield ast.Call(left, arguments)
 
     def get_precedence(self, token):
         return self.PRECEDENCE['call']
@@ -203,13 +247,15 @@ class CallExpression(InfixSubparser):
 # subscript_expr: NAME LBRACK expr RBRACK
 class SubscriptOperatorExpression(InfixSubparser):
 
-    def parse(self, parser, tokens, left):
-        tokens.consume_expected('LBRACK')
-        key = Expression().parse(parser, tokens)
+    def steps(self, parser, tokens, left):
+        tokens.skip('LBRACK')
+        key = _expression.steps(parser, tokens)
+        if type(key) is GeneratorType:
+            key = yield key
         if key is None:
             raise ParserError('Subscript operator key is required', tokens.current())
-        tokens.consume_expected('RBRACK')
-        return ast.SubscriptOperator(left, key)
+        tokens.skip('RBRACK')
+        yield ast.SubscriptOperator(left, key)
 
     def get_precedence(self, token):
         return self.PRECEDENCE['subscript']
@@ -219,120 +265,171 @@ class SubscriptOperatorExpression(InfixSubparser):
 #     | subscript_expr
 class Expression(Subparser):
 
-    def get_prefix_subparser(self, token):
-        return self.get_subparser(token, {
-            'NUMBER': NumberExpression,
-            'STRING': StringExpression,
-            'NAME': NameExpression,
-            'LPAREN': GroupExpression,
-            'LBRACK': ArrayExpression,
-            'LCBRACK': DictionaryExpression,
-            'OPERATOR': UnaryOperatorExpression,
-        })
-
-    def get_infix_subparser(self, token):
-        return self.get_subparser(token, {
-            'OPERATOR': BinaryOperatorExpression,
-            'LPAREN': CallExpression,
-            'LBRACK': SubscriptOperatorExpression,
-        })
-
     def get_next_precedence(self, tokens):
         if not tokens.is_end():
-            token = tokens.current()
-            parser = self.get_infix_subparser(token)
+            parser = INFIX_SUBPARSERS.get(tokens.current_name())
             if parser is not None:
-                return parser.get_precedence(token)
+                return parser.get_precedence(tokens.current())
         return 0
 
     def parse(self, parser, tokens, precedence=0):
-        subparser = self.get_prefix_subparser(tokens.current())
-        if subparser is not None:
-            left = subparser.parse(parser, tokens)
-            if left is not None:
-                while precedence < self.get_next_precedence(tokens):
-                    op = self.get_infix_subparser(tokens.current()).parse(parser, tokens, left)
-                    if op is not None:
-                        left = op
-                return left
+        return run_steps(self.steps(parser, tokens, precedence))
+
+    def steps(self, parser, tokens, precedence=0):
+        subparser = PREFIX_SUBPARSERS.get(tokens.current_name())
+        if subparser is None:
+            return None
+        if subparser is _unary_operator_expression:
+            return self._operator_steps(parser, tokens, precedence, None)
+        left = subparser.steps(parser, tokens)
+        if type(left) is not GeneratorType and (left is None or precedence >= self.get_next_precedence(tokens)):
+            # A lone operand needs no generator.
+            return left
+        return self._operator_steps(parser, tokens, precedence, left)
+
+    def _operator_steps(self, parser, tokens, precedence, left):
+        # Unary and binary operators are resolved here rather than through their
+        # subparsers, so operator chains of any length take no extra generators. Operators
+        # still waiting for their right operand are kept as (token, left operand or None
+        # for unary operators, precedence to resume with).
+        pending = []
+        expect_operand = left is None
+        if type(left) is GeneratorType:
+            left = yield left
+        while True:
+            if expect_operand:
+                subparser = PREFIX_SUBPARSERS.get(tokens.current_name())
+                if subparser is _unary_operator_expression:
+                    token = subparser.consume_operator(tokens)
+                    pending.append((token, None, precedence))
+                    precedence = subparser.get_precedence(token)
+                    continue
+                left = None
+                if subparser is not None:
+                    left = subparser.steps(parser, tokens)
+                    if type(left) is GeneratorType:
+                        left = yield left
+                expect_operand = False
+
+            if left is not None and not tokens.is_end():
+                subparser = INFIX_SUBPARSERS.get(tokens.current_name())
+                if subparser is not None:
+                    token = tokens.current()
+                    next_precedence = subparser.get_precedence(token)
+                    if precedence < next_precedence:
+                        if subparser is _binary_operator_expression:
+                            tokens.consume()
+                            pending.append((token, left, precedence))
+                            precedence = next_precedence
+                            expect_operand = True
+                        else:
+                            op = subparser.steps(parser, tokens, left)
+                            if type(op) is GeneratorType:
+                                op = yield op
+                            if op is not None:
+                                left = op
+                        continue
+
+            if not pending:
+                yield left
+                return
+            token, operand, precedence = pending.pop()
+            if left is None:
+                raise ParserError('Expected expression'.format(token.value), tokens.consume())
+            if operand is None:
+                left = ast.UnaryOperator(token.value, left)
+            else:
+                left = ast.BinaryOperator(token.value, operand, left)
 
 
 # list_of_expr: (expr COMMA)*
 class ListOfExpressions(Subparser):
 
     def parse(self, parser, tokens):
+        return run_steps(self.steps(parser, tokens))
+
+    def steps(self, parser, tokens):
         items = []
         while not tokens.is_end():
-            exp = Expression().parse(parser, tokens)
+            exp = _expression.steps(parser, tokens)
+            if type(exp) is GeneratorType:
+                exp = yield exp
             if exp is not None:
                 items.append(exp)
             else:
                 break
-            if tokens.current().name == 'COMMA':
-                tokens.consume_expected('COMMA')
+            if tokens.current_name() == 'COMMA':
+                tokens.skip('COMMA')
             else:
                 break
-        return items
+        yield items
 
 
 # block: NEWLINE INDENT stmnts DEDENT
 class Block(Subparser):
 
     def parse(self, parser, tokens):
-        tokens.consume_expected('NEWLINE', 'INDENT')
-        statements = Statements().parse(parser, tokens)
-        tokens.consume_expected('DEDENT')
+        tokens.skip('NEWLINE', 'INDENT')
+        statements = _statements.parse(parser, tokens)
+        tokens.skip('DEDENT')
         return statements
 
 class Instance(Subparser):
     def parse(self, parser, tokens):
-        tokens.consume_expected('NEW')
+        tokens.skip('NEW')
         id = tokens.consume_expected('NAME')
-        value = CallExpression().parse(parser, tokens, id)
+        value = _call_expression.parse(parser, tokens, id)
         return ast.Instance(value)
 
 class Type(Subparser):
     def parse(self, parser, tokens):
-        type_token = tokens.consume_expected('NAME')
-        if tokens.current().value == '<':
-            tokens.consume_expected('OPERATOR')
-            args = []
-            while tokens.current().value != '>':
-                tk = self.parse(parser, tokens)
-                args.append(tk)
-                if tokens.current().name == 'COMMA':
-                    tokens.consume_expected('COMMA')
-
-                    if tokens.current().name == 'NAME':
-                        continue
-            tokens.consume_expected('OPERATOR')
-            return ast.Type(type_token, args)
-
-        else:
-            return ast.Type(type_token, [])
+        # Open generic types wait on the stack as (name token, args so far).
+        stack = []
+        while True:
+            type_token = tokens.consume_expected('NAME')
+            if tokens.current_value() != '<':
+                node = ast.Type(type_token, [])
+            else:
+                tokens.skip('OPERATOR')
+                stack.append((type_token, []))
+                if tokens.current_value() != '>':
+                    continue
+                node = None
+            while True:
+                if node is not None:
+                    if not stack:
+                        return node
+                    stack[-1][1].append(node)
+                    if tokens.current_name() == 'COMMA':
+                        tokens.skip('COMMA')
+                    if tokens.current_value() != '>':
+                        break
+                tokens.skip('OPERATOR')
+                type_token, args = stack.pop()
+                node = ast.Type(type_token, args)
 
 
 class VarDeclaration(Subparser):
 
     def parse(self, parser, tokens):
-        tokens.consume_expected('LET')
+        tokens.skip('LET')
         id_token = tokens.consume_expected('NAME')     
 
-        if tokens.current().name == 'COLON':
-            tokens.consume_expected('COLON')
-            type_token = Type().parse(parser, tokens)
+        if tokens.current_name() == 'COLON':
+            tokens.skip('COLON')
+            type_token = _type.parse(parser, tokens)
             value = None 
 
-            if tokens.current().name == 'ASSIGN':
-                tokens.consume_expected('ASSIGN')
-                if tokens.current().name == 'NEW':
-                    value = Instance().parse(parser, tokens)
+            if tokens.current_name() == 'ASSIGN':
+                tokens.skip('ASSIGN')
+                if tokens.current_name() == 'NEW':
+                    value = _instance.parse(parser, tokens)
                 else:
-                    value = Expression().parse(parser, tokens)
-                tokens.consume_expected('NEWLINE')
+                    value = _expression.parse(parser, tokens)
+                tokens.skip('NEWLINE')
                 return ast.TypedVariable(id_token, type_token, value)
             else:
-                tokens.consume_expected('NEWLINE')
+                tokens.skip('NEWLINE')
                 return ast.TypedVariable(id_token, type_token, value) 
         else:
             raise ParserError('Unimplemented code encountered for the code fragrment below. Sorry! We are working on it :)', tokens.current())
@@ -344,11 +441,11 @@ class VarDeclaration(Subparser):
 class ModuleStatement(Subparser):
 
     def parse(self, parser, tokens):
-        tokens.consume_expected('MODULE')
+        tokens.skip('MODULE')
         id_token = tokens.consume_expected('NAME')
-        tokens.consume_expected('ARROW')
+        tokens.skip('ARROW')
         with enter_scope(parser, 'function'):
-            block = Block().parse(parser, tokens)
+            block = _block.parse(parser, tokens)
         if block is None:
             raise ParserError('Expected module body', tokens.current())
         
@@ -359,36 +456,36 @@ class FunctionStatement(Subparser):
     # func_params: (NAME COMMA)*
     def _parse_params(self, parser, tokens):
         params = []
-        if tokens.current().name == 'NAME':
+        if tokens.current_name() == 'NAME':
             while not tokens.is_end():
                 id_token = tokens.consume_expected('NAME')
 
-                if tokens.current().name == "COLON":
-                    tokens.consume_expected('COLON')
-                    type_token = Type().parse(parser, tokens)
+                if tokens.current_name() == "COLON":
+                    tokens.skip('COLON')
+                    type_token = _type.parse(parser, tokens)
                     params.append(ast.TypedParam(id_token, type_token))
                 else:
                     params.append(ast.UntypedParam(id_token))
 
-                if tokens.current().name == 'COMMA':
-                    tokens.consume_expected('COMMA')
+                if tokens.current_name() == 'COMMA':
+                    tokens.skip('COMMA')
                 else:
                     break
         return params
 
     def parse(self, parser, tokens):
-        tokens.consume_expected('FUNCTION')
+        tokens.skip('FUNCTION')
         id_token = tokens.consume_expected('NAME')
-        tokens.consume_expected('LPAREN')
+        tokens.skip('LPAREN')
         arguments = self._parse_params(parser, tokens)
-        tokens.consume_expected('RPAREN')
+        tokens.skip('RPAREN')
         ret_type = None
-        if tokens.current().name == "COLON":
-            tokens.consume_expected('COLON')
+        if tokens.current_name() == "COLON":
+            tokens.skip('COLON')
             ret_type =  ast.Type(tokens.consume_expected('NAME'), 0)
-        tokens.consume_expected('ARROW')
+        tokens.skip('ARROW')
         with enter_scope(parser, 'function'):
-            block = Block().parse(parser, tokens)
+            block = _block.parse(parser, tokens)
         if block is None:
             raise ParserError('Expected function body', tokens.current())
         return ast.Function(id_token.value, arguments, block, ret_type)
@@ -399,13 +496,13 @@ class ConditionalStatement(Subparser):
 
     def _parse_elif_conditions(self, parser, tokens):
         conditions = []
-        while not tokens.is_end() and tokens.current().name == 'ELIF':
-            tokens.consume_expected('ELIF')
-            test = Expression().parse(parser, tokens)
+        while not tokens.is_end() and tokens.current_name() == 'ELIF':
+            tokens.skip('ELIF')
+            test = _expression.parse(parser, tokens)
             if test is None:
                 raise ParserError('Expected `elif` condition', tokens.current())
-            tokens.consume_expected('COLON')
-            block = Block().parse(parser, tokens)
+            tokens.skip('COLON')
+            block = _block.parse(parser, tokens)
             if block is None:
                 raise ParserError('Expected `elif` body', tokens.current())
             conditions.append(ast.ConditionElif(test, block))
@@ -413,31 +510,31 @@ class ConditionalStatement(Subparser):
 
     def _parse_else(self, parser, tokens):
         else_block = None
-        if not tokens.is_end() and tokens.current().name == 'ELSE':
-            tokens.consume_expected('ELSE')
+        if not tokens.is_end() and tokens.current_name() == 'ELSE':
+            tokens.skip('ELSE')
             else_block = None
-            if tokens.current().name == 'NEWLINE':
-                else_block = Block().parse(parser, tokens)
+            if tokens.current_name() == 'NEWLINE':
+                else_block = _block.parse(parser, tokens)
             else:
-                else_block = Expression().parse(parser, tokens)
-                tokens.consume_expected('NEWLINE')
+                else_block = _expression.parse(parser, tokens)
+                tokens.skip('NEWLINE')
             if else_block is None:
                 raise ParserError('Expected `else` body', tokens.current())
         return else_block
 
     def parse(self, parser, tokens):
-        tokens.consume_expected('IF')
-        test = Expression().parse(parser, tokens)
+        tokens.skip('IF')
+        test = _expression.parse(parser, tokens)
         if test is None:
             raise ParserError('Expected `if` condition', tokens.current())
-        tokens.consume_expected('THEN')
+        tokens.skip('THEN')
         
 
-        if tokens.current().name == 'NEWLINE':
-            if_block = Block().parse(parser, tokens)
+        if tokens.current_name() == 'NEWLINE':
+            if_block = _block.parse(parser, tokens)
         else: 
-            if_block = Expression().parse(parser, tokens)
-            tokens.consume_expected('NEWLINE')
+            if_block = _expression.parse(parser, tokens)
+            tokens.skip('NEWLINE')
         if if_block is None:
             raise ParserError('Expected if body', tokens.current())
         elif_conditions = self._parse_elif_conditions(parser, tokens)
@@ -450,36 +547,36 @@ class MatchStatement(Subparser):
 
     # match_when: WHEN expr COLON block
     def _parse_when(self, parser, tokens):
-        tokens.consume_expected('PIPE')
-        pattern = Expression().parse(parser, tokens)
+        tokens.skip('PIPE')
+        pattern = _expression.parse(parser, tokens)
         if pattern is None:
             raise ParserError('Pattern expression expected', tokens.current())
-        tokens.consume_expected('ARROW')
-        if tokens.current().name == 'NEWLINE':
-            block = Block().parse(parser, tokens)
+        tokens.skip('ARROW')
+        if tokens.current_name() == 'NEWLINE':
+            block = _block.parse(parser, tokens)
             return ast.MatchPattern(pattern, block)
         else:
-            block = Expression().parse(parser, tokens)
-            tokens.consume_expected('NEWLINE')
+            block = _expression.parse(parser, tokens)
+            tokens.skip('NEWLINE')
             return ast.MatchPattern(pattern, block)
        
 
     def parse(self, parser, tokens):
-        tokens.consume_expected('MATCH')
-        test = Expression().parse(parser, tokens)
-        tokens.consume_expected('WITH', 'NEWLINE', 'INDENT')
+        tokens.skip('MATCH')
+        test = _expression.parse(parser, tokens)
+        tokens.skip('WITH', 'NEWLINE', 'INDENT')
         patterns = []
-        while not tokens.is_end() and tokens.current().name == 'PIPE':
+        while not tokens.is_end() and tokens.current_name() == 'PIPE':
             patterns.append(self._parse_when(parser, tokens))
         if not patterns:
             raise ParserError('One or more `when` pattern excepted', tokens.current())
         else_block = None
-        # if not tokens.is_end() and tokens.current().name == 'ELSE':
+        # if not tokens.is_end() and tokens.current_name() == 'ELSE':
         #     tokens.consume_expected('ELSE', 'COLON')
-        #     else_block = Block().parse(parser, tokens)
+        #     else_block = _block.parse(parser, tokens)
         #     if else_block is None:
         #         raise ParserError('Expected `else` body', tokens.current())
-        tokens.consume_expected('DEDENT')
+        tokens.skip('DEDENT')
         return ast.Match(test, patterns, [])
 
 
@@ -487,13 +584,13 @@ class MatchStatement(Subparser):
 class WhileLoopStatement(Subparser):
 
     def parse(self, parser, tokens):
-        tokens.consume_expected('WHILE')
-        test = Expression().parse(parser, tokens)
+        tokens.skip('WHILE')
+        test = _expression.parse(parser, tokens)
         if test is None:
             raise ParserError('While condition expected', tokens.current())
-        tokens.consume_expected('COLON')
+        tokens.skip('COLON')
         with enter_scope(parser, 'loop'):
-            block = Block().parse(parser, tokens)
+            block = _block.parse(parser, tokens)
         if block is None:
             raise ParserError('Expected loop body', tokens.current())
         return ast.WhileLoop(test, block)
@@ -503,13 +600,13 @@ class WhileLoopStatement(Subparser):
 class ForLoopStatement(Subparser):
 
     def parse(self, parser, tokens):
-        tokens.consume_expected('FOR')
+        tokens.skip('FOR')
         id_token = tokens.consume_expected('NAME')
-        tokens.consume_expected('IN')
-        collection = Expression().parse(parser, tokens)
-        tokens.consume_expected('COLON')
+        tokens.skip('IN')
+        collection = _expression.parse(parser, tokens)
+        tokens.skip('COLON')
         with enter_scope(parser, 'loop'):
-            block = Block().parse(parser, tokens)
+            block = _block.parse(parser, tokens)
         if block is None:
             raise ParserError('Expected loop body', tokens.current())
         return ast.ForLoop(id_token.value, collection, block)
@@ -521,9 +618,9 @@ class ReturnStatement(Subparser):
     def parse(self, parser, tokens):
         if not parser.scope or 'function' not in parser.scope:
             raise ParserError('Return outside of function', tokens.current())
-        tokens.consume_expected('RETURN')
-        value = Expression().parse(parser, tokens)
-        tokens.consume_expected('NEWLINE')
+        tokens.skip('RETURN')
+        value = _expression.parse(parser, tokens)
+        tokens.skip('NEWLINE')
         return ast.Return(value)
 
 
@@ -533,7 +630,7 @@ class BreakStatement(Subparser):
     def parse(self, parser, tokens):
         if not parser.scope or parser.scope[-1] != 'loop':
             raise ParserError('Break outside of loop', tokens.current())
-        tokens.consume_expected('BREAK', 'NEWLINE')
+        tokens.skip('BREAK', 'NEWLINE')
         return ast.Break()
 
 
@@ -543,7 +640,7 @@ class ContinueStatement(Subparser):
     def parse(self, parser, tokens):
         if not parser.scope or parser.scope[-1] != 'loop':
             raise ParserError('Continue outside of loop', tokens.current())
-        tokens.consume_expected('CONTINUE', 'NEWLINE')
+        tokens.skip('CONTINUE', 'NEWLINE')
         return ast.Continue()
 
 
@@ -551,9 +648,9 @@ class ContinueStatement(Subparser):
 class AssignmentStatement(Subparser):
 
     def parse(self, parser, tokens, left):
-        tokens.consume_expected('ASSIGN')
-        right = Expression().parse(parser, tokens)
-        tokens.consume_expected('NEWLINE')
+        tokens.skip('ASSIGN')
+        right = _expression.parse(parser, tokens)
+        tokens.skip('NEWLINE')
         return ast.Assignment(left, right)
 
 
@@ -562,12 +659,12 @@ class AssignmentStatement(Subparser):
 class ExpressionStatement(Subparser):
 
     def parse(self, parser, tokens):
-        exp = Expression().parse(parser, tokens)
+        exp = _expression.parse(parser, tokens)
         if exp is not None:
-            if tokens.current().name == 'ASSIGN':
-                return AssignmentStatement().parse(parser, tokens, exp)
+            if tokens.current_name() == 'ASSIGN':
+                return _assignment_statement.parse(parser, tokens, exp)
             else:
-                tokens.consume_expected('NEWLINE')
+                tokens.skip('NEWLINE')
                 return exp
 
 
@@ -575,45 +672,137 @@ class ExpressionStatement(Subparser):
 class Statements(Subparser):
 
     def get_statement_subparser(self, token):
-        return self.get_subparser(token, {
-            'FUNCTION': FunctionStatement,
-            'LET': VarDeclaration, 
-            'IF': ConditionalStatement,
-            'MATCH': MatchStatement,
-            'WHILE': WhileLoopStatement,
-            'FOR': ForLoopStatement,
-            'RETURN': ReturnStatement,
-            'BREAK': BreakStatement,
-            'CONTINUE': ContinueStatement,
-            'MODULE': ModuleStatement
-        }, ExpressionStatement)
+        return STATEMENT_SUBPARSERS.get(token.name, _expression_statement)
 
     def parse(self, parser, tokens):
         statements = []
         while not tokens.is_end():
-            statement = self.get_statement_subparser(tokens.current()).parse(parser, tokens)
+            first = tokens.current()
+            try:
+                statement = self.get_statement_subparser(first).parse(parser, tokens)
+                if statement is None and parser.recover and first.name != 'DEDENT':
+                    raise ParserError('Expected statement, got {}'.format(first.name), first)
+            except AbrvalgSyntaxError as err:
+                if not parser.recover:
+                    raise
+                statements.append(parser.add_error(err))
+                if not tokens.is_end() and tokens.current() == first:
+                    tokens.consume()
+                self.synchronize(tokens, err.line)
+                continue
             if statement is not None:
                 statements.append(statement)
             else:
                 break
         return statements
 
+    def synchronize(self, tokens, line):
+        """Skip the rest of a broken statement, including any block it opened.
+
+        line is the line of the error. Stops after the statement's NEWLINE, or before the
+        DEDENT closing the enclosing block, a `fun` or `module` that starts the next
+        definition, or the next line when the error consumed the NEWLINE itself.
+        """
+        depth = 0
+        while not tokens.is_end():
+            token = tokens.current()
+            name = token.name
+            if depth == 0:
+                if name in ('DEDENT', 'FUNCTION', 'MODULE') or (token.line > line and name != 'INDENT'):
+                    return
+                if name == 'NEWLINE':
+                    tokens.consume()
+                    if tokens.is_end() or tokens.current_name() != 'INDENT':
+                        return
+                    continue
+            if name == 'INDENT':
+                depth += 1
+            elif name == 'DEDENT':
+                depth -= 1
+                if depth == 0:
+                    tokens.consume()
+                    return
+            tokens.consume()
+
 
 # prog: stmnts
 class Program(Subparser):
 
     def parse(self, parser, tokens):
-        statements = Statements().parse(parser, tokens)
-        tokens.expect_end()
+        statements = _statements.parse(parser, tokens)
+        try:
+            tokens.expect_end()
+        except AbrvalgSyntaxError as err:
+            if not parser.recover:
+                raise
+            statements.append(parser.add_error(err))
         return ast.Program(statements)
 
 
+# Dispatch tables keyed by token name. Subparsers keep no state, so every lookup returns
+# the same shared instance instead of building a new one.
+PREFIX_SUBPARSERS = {
+    'NUMBER': NumberExpression(),
+    'STRING': StringExpression(),
+    'NAME': NameExpression(),
+    'LPAREN': GroupExpression(),
+    'LBRACK': ArrayExpression(),
+    'LCBRACK': DictionaryExpression(),
+    'OPERATOR': UnaryOperatorExpression(),
+}
+
+INFIX_SUBPARSERS = {
+    'OPERATOR': BinaryOperatorExpression(),
+    'LPAREN': CallExpression(),
+    'LBRACK': SubscriptOperatorExpression(),
+}
+
+STATEMENT_SUBPARSERS = {
+    'FUNCTION': FunctionStatement(),
+    'LET': VarDeclaration(),
+    'IF': ConditionalStatement(),
+    'MATCH': MatchStatement(),
+    'WHILE': WhileLoopStatement(),
+    'FOR': ForLoopStatement(),
+    'RETURN': ReturnStatement(),
+    'BREAK': BreakStatement(),
+    'CONTINUE': ContinueStatement(),
+    'MODULE': ModuleStatement(),
+}
+
+_expression = Expression()
+_list_of_expressions = ListOfExpressions()
+_unary_operator_expression = PREFIX_SUBPARSERS['OPERATOR']
+_binary_operator_expression = INFIX_SUBPARSERS['OPERATOR']
+_call_expression = INFIX_SUBPARSERS['LPAREN']
+_block = Block()
+_instance = Instance()
+_type = Type()
+_assignment_statement = AssignmentStatement()
+_expression_statement = ExpressionStatement()
+_statements = Statements()
+_program = Program()
+
+
 class Parser(object):
+    """Parses a token stream into an ast.Program.
 
-    def __init__(self, lexer):
+    By default the first syntax error is raised. With recover=True every error is
+    collected in errors, the broken statement is replaced by an ast.Error node and
+    parsing resumes at the next statement.
+    """
+
+    def __init__(self, lexer, recover=False):
         self.scope = None
         self.lexer = lexer 
+        self.recover = recover
+        self.errors = []
+
+    def add_error(self, error):
+        self.errors.append(error)
+        return ast.Error(error.message, error.line, error.column)
 
     def parse(self, tokens):
         self.scope = []
-        return Program().parse(self, tokens)
+        self.errors = []
+        return _program.parse(self, tokens)
@@ -0,0 +1,100 @@
+"""
+Pool
+----
+
+Finds the literal lists and dictionaries code generation builds once per program run.
+
+A list or Dict literal made only of literals (numbers, strings, true and false, and
+lists and Dicts of them) builds the same immutable value every time it runs. Instead
+of building it at every execution of the enclosing function, it is declared once as a
+static final field of the module class and the use sites read the field. Equal
+literals of the same type share one field.
+
+Map literals are mutable and are built anew every time. String literals are left
+alone: Java keeps them in the class constant pool and interns them already.
+"""
+from collections import namedtuple
+from koolml import ast
+from koolml.fold import boolean_value
+
+# fields lists (name, Java type, node) of the fields to declare, in source order.
+# names maps id(node) of every pooled literal to the name of its field.
+Pool = namedtuple('Pool', ['fields', 'names'])
+
+
+def literal_key(node, types):
+    """A hashable key, equal for literals of equal value, None if node is not a literal list or Dict."""
+    # Post-order on an explicit stack, like koolml.fold.
+    results = []
+    work = [(node, False)]
+    while work:
+        node, done = work.pop()
+        tp = type(node)
+        if tp is ast.Array:
+            if not node.items:
+                # The element type of [] depends on where it is used.
+                return None
+            if not done:
+                work.append((node, True))
+                work.extend((item, False) for item in reversed(node.items))
+                continue
+            count = len(node.items)
+            key = ('list',) + tuple(results[-count:])
+            del results[-count:]
+            results.append(key)
+        elif tp is ast.Dictionary:
+            if not node.items or not types.get(id(node), '').startswith('Dict<'):
+                return None
+            if not done:
+                work.append((node, True))
+                work.extend((item, False) for pair in reversed(node.items) for item in pair)
+                continue
+            count = 2 * len(node.items)
+            key = ('dict',) + tuple(results[-count:])
+            del results[-count:]
+            results.append(key)
+        elif tp is ast.Number:
+            # repr tells 1 from 1.0 and 0.0 from -0.0.
+            results.append(('number', repr(node.value)))
+        elif tp is ast.String:
+            results.append(('string', node.value))
+        else:
+            value = boolean_value(node)
+            if value is None:
+                return None
+            results.append(('boolean', value))
+    return results[0]
+
+
+def pool(body, types):
+    """Find the literals of a module body to pool, returns a Pool.
+
+    types is the Typing.types of koolml.infer. Only the outermost literal of a nested
+    one is pooled, the values inside it are built by its initializer. Array patterns
+    are matched, not built, and are skipped.
+    """
+    fields = []
+    names = {}
+    shared = {}
+    stack = list(reversed(body))
+    while stack:
+        node = stack.pop()
+        tp = type(node)
+        if tp in (ast.Array, ast.Dictionary) and id(node) in types:
+            key = literal_key(node, types)
+            if key is not None:
+                java_type = 'List<{}>'.format(types[id(node)]) if tp is ast.Array else types[id(node)]
+                key = (java_type, key)
+                name = shared.get(key)
+                if name is None:
+                    prefix = 'list' if tp is ast.Array else 'dict'
+                    name = shared[key] = '{}${}'.format(prefix, len(fields))
+                    fields.append((name, java_type, node))
+                names[id(node)] = name
+                continue
+        if tp is ast.MatchPattern:
+            children = node.body if isinstance(node.body, list) else [node.body]
+        else:
+            children = ast.children(node)
+        stack.extend(reversed(children))
+    return Pool(fields, names)
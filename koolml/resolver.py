@@ -0,0 +1,219 @@
+"""
+Resolver
+--------
+
+Name resolution pass run before code generation.
+
+Walks the program once with lexical scopes (modules share the global scope, functions,
+blocks, loop bodies and match arms open nested ones; the functions of a module are
+declared before its body) and binds every Identifier and Call to the Symbol its name
+refers to at that point. Code generation then looks the binding up by node instead of
+searching scope chains.
+"""
+import sys
+from collections import namedtuple
+from koolml import ast
+
+# id is an integer unique within the root scope's symbol table, node the declaration.
+Symbol = namedtuple('Symbol', ['id', 'name', 'node'])
+
+Resolution = namedtuple('Resolution', ['bindings', 'shadows', 'declarations'])
+
+
+class Scope(object):
+
+    def __init__(self, parent=None):
+        self._parent = parent
+        self._values = {}
+        # Shared with the parent, so ids are unique across nested scopes.
+        self.symbols = parent.symbols if parent is not None else []
+
+    def set(self, key, val):
+        """Declare key in this scope, returns its new Symbol."""
+        key = sys.intern(key)
+        symbol = Symbol(len(self.symbols), key, val)
+        self.symbols.append(symbol)
+        self._values[key] = symbol
+        return symbol
+
+    def lookup(self, key):
+        """The Symbol key refers to here, or None when it is not declared."""
+        scope = self
+        while scope is not None:
+            symbol = scope._values.get(key)
+            if symbol is not None:
+                return symbol
+            scope = scope._parent
+        return None
+
+    def get(self, key):
+        symbol = self.lookup(key)
+        return symbol.node if symbol is not None else None
+
+    def asdict(self):
+        return self._values
+
+
+class Resolver(object):
+    """Collects the bindings of one program.
+
+    bindings maps id(node) of Identifier and Call nodes to their Symbol, undefined
+    names have no entry. shadows maps id(node) of a TypedVariable to the Symbol its
+    name referred to before the declaration, when there was one. declarations maps
+    id(node) of every declaring node (functions, params, variables, for loops and the
+    head and rest tokens of list patterns) to the Symbol it declares.
+    """
+
+    def __init__(self):
+        self.bindings = {}
+        self.shadows = {}
+        self.declarations = {}
+        self._statements = {
+            ast.Assignment: self._assignment,
+            ast.Condition: self._condition,
+            ast.Match: self._match,
+            ast.WhileLoop: self._while_loop,
+            ast.ForLoop: self._for_loop,
+            ast.Function: self._function,
+            ast.Module: self._module,
+            ast.Return: self._return,
+            ast.TypedVariable: self._typed_variable,
+            ast.Break: self._nothing,
+            ast.Continue: self._nothing,
+        }
+
+    def statements(self, body, scope):
+        for node in body:
+            self.statement(node, scope)
+
+    def statement(self, node, scope):
+        handler = self._statements.get(type(node))
+        if handler is not None:
+            handler(node, scope)
+        else:
+            self.expression(node, scope)
+
+    def block(self, body, scope):
+        """A statement list in a new scope, or an expression body."""
+        if isinstance(body, list):
+            self.statements(body, Scope(scope))
+        elif body is not None:
+            self.expression(body, scope)
+
+    def expression(self, node, scope):
+        # Expressions can nest far deeper than the recursion limit, walk them on a stack.
+        bindings = self.bindings
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            tp = type(node)
+            if tp is ast.Identifier:
+                symbol = scope.lookup(node.value.value)
+                if symbol is not None:
+                    bindings[id(node)] = symbol
+            elif tp is ast.Call:
+                symbol = scope.lookup(node.left.value.value)
+                if symbol is not None:
+                    bindings[id(node)] = symbol
+                stack.extend(node.arguments)
+            elif tp is ast.BinaryOperator:
+                stack.append(node.right)
+                stack.append(node.left)
+            elif tp is ast.UnaryOperator:
+                stack.append(node.right)
+            elif tp is ast.Array:
+                stack.extend(node.items)
+            elif tp is ast.Dictionary:
+                for key, value in node.items:
+                    stack.append(key)
+                    stack.append(value)
+            elif tp is ast.SubscriptOperator:
+                stack.append(node.key)
+                stack.append(node.left)
+            elif tp is ast.Instance:
+                stack.append(node.value)
+
+    def declare(self, scope, name, node, key=None):
+        self.declarations[id(node if key is None else key)] = scope.set(name, node)
+
+    def _nothing(self, node, scope):
+        pass
+
+    def _assignment(self, node, scope):
+        self.expression(node.right, scope)
+        self.expression(node.left, scope)
+
+    def _condition(self, node, scope):
+        self.expression(node.test, scope)
+        self.block(node.if_body, scope)
+        for cond in node.elifs:
+            self.expression(cond.test, scope)
+            self.block(cond.body, scope)
+        self.block(node.else_body, scope)
+
+    def _match(self, node, scope):
+        self.expression(node.test, scope)
+        for arm in node.patterns:
+            arm_scope = Scope(scope)
+            pattern = arm.pattern
+            if isinstance(pattern, ast.List):
+                self.declare(arm_scope, pattern.head.value, pattern, pattern.head)
+                self.declare(arm_scope, pattern.rest.value, pattern, pattern.rest)
+            elif isinstance(pattern, ast.Array):
+                self.expression(pattern, scope)
+            # Identifier patterns are type names or wildcards, not references.
+            if isinstance(arm.body, list):
+                self.statements(arm.body, arm_scope)
+            else:
+                self.expression(arm.body, arm_scope)
+        self.block(node.else_body, scope)
+
+    def _while_loop(self, node, scope):
+        self.expression(node.test, scope)
+        self.block(node.body, scope)
+
+    def _for_loop(self, node, scope):
+        self.expression(node.collection, scope)
+        loop_scope = Scope(scope)
+        self.declare(loop_scope, node.var_name, node)
+        self.statements(node.body, loop_scope)
+
+    def _function(self, node, scope):
+        # Declared before the body, so the function can call itself.
+        if id(node) not in self.declarations:
+            self.declare(scope, node.name, node)
+        function_scope = Scope(scope)
+        for param in node.params:
+            self.declare(function_scope, param.name.value, param)
+        self.statements(node.body, function_scope)
+
+    def _module(self, node, scope):
+        # Like the methods of a Java class, the functions of a module are visible
+        # throughout it, so they can call each other in any order.
+        for statement in node.body:
+            if type(statement) is ast.Function:
+                self.declare(scope, statement.name, statement)
+        self.statements(node.body, scope)
+
+    def _return(self, node, scope):
+        if node.value is not None:
+            self.expression(node.value, scope)
+
+    def _typed_variable(self, node, scope):
+        if node.value is not None:
+            self.expression(node.value, scope)
+        previous = scope.lookup(node.name.value)
+        if previous is not None:
+            self.shadows[id(node)] = previous
+        self.declare(scope, node.name.value, node)
+
+
+def resolve(body, scope):
+    """Resolve the statements of a program in scope, returns a Resolution.
+
+    Top-level declarations are added to scope itself, so they stay visible to the
+    programs resolved in it later, as in the REPL.
+    """
+    resolver = Resolver()
+    resolver.statements(body, scope)
+    return Resolution(resolver.bindings, resolver.shadows, resolver.declarations)
@@ -0,0 +1,149 @@
+"""
+Tailcall
+--------
+
+Finds the calls code generation lowers so recursion runs in constant stack.
+
+A call is in tail position when its value is returned as is: the value of a return
+statement, or the expression body of an if or match arm, which is returned too. A
+function calling itself in tail position is emitted as a loop that reassigns its
+parameters and starts over. Functions that tail call each other in a cycle are
+emitted as a trampoline: each returns a Bounce standing for its tail call instead of
+making it, and a driver loop runs the bounces until one returns a value.
+"""
+from collections import namedtuple
+from koolml import ast
+
+# calls maps id(node) of a lowered tail call to the Function it calls. loops holds
+# id(node) of the functions calling themselves, trampolines maps id(node) of the
+# functions in a tail call cycle to the set of ids of the functions in that cycle.
+TailCalls = namedtuple('TailCalls', ['calls', 'loops', 'trampolines'])
+
+
+def _functions(body):
+    """Every Function declared in body, at any depth."""
+    return (node for node in ast.walk(body) if type(node) is ast.Function)
+
+
+def tail_expressions(function):
+    """Yield the expressions function returns as its result."""
+    stack = list(function.body)
+    while stack:
+        node = stack.pop()
+        tp = type(node)
+        if tp is ast.Return:
+            if node.value is not None:
+                yield node.value
+            continue
+        if tp is ast.Condition:
+            bodies = [node.if_body, node.else_body] + [cond.body for cond in node.elifs]
+        elif tp is ast.Match:
+            bodies = [arm.body for arm in node.patterns] + [node.else_body]
+        elif tp in (ast.WhileLoop, ast.ForLoop):
+            bodies = [node.body]
+        else:
+            # Nested functions return to their own callers.
+            continue
+        for body in bodies:
+            if isinstance(body, list):
+                stack.extend(body)
+            elif body is not None:
+                yield body
+
+
+def _cycles(graph):
+    """The strongly connected components of graph with more than one node.
+
+    graph maps a node id to the ids it has edges to. Tarjan's algorithm, iterative.
+    """
+    index = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    components = []
+    for root in graph:
+        if root in index:
+            continue
+        work = [(root, iter(graph[root]))]
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, edges = work[-1]
+            for target in edges:
+                if target not in index:
+                    index[target] = low[target] = len(index)
+                    stack.append(target)
+                    on_stack.add(target)
+                    work.append((target, iter(graph[target])))
+                    break
+                if target in on_stack:
+                    low[node] = min(low[node], index[target])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        item = stack.pop()
+                        on_stack.discard(item)
+                        component.append(item)
+                        if item == node:
+                            break
+                    if len(component) > 1:
+                        components.append(frozenset(component))
+    return components
+
+
+def tail_calls(body, bindings, types):
+    """Find the tail calls of a program, returns TailCalls.
+
+    bindings comes from koolml.resolver, types is the Typing.types of koolml.infer.
+    Functions returning nothing never take part in a trampoline, and neither does
+    main.
+    """
+    # id(function) -> [(call, callee)] for its tail calls to functions.
+    calls = {}
+    functions = {}
+    for function in _functions(body):
+        if function.name == 'main':
+            continue
+        functions[id(function)] = function
+        found = calls[id(function)] = []
+        for value in tail_expressions(function):
+            if type(value) is not ast.Call:
+                continue
+            symbol = bindings.get(id(value))
+            if symbol is None or type(symbol.node) is not ast.Function:
+                continue
+            callee = symbol.node
+            if len(callee.params) == len(value.arguments) and callee.name != 'main':
+                found.append((value, callee))
+
+    def returns_value(function):
+        return function.ret_type is not None or types.get(id(function)) != 'void'
+
+    graph = {}
+    for key, found in calls.items():
+        graph[key] = set()
+        if returns_value(functions[key]):
+            graph[key].update(id(callee) for call, callee in found
+                              if id(callee) in calls and returns_value(callee))
+    trampolines = {}
+    for component in _cycles(graph):
+        for key in component:
+            trampolines[key] = component
+
+    lowered = {}
+    loops = set()
+    for key, found in calls.items():
+        component = trampolines.get(key, ())
+        for call, callee in found:
+            if callee is functions[key]:
+                lowered[id(call)] = callee
+                loops.add(key)
+            elif id(callee) in component:
+                lowered[id(call)] = callee
+    return TailCalls(lowered, loops, trampolines)
@@ -7,13 +7,23 @@ types = {
     'Double': builtin, 
     'String': builtin,
     'Character': builtin, 
-    'Boolean': builtin
+    'Boolean': builtin,
+    # koolml runtime class, see coder.RangeClass.
+    'Range': builtin,
 }
 
 
 generic_types = {
 }
 
+# Element types whose lists are built as array-backed runtime classes holding the
+# elements unboxed, see coder.IntListClass. Their static type stays List<T>.
+specialized_lists = {
+    'Integer': 'IntList',
+    'Double': 'DoubleList',
+    'Boolean': 'BoolList',
+}
+
 
 
 def readMods():
@@ -23,7 +33,8 @@ def readMods():
     obj = json.loads(f)    
     for o in obj:
         name = o['name']
-        include = o['include']
+        # Runtime classes, like Dict (see coder.DictClass), have nothing to include.
+        include = o.get('include')
         gen = o['generic']
         args_n = o['args_n']
 
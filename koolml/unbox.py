@@ -0,0 +1,132 @@
+"""
+Unbox
+-----
+
+Chooses the Integer, Double and Boolean values emitted as Java primitives.
+
+Typed variables, parameters and return types of these types start out as candidates.
+Every value flowing into a candidate (its initializer, the arguments of every call,
+every returned value) must be provably non-null, or the candidate keeps its boxed
+type; this is repeated until nothing changes, so unboxing spreads through recursive
+and mutually dependent functions. Literals and operator results are never null,
+identifiers and calls are when they refer to a remaining candidate. Values read from
+containers or passed through generic methods stay boxed, and Java boxes primitives
+stored into containers by itself.
+"""
+from koolml import ast
+
+PRIMITIVES = {
+    'Integer': 'int',
+    'Double': 'double',
+    'Boolean': 'boolean',
+}
+
+# Builtins whose result is a primitive.
+PRIMITIVE_BUILTINS = frozenset(['readInt'])
+
+def _walk(body):
+    """Yield (node, function) for every node in body, function being the enclosing ast.Function."""
+    stack = [(node, None) for node in reversed(body)]
+    while stack:
+        node, function = stack.pop()
+        yield node, function
+        if type(node) is ast.Function:
+            function = node
+        stack.extend((child, function) for child in reversed(ast.children(node)))
+
+
+class Unboxer(object):
+    """Finds the primitive declarations of one program.
+
+    bindings comes from koolml.resolver, types is the Typing.types of koolml.infer.
+    """
+
+    def __init__(self, bindings, types):
+        self.bindings = bindings
+        self.types = types
+        # id(node) -> (node, primitive type) for the remaining candidates.
+        self.candidates = {}
+        # (declaration, value) pairs, the declaration stays primitive only while the
+        # value is non-null.
+        self.flows = []
+
+    def candidate(self, node, type_name):
+        primitive = PRIMITIVES.get(type_name)
+        if primitive is not None:
+            self.candidates[id(node)] = (node, primitive)
+
+    def collect(self, body):
+        boxed = []
+        for node, function in _walk(body):
+            tp = type(node)
+            if tp is ast.TypedVariable:
+                if node.value is not None and not node.type_name.args:
+                    self.candidate(node, node.type_name.name.value)
+                    self.flows.append((node, node.value))
+            elif tp is ast.Function and node.name != 'main':
+                for param in node.params:
+                    if isinstance(param, ast.TypedParam):
+                        if not param.type_name.args:
+                            self.candidate(param, param.type_name.name.value)
+                    else:
+                        self.candidate(param, self.types.get(id(param)))
+                ret_type = node.ret_type.name.value if node.ret_type else self.types.get(id(node))
+                self.candidate(node, ret_type)
+            elif tp is ast.Call:
+                symbol = self.bindings.get(id(node))
+                if symbol is not None and isinstance(symbol.node, ast.Function):
+                    self.flows.extend(zip(symbol.node.params, node.arguments))
+            elif tp is ast.Return:
+                if function is not None and node.value is not None:
+                    self.flows.append((function, node.value))
+            elif tp in (ast.Condition, ast.ConditionElif, ast.MatchPattern):
+                # Expression bodies return their value.
+                for field in ('if_body', 'else_body', 'body'):
+                    value = getattr(node, field, None)
+                    if function is not None and type(value) in ast.node_types:
+                        self.flows.append((function, value))
+            elif tp is ast.Match and isinstance(node.test, ast.Identifier):
+                if any(isinstance(arm.pattern, ast.Identifier) and arm.pattern.value.value != '_'
+                       for arm in node.patterns):
+                    # instanceof needs a reference.
+                    boxed.append(node.test)
+        for node in boxed:
+            symbol = self.bindings.get(id(node))
+            if symbol is not None:
+                self.candidates.pop(id(symbol.node), None)
+
+    def non_null(self, node):
+        tp = type(node)
+        if tp in (ast.Number, ast.String, ast.BinaryOperator, ast.UnaryOperator):
+            return True
+        if tp in (ast.Identifier, ast.Call):
+            symbol = self.bindings.get(id(node))
+            if symbol is None:
+                return False
+            if isinstance(symbol.node, ast.Builtin):
+                return symbol.name in PRIMITIVE_BUILTINS
+            if isinstance(symbol.node, ast.Identifier):
+                # true and false.
+                return True
+            return id(symbol.node) in self.candidates
+        return False
+
+    def solve(self):
+        changed = True
+        while changed:
+            changed = False
+            for declaration, value in self.flows:
+                if id(declaration) in self.candidates and not self.non_null(value):
+                    del self.candidates[id(declaration)]
+                    changed = True
+        return {key: primitive for key, (node, primitive) in self.candidates.items()}
+
+
+def unbox(body, bindings, types):
+    """Map id(node) of TypedVariable, param and Function nodes to their primitive type.
+
+    Functions map to the primitive type they return.
+    """
+    unboxer = Unboxer(bindings, types)
+    unboxer.collect(body)
+    return unboxer.solve()
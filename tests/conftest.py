@@ -0,0 +1,21 @@
+import pytest
+from koolml.interpreter import compile_source
+
+
+@pytest.fixture
+def compile_java():
+    """compile_source() that fails the test on any diagnostic and returns the Java code."""
+    def compile(source, **options):
+        result = compile_source(source, **options)
+        assert [err.message for err, _ in result.diagnostics] == []
+        assert result.code
+        return result.code
+    return compile
+
+
+@pytest.fixture
+def compile_module(compile_java):
+    """compile_java() for the functions of a `module App` body."""
+    def compile(body, **options):
+        return compile_java('module App ->\n' + body, **options)
+    return compile
@@ -0,0 +1,69 @@
+import os
+import time
+from koolml import cache
+from koolml.cache import ASTCache
+from koolml.interpreter import parse_source
+from koolml.errors import Diagnostics
+from koolml.lexer import Lexer
+
+SOURCE = 'module App ->\n  fun main() ->\n    println(1)\n'
+
+
+def parse(source):
+    lexer = Lexer()
+    return lexer, parse_source(source, lexer, Diagnostics(lexer))
+
+
+def test_key_depends_on_parser_sources(monkeypatch):
+    store = ASTCache('unused')
+    lexer = Lexer()
+    key = store.key(SOURCE, lexer)
+    assert key == store.key(SOURCE, lexer)
+    monkeypatch.setattr(cache, '_parser_digest', 'edited parser')
+    assert store.key(SOURCE, lexer) != key
+
+
+def test_store_and_load(tmpdir):
+    store = ASTCache(str(tmpdir))
+    lexer, program = parse(SOURCE)
+    key = store.key(SOURCE, lexer)
+    store.store(key, lexer.source_lines, program)
+    source_lines, loaded = store.load(key)
+    assert loaded == program
+    assert list(source_lines) == list(lexer.source_lines)
+
+
+def test_failed_store_leaves_no_temporary_file(tmpdir, monkeypatch):
+    store = ASTCache(str(tmpdir))
+    lexer, program = parse(SOURCE)
+
+    def fail(src, dst):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(os, 'replace', fail)
+    store.store(store.key(SOURCE, lexer), lexer.source_lines, program)
+    assert os.listdir(str(tmpdir)) == []
+
+
+def test_evict_removes_stale_temporary_files(tmpdir):
+    store = ASTCache(str(tmpdir))
+    stale = tmpdir.join('stale.tmp')
+    stale.write('x')
+    old = time.time() - cache.TMP_MAX_AGE - 1
+    os.utime(str(stale), (old, old))
+    recent = tmpdir.join('recent.tmp')
+    recent.write('x')
+    store.evict()
+    assert sorted(os.listdir(str(tmpdir))) == ['recent.tmp']
+
+
+def test_store_evicts_on_a_sample_of_stores(tmpdir, monkeypatch):
+    store = ASTCache(str(tmpdir), max_size=0)
+    lexer, program = parse(SOURCE)
+    key = store.key(SOURCE, lexer)
+    monkeypatch.setattr(cache.random, 'random', lambda: cache.EVICT_RATE)
+    store.store(key, lexer.source_lines, program)
+    assert os.listdir(str(tmpdir)) == [key + cache.SUFFIX]
+    monkeypatch.setattr(cache.random, 'random', lambda: 0.0)
+    store.store(key, lexer.source_lines, program)
+    assert os.listdir(str(tmpdir)) == []
@@ -0,0 +1,63 @@
+import pytest
+
+# Far past the default recursion limit of 1000.
+DEEP = 5000
+WIDE = 100000
+
+PRELUDE = '''module App ->
+  fun f(a) ->
+    return a
+  fun main() ->
+    let y: Integer = 1
+    let b: Boolean = true
+    let s: String = "s"
+    let xs: List<Any> = []
+    '''
+
+
+@pytest.fixture
+def compile_line(compile_java):
+    return lambda line: compile_java(PRELUDE + line + '\n')
+
+
+def test_deep_nested_list(compile_line):
+    code = compile_line('let ys: List<Any> = ' + '[' * DEEP + '1' + ']' * DEEP)
+    assert 'List.of(' * (DEEP - 1) in code
+
+
+def test_deep_nested_dictionary(compile_line):
+    compile_line('let d: Dict<Integer, Any> = ' + '{1: ' * DEEP + '1' + '}' * DEEP)
+
+
+def test_deep_parentheses(compile_line):
+    compile_line('let x: Integer = ' + '(' * DEEP + 'y' + ')' * DEEP)
+
+
+def test_deep_unary(compile_line):
+    compile_line('let x: Integer = ' + '-' * DEEP + 'y')
+    compile_line('let c: Boolean = ' + '!' * DEEP + 'b')
+
+
+def test_deep_calls(compile_line):
+    compile_line('let x: Integer = ' + 'f(' * DEEP + 'y' + ')' * DEEP)
+
+
+def test_deep_subscripts(compile_line):
+    compile_line('let x: Any = xs' + '[0]' * DEEP)
+
+
+def test_long_sum(compile_line):
+    code = compile_line('let x: Integer = ' + ' + '.join(['y'] * WIDE))
+    assert code.count('y + ') == WIDE - 1
+
+
+def test_long_concatenation(compile_line):
+    compile_line('let t: String = ' + ' + '.join(['"a"', 's'] * (WIDE // 2)))
+
+
+def test_wide_list(compile_line):
+    compile_line('let ys: List<Integer> = [' + ', '.join(['1'] * WIDE) + ']')
+
+
+def test_wide_dictionary(compile_line):
+    compile_line('let d: Dict<Integer, Integer> = {' + ', '.join('{}: 1'.format(i) for i in range(WIDE)) + '}')
@@ -0,0 +1,47 @@
+from koolml import coder
+from koolml.interpreter import compile_source
+
+DICTS = '''module App ->
+  fun main() ->
+    let n: Integer = readInt()
+    let d: Dict<String, Integer> = {"a": n, "b": 2}
+    let m: Map<String, Integer> = {"a": n}
+    let e: Dict<Integer, Dict<Integer, Integer>> = {1: {2: n}}
+    let f: Dict<String, Integer> = dissoc(assoc(d, "c", 3), "a")
+    m["c"] = 3
+    println(d["a"])
+    println(m["a"])
+    println(e)
+    println(f)
+'''
+
+
+def test_dict_and_map_literals(compile_java):
+    code = compile_java(DICTS)
+    assert 'final Dict<String, Integer> d = Dict.<String, Integer>of("a",n,"b",2);' in code
+    assert 'final Map<String, Integer> m = Maps.<String, Integer>of("a",n);' in code
+    assert ('final Dict<Integer, Dict<Integer, Integer>> e = '
+            'Dict.<Integer, Dict<Integer, Integer>>of(1,Dict.<Integer, Integer>of(2,n));') in code
+    assert 'final Dict<String, Integer> f = Dict.dissoc(Dict.assoc(d,"c",3),"a");' in code
+    assert 'm.put("c", 3);' in code
+    assert 'System.out.println(d.get("a"));' in code
+    assert 'HashMap' not in code
+
+
+def test_dicts_are_not_updated_in_place():
+    result = compile_source(DICTS + '    d["c"] = 3\n')
+    assert [(err.message, err.line) for err, _ in result.diagnostics] == [
+        ('only Map values can be updated in place, assoc returns an updated Dict', 13)]
+
+
+def test_dict_runtime():
+    assert 'final class Dict<K, V> {' in coder.DictClass
+    # Five bits of the hash per level, the position of an entry is the count of bits
+    # set below its own in the bitmap.
+    assert 'int bit = 1 << ((hash >>> shift) & 31);' in coder.DictClass
+    assert 'int i = 2 * Integer.bitCount(bitmap & (bit - 1));' in coder.DictClass
+    assert 'static <K, V> Dict<K, V> assoc(Dict<K, V> dict, K key, V value) {' in coder.DictClass
+    assert 'static <K, V> Dict<K, V> dissoc(Dict<K, V> dict, Object key) {' in coder.DictClass
+    # Maps.of presizes the HashMap so filling it never rehashes.
+    assert 'Map<K, V> map = new HashMap<K, V>(size + size / 3 + 1);' in coder.MapsClass
+    assert coder.DictClass in coder.runtime and coder.MapsClass in coder.runtime
@@ -0,0 +1,20 @@
+from koolml import ast
+from koolml.fold import fold
+from koolml.lexer import Lexer, TokenStream
+from koolml.parser import Parser
+
+
+def folded_names(source):
+    lexer = Lexer('lines')
+    program = Parser(lexer).parse(TokenStream(lexer.tokenize(source)))
+    return [node.value for node in ast.walk(fold(program.body)) if type(node) is ast.Identifier]
+
+
+def test_folded_comparison_keeps_a_source_position():
+    names = folded_names('''module App ->
+  fun main() ->
+    let b: Boolean = 1 < 2
+    println(x + (4 > 5))
+''')
+    assert [(token.value, token.line) for token in names] == [('true', 3), ('x', 4), ('false', 4)]
+    assert names[2].column == names[1].column
@@ -0,0 +1,64 @@
+def test_list_subscript_key_is_integer(compile_module):
+    code = compile_module('''  fun nth(xs, i) ->
+    return xs[i]
+  fun main() ->
+    let xs: List<String> = ["a", "b"]
+    println(nth(xs, 1))
+''')
+    assert 'static <T> T nth(List<T> xs, Integer i) {' in code
+
+
+def test_untyped_collection_takes_the_type_of_the_calls(compile_module):
+    code = compile_module('''  fun get(d, k) ->
+    return d[k]
+  fun put(m, k, v) ->
+    m[k] = v
+    return
+  fun main() ->
+    let d: Dict<String, Integer> = {"a": 1}
+    let m: Map<String, Integer> = {"b": 2}
+    println(get(d, "a"))
+    put(m, "c", 3)
+''')
+    assert 'static <T, U> U get(Dict<T, U> d, T k) {' in code
+    assert 'static <T, U> void put(Map<T, U> m, T k, U v) {' in code
+
+
+def test_subscript_after_use_as_list_stays_generic(compile_module):
+    code = compile_module('''  fun first(xs) ->
+    for x in xs:
+      println(x)
+    return xs[0]
+  fun main() ->
+    println(first([1.5]))
+''')
+    assert 'static <T> T first(List<T> xs) {' in code
+
+
+def test_subscripted_parameter_stays_generic_over_its_elements(compile_module):
+    code = compile_module('''  fun first(xs) ->
+    return xs[0]
+  fun main() ->
+    println(first([1, 2]))
+    println(first(["a"]))
+''')
+    assert 'static <T> T first(List<T> xs) {' in code
+
+
+def test_arithmetic_operands_are_not_generic(compile_module):
+    code = compile_module('''  fun add(a, b) ->
+    return a + b
+  fun less(a, b) ->
+    return a < b
+  fun half(a) ->
+    return a / 2.0
+  fun same(a, b) ->
+    return a == b
+  fun main() ->
+    println(1)
+''')
+    assert 'static Integer add(Integer a, Integer b) {' in code
+    assert 'static Boolean less(Integer a, Integer b) {' in code
+    assert 'static Double half(Double a) {' in code
+    # Any two references compare.
+    assert 'static <T> Boolean same(T a, T b) {' in code
@@ -0,0 +1,89 @@
+from koolml.lexer import BufferTokenStream, Lexer, TextEdit, TokenStream
+from koolml.parser import Parser
+
+TWO_SPACES = 'module App ->\n  fun main() ->\n    println(1)\n'
+FOUR_SPACES = 'module App ->\n    fun main() ->\n        println(1)\n'
+
+
+def names(tokens):
+    return [token.name for token in tokens]
+
+
+def test_reused_lexer_detects_indentation_per_source():
+    for engine in Lexer.engines:
+        lexer = Lexer(engine)
+        first = names(lexer.tokenize(TWO_SPACES))
+        second = names(lexer.tokenize(FOUR_SPACES))
+        assert first == second == names(Lexer(engine).tokenize(FOUR_SPACES))
+        assert second.count('INDENT') == second.count('DEDENT') == 2
+
+
+def test_reused_lexer_resets_line_tables():
+    lexer = Lexer('buffer')
+    lexer.tokenize(TWO_SPACES + TWO_SPACES)
+    tokens = lexer.tokenize_compact(FOUR_SPACES)
+    assert len(lexer.line_offsets) == len(lexer.line_indents) == 3
+    assert names(tokens) == names(Lexer('buffer').tokenize(FOUR_SPACES))
+
+
+def test_buffer_positions_in_any_order():
+    source = TWO_SPACES + '  fun f(a) ->\n    return [a,\n      "b"]\n'
+    tokens = Lexer('buffer').tokenize(source)
+    buffer = Lexer('buffer').tokenize_compact(source)
+    order = list(range(len(tokens)))
+    assert [buffer[i] for i in order] == tokens
+    assert [buffer[i] for i in reversed(order)] == tokens[::-1]
+    assert [buffer[i] for i in order[::3] + order[1::3] + order[2::3]] == tokens[::3] + tokens[1::3] + tokens[2::3]
+
+
+def test_buffer_stream_parses_like_a_token_list():
+    source = TWO_SPACES + '  fun f(a: Integer): Integer ->\n    let x: Integer = a * (a + 1)\n    return f(x)\n'
+    lexer = Lexer('buffer')
+    program = Parser(lexer).parse(TokenStream(lexer.tokenize(source)))
+    assert Parser(lexer).parse(BufferTokenStream(lexer.tokenize_compact(source))) == program
+
+
+EDITED = '''module App ->
+  fun main() ->
+    let s: String = "hello, world"
+    println(s)
+    println(1)
+  fun f(a: Integer): Integer ->
+    return a
+'''
+
+
+def apply_edit(source, edit):
+    lines = source.splitlines(True)
+    return ''.join(lines[:edit.start_line - 1]) + edit.text + ''.join(lines[edit.end_line:])
+
+
+def check_retokenize(edit):
+    lexer = Lexer('buffer')
+    tokens = lexer.tokenize_compact(EDITED)
+    updated = lexer.retokenize(tokens, edit)
+    assert updated is tokens
+    source = apply_edit(EDITED, edit)
+    assert tokens.source == source
+    expected = Lexer('buffer')
+    assert list(updated) == list(expected.tokenize_compact(source))
+    for table in ('line_starts', 'line_offsets', 'line_indents'):
+        assert getattr(lexer, table) == getattr(expected, table)
+    assert list(lexer.source_lines) == list(expected.source_lines)
+
+
+def test_retokenize_insert():
+    check_retokenize(TextEdit(4, 3, '    println(s + s)\n'))
+
+
+def test_retokenize_delete():
+    check_retokenize(TextEdit(4, 4, ''))
+    check_retokenize(TextEdit(7, 7, ''))
+
+
+def test_retokenize_multi_line_edit():
+    check_retokenize(TextEdit(4, 5, '    if s == "" then\n      println(0)\n\n    println(2)\n  fun g() ->\n    println(3)\n'))
+
+
+def test_retokenize_edit_inside_string():
+    check_retokenize(TextEdit(3, 3, '    let s: String = "hello -> (world) # 1\\n"\n'))
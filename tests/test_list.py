@@ -0,0 +1,71 @@
+from koolml import coder
+
+SUM = '''  fun sum(xs: List<Integer>): Integer ->
+    match xs with
+      | [] -> 0
+      | [1, 2] -> 3
+      | h::t -> h + sum(t)
+  fun main() ->
+    println(sum([1, 2, 3]))
+'''
+
+
+def test_list_patterns_read_length_head_and_tail(compile_module):
+    code = compile_module(SUM)
+    assert '\tif (xs.length == 0) {' in code
+    assert '} else if (xs.length == 2 && Objects.equals(xs.head(), 1) && Objects.equals(xs.tail().head(), 2)) {' in code
+    assert '\t\tfinal Integer h = xs.head();\n\t\tfinal List<Integer> t = xs.tail();\n' in code
+    # Nothing is copied, scanned or taken off the caller's list.
+    for call in ('removeFirst', 'getFirst', 'contains(', 'new List'):
+        assert call not in code
+
+
+def test_cons_list_runtime():
+    assert 'abstract class List<T> implements Iterable<T> {\n    final int length;\n' in coder.ListClass
+    # A cons cell shares its tail and caches the length.
+    assert 'final class Cons<T> extends List<T> {' in coder.ListClass
+    assert 'super(tail == null ? 0 : tail.length + 1);' in coder.ListClass
+    assert 'LinkedList' not in coder.runtime
+
+
+def test_numeric_and_boolean_lists_are_array_backed(compile_module):
+    code = compile_module('''  fun main() ->
+    let n: Integer = readInt()
+    let d: Double = 0.5 * n
+    let xs: List<Integer> = [n, n + 1]
+    let ds: List<Double> = [d]
+    let bs: List<Boolean> = [n > 0, true]
+    let ss: List<String> = ["a"]
+    println(xs[1])
+    println(ds)
+    println(bs)
+    println(ss)
+''')
+    assert 'final List<Integer> xs = IntList.wrap(n,n + 1);' in code
+    assert 'final List<Double> ds = DoubleList.wrap(d);' in code
+    assert 'final List<Boolean> bs = BoolList.wrap(n > 0,true);' in code
+    assert 'System.out.println(xs.get(1));' in code
+    # Other elements keep the cons list.
+    assert 'static final List<String> list$0 = List.of("a");' in code
+
+
+def test_primitive_list_templates():
+    for name, prim, boxed in (('IntList', 'int', 'Integer'), ('DoubleList', 'double', 'Double'),
+                              ('BoolList', 'boolean', 'Boolean')):
+        template = getattr(coder, name + 'Class')
+        assert '$' not in template
+        assert 'final class {} extends List<{}> implements RandomAccess {{'.format(name, boxed) in template
+        assert 'static {} wrap({}... items) {{'.format(name, prim) in template
+        assert 'return store.items[offset + index];' in template
+        # Appending to the newest list of an array fills it in place, a full or shared
+        # array is copied with twice the room.
+        assert ('    {} add({} value) {{\n'
+                '        Store store = this.store;\n'
+                '        int start = offset;\n'
+                '        if (start + length != store.fill || store.fill == store.items.length) {{\n'
+                '            store = new Store(Arrays.copyOfRange(store.items, start, start + Math.max(8, 2 * length)), '
+                'length);\n'
+                '            start = 0;\n'
+                '        }}\n'
+                '        store.items[store.fill++] = value;\n').format(name, prim) in template
+        assert template in coder.runtime
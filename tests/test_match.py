@@ -0,0 +1,49 @@
+import pytest
+
+
+@pytest.fixture
+def compile_match(compile_module):
+    def compile(param, patterns):
+        arms = ''.join('      | {} -> {}\n'.format(pattern, i) for i, pattern in enumerate(patterns))
+        return compile_module('  fun f({}): Integer ->\n    match x with\n{}      | _ -> 0\n'
+                              '  fun main() ->\n    println(1)\n'.format(param, arms))
+    return compile
+
+
+def test_switch_on_int_and_string_subjects(compile_match):
+    assert 'switch (x) {' in compile_match('x: Integer', ['1', '2', '3'])
+    assert 'switch (x) {' in compile_match('x: String', ['"a"', '"b"', '"c"'])
+    # Untyped, the patterns make it an Integer.
+    assert 'switch (x) {' in compile_match('x', ['1', '2', '3'])
+
+
+def test_other_subjects_match_with_if_chains(compile_match):
+    code = compile_match('x: Double', ['1', '2', '3'])
+    assert 'switch' not in code and 'if (x==1) {' in code
+    code = compile_match('x: Any', ['"a"', '"b"', '"c"'])
+    assert 'switch' not in code and 'if ("a".equals(x)) {' in code
+
+
+def test_call_subject_is_evaluated_once(compile_module):
+    code = compile_module('''  fun load() ->
+    return [1, 2]
+  fun f(n: Integer): Integer ->
+    match load() with
+      | [] -> 0
+      | [1, 2] -> 3
+      | h::t -> h
+  fun g(n: Integer) ->
+    match f(n) with
+      | 1 -> println("one")
+      | _ -> println("other")
+  fun main() ->
+    g(1)
+''')
+    assert code.count('App.load()') == 1
+    assert '\tfinal List<Integer> subject$0 = App.load();\n\tif (subject$0.length == 0) {' in code
+    assert 'subject$0.length == 2 && Objects.equals(subject$0.head(), 1)' in code
+    assert '\tfinal Integer subject$1 = App.f(n);\n\tif (subject$1==1) {' in code
+
+
+def test_identifier_subject_is_not_copied(compile_match):
+    assert 'subject$' not in compile_match('x: Integer', ['1', '2'])
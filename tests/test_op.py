@@ -0,0 +1,42 @@
+import pytest
+from koolml import ast
+from koolml.lexer import Token
+from koolml.op import op
+
+
+@pytest.fixture
+def compile_function(compile_module):
+    return lambda body: compile_module('  fun f(n: Integer, x: Integer): Integer ->\n' + body +
+                                       '    return n\n  fun main() ->\n    println(f(10, 3))\n')
+
+
+def test_counter_division_and_remainder_become_shift_and_mask(compile_function):
+    code = compile_function('''    for i in 0..n:
+      println(i / 4 + i % 8)
+      for j in i...n:
+        println(j % 16 / 2)
+''')
+    assert 'System.out.println((i >> 2) + (i & 7));' in code
+    assert 'System.out.println((j & 15) >> 1);' in code
+
+
+def test_operands_of_unknown_sign_keep_division(compile_function):
+    code = compile_function('''    for i in x..n:
+      println(i / 4 + x % 8)
+    for k in (0 - 1)..n:
+      println(k / 2)
+''')
+    assert 'System.out.println(i / 4 + x % 8);' in code
+    assert 'System.out.println(k / 2);' in code
+
+
+def test_only_compound_squares_use_the_helper(compile_function):
+    code = compile_function('    println(x * x)\n    println((x + 1) * (x + 1))\n')
+    assert 'System.out.println(x * x);' in code
+    assert 'System.out.println(Ops.sq(x + 1));' in code
+
+
+def test_op_helpers_and_peephole():
+    assert op.mul('x', 8) == 'x * 8'
+    node = ast.BinaryOperator('*', ast.Identifier(Token('NAME', 'x', 1, 1)), ast.Number(8))
+    assert op.peephole(node, ('Integer', True, True), set(), {}) == ('<<', node.left, ast.Number(3))
@@ -0,0 +1,55 @@
+from koolml import ast
+from koolml.interpreter import compile_source
+from koolml.lexer import Lexer, TokenStream
+from koolml.parser import Parser
+
+BROKEN = '''module App ->
+  fun f(a: Integer) ->
+    let x: Integer = (a +
+    return x
+  fun g() ->
+    let = 3
+    println(1)
+  fun h() ->
+    if then
+      println(2)
+    println(3)
+  fun main() ->
+    f(1
+    println(4)
+'''
+
+ERRORS = [
+    ('Expected expression', 3),
+    ('Expected NAME, got ASSIGN', 6),
+    ('Expected `if` condition', 9),
+    ('Expected RPAREN, got NEWLINE', 13),
+]
+
+
+def test_recovery_reports_every_error_and_keeps_parsing():
+    lexer = Lexer()
+    parser = Parser(lexer, recover=True)
+    program = parser.parse(TokenStream(lexer.tokenize(BROKEN)))
+    assert [(err.message, err.line) for err in parser.errors] == ERRORS
+    functions = program.body[0].body
+    assert [function.name for function in functions] == ['f', 'g', 'h', 'main']
+    for function, (message, line) in zip(functions, ERRORS):
+        # The broken statement becomes an Error node, the next one still parses.
+        error, statement = function.body
+        assert error == ast.Error(message, line, error.column)
+        assert type(statement) in (ast.Return, ast.Call)
+    # The block opened by the broken `if` is skipped with it.
+    assert functions[2].body[1].arguments == [ast.Number(3)]
+
+
+def test_recovery_diagnostics():
+    for options in ({}, {'compact': True}, {'engine': 'buffer'}):
+        result = compile_source(BROKEN, recover=True, **options)
+        assert result.code is None
+        assert [(err.message, err.line) for err, _ in result.diagnostics] == ERRORS
+
+
+def test_without_recovery_only_the_first_error_is_reported():
+    result = compile_source(BROKEN)
+    assert [(err.message, err.line) for err, _ in result.diagnostics] == ERRORS[:1]
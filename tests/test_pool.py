@@ -0,0 +1,54 @@
+POOLED = '''  fun f(n: Integer): Integer ->
+    for i in 0..n:
+      println([1, 2])
+    let d: Dict<String, Integer> = {"a": 1}
+    let m: Map<String, Integer> = {"a": 1}
+    println(d)
+    println(m)
+    match [n] with
+      | [3] -> 3
+      | _ -> 0
+  fun g() ->
+    let xs: List<Integer> = [1, 2]
+    let ds: List<Double> = [1.0, 2.0]
+    let nested: List<List<Integer>> = [[1, 2], [3]]
+    let e: List<Integer> = []
+    let n: Integer = readInt()
+    let ys: List<Integer> = [1, n]
+    let d: Dict<String, Integer> = {"a": 1}
+    println(xs)
+    println(ds)
+    println(nested)
+    println(e)
+    println(ys)
+    println(d)
+  fun main() ->
+    println(f(2))
+    g()
+'''
+
+
+def test_literal_lists_and_dicts_are_static_fields(compile_module):
+    code = compile_module(POOLED)
+    # Equal literals of one type share a field, a nested literal is one field.
+    assert code.startswith('// module App\n'
+                           'static final List<Integer> list$0 = IntList.wrap(1,2);\n'
+                           'static final Dict<String, Integer> dict$1 = Dict.<String, Integer>of("a",1);\n'
+                           'static final List<Double> list$2 = DoubleList.wrap(1.0,2.0);\n'
+                           'static final List<List<Integer>> list$3 = List.of(IntList.wrap(1,2),IntList.wrap(3));\n'
+                           'static ')
+    assert '\tfor (int i = 0; i < n; i++) {\n\t\tSystem.out.println(App.list$0);\n' in code
+    assert code.count('final Dict<String, Integer> d = App.dict$1;') == 2
+    assert 'final List<Integer> xs = App.list$0;' in code
+    assert 'final List<Double> ds = App.list$2;' in code
+    assert 'final List<List<Integer>> nested = App.list$3;' in code
+
+
+def test_other_literals_are_built_where_they_are_used(compile_module):
+    code = compile_module(POOLED)
+    # Maps are mutable, [] takes its type from the use and patterns are not built.
+    assert 'final Map<String, Integer> m = Maps.<String, Integer>of("a",1);' in code
+    assert 'final List<Integer> e = IntList.wrap();' in code
+    assert 'final List<Integer> ys = IntList.wrap(1,n);' in code
+    assert 'IntList.wrap(3);' not in code
+    assert 'final List<Integer> subject$0 = IntList.wrap(n);' in code
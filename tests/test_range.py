@@ -0,0 +1,53 @@
+import pytest
+from koolml import coder
+
+
+@pytest.fixture
+def compile_main(compile_module):
+    return lambda body: compile_module('  fun total(xs: List<Integer>): Integer ->\n    println(xs)\n    return 0\n'
+                                       '  fun main() ->\n    let n: Integer = readInt()\n' + body)
+
+
+def test_half_open_range_loop_counts_with_an_int(compile_main):
+    code = compile_main('    for i in 0..n:\n      println(i)\n')
+    assert 'for (int i = 0; i < n; i++) {' in code
+    assert 'Range' not in code
+
+
+def test_range_loop_end_is_evaluated_once(compile_main):
+    code = compile_main('    for i in 0..n + 1:\n      println(i)\n')
+    assert 'for (int i = 0, i$end = n + 1; i < i$end; i++) {' in code
+
+
+def test_closed_range_loop_up_to_a_literal_compares_inclusively(compile_main):
+    code = compile_main('    for i in 1...9:\n      println(i)\n')
+    assert 'for (int i = 1; i <= 9; i++) {' in code
+
+
+def test_closed_range_loop_that_may_end_at_the_last_int_is_guarded(compile_main):
+    for end in ('n', '2147483647'):
+        code = compile_main('    for i in 1...{}:\n      println(i)\n'.format(end))
+        assert ('\t\tint i = 1;\n'
+                '\t\tfinal int i$last = {};\n'
+                '\t\tif (i <= i$last) {{\n'
+                '\t\t\tdo {{\n'
+                '\t\t\t\tSystem.out.println(i);\n'
+                '\t\t\t}} while (i++ != i$last);\n'.format(end)) in code
+
+
+def test_ranges_are_lists(compile_main):
+    code = compile_main('    let xs: List<Integer> = 1..5\n    println(total(1...n))\n')
+    assert 'final List<Integer> xs = new Range(1, 5);' in code
+    assert 'App.total(Range.closed(1, n))' in code
+    assert 'final class Range extends List<Integer> implements RandomAccess {' in coder.RangeClass
+
+
+def test_range_and_list_arguments_share_a_parameter_type(compile_main):
+    code = compile_main('''    for x in pick(0..3):
+      println(x)
+    for y in pick([7]):
+      println(y)
+  fun pick(xs) ->
+    return xs
+''')
+    assert 'static List<Integer> pick(List<Integer> xs) {' in code
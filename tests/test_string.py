@@ -0,0 +1,37 @@
+from koolml.interpreter import java_string
+
+
+def test_java_string_escapes():
+    assert java_string('say "hi"\\') == '"say \\"hi\\"\\\\"'
+    assert java_string('a\tb\r\nc') == '"a\\tb\\r\\nc"'
+    assert java_string('\x00\x1b\x7f') == '"\\u0000\\u001b\\u007f"'
+    assert java_string('caf\xe9 \u2603') == '"caf\xe9 \u2603"'
+
+
+def test_literals_are_java_string_literals(compile_module):
+    code = compile_module('''  fun main() ->
+    let s: String = "say \\"hi\\"\\t\\\\"
+    println(s)
+''')
+    assert 'final String s = "say \\"hi\\"\\t\\\\";' in code
+    assert 'new String' not in code
+
+
+def test_concatenation_is_one_flat_expression(compile_module):
+    code = compile_module('''  fun greet(s: String, n: Integer): String ->
+    let a: String = "hi " + "to " + s + "\\n"
+    let b: String = s + (n + 1) + "!" + n * 3
+    let c: String = n + (s + "x")
+    let d: String = "x" + ("y" + s)
+    return a + b + c + d
+  fun main() ->
+    println(greet("w", 1))
+''')
+    # Adjacent literals are merged.
+    assert 'final String a = "hi to " + s + "\\n";' in code
+    # Operands that don't bind tighter than + keep their parentheses.
+    assert 'final String b = s + (n + 1) + "!" + n * 3;' in code
+    # n + s + "x" would add n to s, not to the rest.
+    assert 'final String c = n + (s + "x");' in code
+    assert 'final String d = "xy" + s;' in code
+    assert 'return (a + b + c + d);' in code
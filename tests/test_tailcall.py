@@ -0,0 +1,50 @@
+GENERIC_MUTUAL_RECURSION = '''module App ->
+  fun left(a, b, n: Integer) ->
+    if n == 0 then
+      return a
+    return right(b, a, n - 1)
+  fun right(c, d, n: Integer) ->
+    if n == 0 then
+      return d
+    return left(d, c, n - 1)
+  fun main() ->
+    println(left("a", 1, 3))
+'''
+
+
+def test_bounce_temporaries_take_the_caller_type_parameters(compile_java):
+    for unbox_values in (False, True):
+        code = compile_java(GENERIC_MUTUAL_RECURSION, unbox_values=unbox_values)
+        assert 'static <T, U> Object left$step(T a, U b, ' in code
+        assert 'static <T, U> Object right$step(T c, U d, ' in code
+        # left passes b, a U, as the c of right, which right calls T.
+        assert '\tfinal U c$ = b;\n\tfinal T d$ = a;\n' in code
+        assert '\tfinal U a$ = d;\n\tfinal T b$ = c;\n' in code
+
+
+def test_function_returning_only_its_own_tail_calls_is_void(compile_module):
+    code = compile_module('''  fun countdown(n: Integer) ->
+    if n > 0 then
+      println(n)
+      return countdown(n - 1)
+  fun loop(n) ->
+    if n > 0 then
+      return loop(n - 1)
+  fun main() ->
+    countdown(3)
+    loop(3)
+''')
+    assert 'static void countdown(Integer n) {\n\ttail: while (true) {' in code
+    assert 'static void loop(Integer n) {\n\ttail: while (true) {' in code
+    assert code.count('\t\treturn;\n') == 2
+
+
+def test_tail_loop_returning_a_value_keeps_its_type(compile_module):
+    code = compile_module('''  fun count(n: Integer, acc: Integer) ->
+    if n > 0 then
+      return count(n - 1, acc + 1)
+    return acc
+  fun main() ->
+    println(count(3, 0))
+''')
+    assert 'static Integer count(Integer n, Integer acc) {\n\ttail: while (true) {' in code